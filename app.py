@@ -1,84 +1,800 @@
 import streamlit as st
-import pandas as pd
 import sqlite3
-from datetime import datetime
+import atexit
+from datetime import datetime, timedelta
 import hashlib
+import os
 import secrets
 import string
 import time
-import plotly.express as px
+import heapq
+import json
+import re
+from collections import Counter, deque
+from functools import wraps
+import io
+import csv
+import zipfile
+import queue
+import threading
+import urllib.parse
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+# pandas, numpy, plotly y openpyxl se importan dentro de las funciones que los
+# usan: el login, la CLI y el arranque en frío no pagan su carga.
 
 # --- CONFIGURACIÓN INICIAL ---
-st.set_page_config(page_title="Sistema - Verificación Firmas", layout="wide")
+# La configuración de página se aplica en el bloque principal: así el módulo se
+# puede importar sin interfaz (cli.py, benchmarks) sin emitir elementos.
 
 # --- CONSTANTES ---
 ARCHIVO_FICHAS = "fichas.xlsx"
-PARTIDOS = {
-    '1': 'Partido 1',
-    '2': 'Partido 2'
-}
+ARCHIVO_DB = os.environ.get("JNE_DB", "jne_verification.db")
+COLUMNAS_FICHAS = ['item', 'NUM_FIC', 'COD_OP', 'COD_DNI']
 TOTAL_FICHAS = 3596
 
+# Ajustes de SQLite aplicados a cada conexión del pool
+CONFIG_SQLITE = {
+    'journal_mode': os.environ.get("JNE_JOURNAL_MODE", "WAL"),
+    'synchronous': os.environ.get("JNE_SYNCHRONOUS", "NORMAL"),
+    'busy_timeout_ms': int(os.environ.get("JNE_BUSY_TIMEOUT_MS", "10000")),
+    'cache_size_kib': int(os.environ.get("JNE_CACHE_SIZE_KIB", "20000")),
+    'mmap_size': int(os.environ.get("JNE_MMAP_SIZE", str(256 * 1024 * 1024))),
+    'max_lectores': int(os.environ.get("JNE_MAX_LECTORES", "8")),
+}
+
+# Almacenamiento particionado por partido (vacío: un solo archivo). SQLite
+# adjunta como máximo 10 bases por conexión: a partir de ahí los partidos
+# comparten archivo.
+DIR_PARTICIONES = os.environ.get("JNE_DIR_PARTICIONES", "")
+MAX_ARCHIVOS_PARTICION = int(os.environ.get("JNE_MAX_ARCHIVOS_PARTICION", "10"))
+
+# Fichas con DNI repetido: 'perito' las deriva directamente a peritos al
+# cargar el catálogo; 'prioridad' sólo las pone primero en la asignación
+DESTINO_SOSPECHOSAS = os.environ.get("JNE_DESTINO_SOSPECHOSAS", "perito")
+
+# Instrumentación (se activa con JNE_INSTRUMENTACION=1): buffer circular en
+# memoria y, opcionalmente, un JSONL local
+INSTRUMENTACION = os.environ.get("JNE_INSTRUMENTACION", "0") == "1"
+ARCHIVO_METRICAS = os.environ.get("JNE_ARCHIVO_METRICAS", "")
+MAX_EVENTOS_METRICAS = int(os.environ.get("JNE_MAX_EVENTOS_METRICAS", "5000"))
+LOTE_VOLCADO_METRICAS = 200
+UMBRAL_N_MAS_1 = 10
+
+# --- INSTRUMENTACIÓN ---
+# Tiempo y filas de cada consulta (cursor envuelto), sentencias reales por
+# rerun (set_trace_callback, incluye las de triggers) y tiempo por página.
+# El JSONL se escribe por lotes, fuera del candado de los eventos: al cerrar
+# cada rerun, al juntar LOTE_VOLCADO_METRICAS eventos y al salir el proceso.
+def _normalizar_sql(sql):
+    sql = re.sub(r"'[^']*'", "?", sql)
+    sql = re.sub(r"\b\d+\b", "?", sql)
+    return " ".join(sql.split())[:300]
+
+class Metricas:
+    def __init__(self, capacidad=MAX_EVENTOS_METRICAS, archivo=ARCHIVO_METRICAS):
+        self.eventos = deque(maxlen=capacidad)
+        self.archivo = archivo
+        self._candado = threading.Lock()
+        self._local = threading.local()
+        self._por_volcar = []
+        self._salida = None
+        self._candado_salida = threading.Lock()
+        if archivo:
+            atexit.register(self.volcar)
+
+    def registrar(self, evento):
+        evento['ts'] = round(time.time(), 3)
+        lleno = False
+        with self._candado:
+            self.eventos.append(evento)
+            if self.archivo:
+                self._por_volcar.append(evento)
+                lleno = len(self._por_volcar) >= LOTE_VOLCADO_METRICAS
+        if lleno:
+            self.volcar()
+        return evento
+
+    def volcar(self):
+        if not self.archivo:
+            return
+        with self._candado:
+            eventos, self._por_volcar = self._por_volcar, []
+        if not eventos:
+            return
+        # Un solo archivo abierto por proceso; el candado propio evita que se
+        # mezclen las líneas de dos volcados sin retener a registrar()
+        with self._candado_salida:
+            if self._salida is None:
+                self._salida = open(self.archivo, 'a', encoding='utf-8')
+            self._salida.write("".join(json.dumps(evento, ensure_ascii=False) + "\n" for evento in eventos))
+            self._salida.flush()
+
+    def consulta(self, sql, ms, filas):
+        normalizada = _normalizar_sql(sql)
+        consultas = getattr(self._local, 'consultas', None)
+        if consultas is not None:
+            consultas[normalizada] += 1
+        return self.registrar({'tipo': 'sql', 'sql': normalizada, 'ms': round(ms, 3), 'filas': filas,
+                               'pagina': getattr(self._local, 'pagina', None)})
+
+    def sentencia(self, _sql):
+        if getattr(self._local, 'consultas', None) is not None:
+            self._local.sentencias += 1
+
+    def rerun_activo(self):
+        return getattr(self._local, 'consultas', None) is not None
+
+    def iniciar_rerun(self):
+        self._local.pagina = None
+        self._local.pagina_rerun = None
+        self._local.consultas = Counter()
+        self._local.sentencias = 0
+        self._local.inicio = time.perf_counter()
+
+    def terminar_rerun(self):
+        consultas = getattr(self._local, 'consultas', None)
+        if consultas is None:
+            return
+        self._local.consultas = None
+        repetidas = {sql: n for sql, n in consultas.items() if n >= UMBRAL_N_MAS_1}
+        self.registrar({'tipo': 'rerun', 'pagina': getattr(self._local, 'pagina_rerun', None),
+                        'ms': round((time.perf_counter() - self._local.inicio) * 1000, 3),
+                        'consultas': sum(consultas.values()), 'sentencias': self._local.sentencias,
+                        'repetidas': repetidas})
+        self.volcar()
+
+    @contextmanager
+    def pagina(self, nombre):
+        anterior = getattr(self._local, 'pagina', None)
+        self._local.pagina = nombre
+        # El rerun se atribuye a la página más externa que se dibujó en él
+        if self.rerun_activo() and self._local.pagina_rerun is None:
+            self._local.pagina_rerun = nombre
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._local.pagina = anterior
+            self.registrar({'tipo': 'pagina', 'pagina': nombre,
+                            'ms': round((time.perf_counter() - inicio) * 1000, 3)})
+
+    def vaciar(self):
+        with self._candado:
+            self.eventos.clear()
+
+@st.cache_resource(show_spinner=False)
+def metricas_proceso():
+    return Metricas()
+
+def medir_pagina(funcion):
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        if not INSTRUMENTACION:
+            return funcion(*args, **kwargs)
+        metricas = metricas_proceso()
+        # El rerun de un fragmento no pasa por main(): lo abre y cierra la propia página
+        propio = not metricas.rerun_activo()
+        if propio:
+            metricas.iniciar_rerun()
+        try:
+            with metricas.pagina(funcion.__name__):
+                return funcion(*args, **kwargs)
+        finally:
+            if propio:
+                metricas.terminar_rerun()
+    return envoltura
+
+class CursorInstrumentado(sqlite3.Cursor):
+    # Las filas se cuentan en fetchall/fetchmany (y rowcount en escrituras):
+    # fetchone e iterar el cursor siguen en C, sin coste por fila
+    def _medir(self, metodo, sql, parametros):
+        inicio = time.perf_counter()
+        try:
+            return metodo(sql, parametros)
+        finally:
+            filas = self.rowcount if self.rowcount >= 0 else 0
+            self._evento = self.connection.metricas.consulta(sql, (time.perf_counter() - inicio) * 1000, filas)
+
+    def execute(self, sql, parametros=()):
+        return self._medir(super().execute, sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self._medir(super().executemany, sql, parametros)
+
+    def _contar(self, filas, inicio):
+        evento = getattr(self, '_evento', None)
+        if evento is not None:
+            evento['filas'] += len(filas)
+            evento['ms'] = round(evento['ms'] + (time.perf_counter() - inicio) * 1000, 3)
+        return filas
+
+    def fetchall(self):
+        inicio = time.perf_counter()
+        return self._contar(super().fetchall(), inicio)
+
+    def fetchmany(self, size=None):
+        inicio = time.perf_counter()
+        return self._contar(super().fetchmany(size if size is not None else self.arraysize), inicio)
+
+class ConexionInstrumentada(sqlite3.Connection):
+    def cursor(self, factory=CursorInstrumentado):
+        return super().cursor(factory)
+
+    def execute(self, sql, parametros=()):
+        return self.cursor().execute(sql, parametros)
+
+    def executemany(self, sql, parametros):
+        return self.cursor().executemany(sql, parametros)
+
+# --- CONEXIONES ---
+# Pool compartido por todas las sesiones: lectores independientes y un único
+# escritor serializado, de modo que las escrituras concurrentes hacen cola en
+# el proceso en vez de chocar con "database is locked".
+def abrir_conexion(ruta=None, config=CONFIG_SQLITE):
+    conn = sqlite3.connect(ruta or ARCHIVO_DB, check_same_thread=False, uri=True,
+                           timeout=config['busy_timeout_ms'] / 1000,
+                           factory=ConexionInstrumentada if INSTRUMENTACION else sqlite3.Connection)
+    if INSTRUMENTACION:
+        conn.metricas = metricas_proceso()
+        conn.set_trace_callback(conn.metricas.sentencia)
+    conn.execute(f"PRAGMA journal_mode = {config['journal_mode']}")
+    conn.execute(f"PRAGMA synchronous = {config['synchronous']}")
+    conn.execute(f"PRAGMA busy_timeout = {config['busy_timeout_ms']}")
+    conn.execute(f"PRAGMA cache_size = -{config['cache_size_kib']}")
+    conn.execute(f"PRAGMA mmap_size = {config['mmap_size']}")
+    return conn
+
+class PoolConexiones:
+    def __init__(self, ruta, config=CONFIG_SQLITE, preparar=None):
+        self.ruta = ruta
+        self.config = config
+        # preparar(conn, estado_previo) -> estado: se llama al tomar cada
+        # conexión, fuera de transacción (p. ej. para adjuntar particiones)
+        self.preparar = preparar
+        self._estados = {}
+        self._lectores = queue.LifoQueue()
+        self._abiertos = 0
+        self._candado_pool = threading.Lock()
+        self._escritor = None
+        self._candado_escritura = threading.RLock()
+        self._profundidad = 0
+
+    def _preparar(self, conn):
+        if self.preparar:
+            self._estados[conn] = self.preparar(conn, self._estados.get(conn))
+        return conn
+
+    def _tomar_lector(self):
+        try:
+            return self._lectores.get_nowait()
+        except queue.Empty:
+            pass
+        with self._candado_pool:
+            if self._abiertos < self.config['max_lectores']:
+                self._abiertos += 1
+                return abrir_conexion(self.ruta, self.config)
+        return self._lectores.get()
+
+    @contextmanager
+    def lectura(self):
+        conn = self._tomar_lector()
+        try:
+            yield self._preparar(conn)
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._lectores.put(conn)
+
+    @contextmanager
+    def escritura(self):
+        # Transacción BEGIN IMMEDIATE; los bloques anidados reutilizan la exterior
+        with self._candado_escritura:
+            if self._escritor is None:
+                self._escritor = abrir_conexion(self.ruta, self.config)
+            conn = self._escritor
+            if self._profundidad:
+                self._profundidad += 1
+                try:
+                    yield conn
+                finally:
+                    self._profundidad -= 1
+                return
+            self._preparar(conn)
+            conn.execute("BEGIN IMMEDIATE")
+            self._profundidad = 1
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._profundidad = 0
+
+    @contextmanager
+    def mantenimiento(self):
+        # Conexión aparte, sin transacción ni preparar (VACUUM no admite una
+        # transacción abierta ni vistas TEMP que tapen las tablas); el candado
+        # del escritor impide que se intercalen escrituras del proceso
+        with self._candado_escritura:
+            if self._profundidad:
+                raise RuntimeError("Mantenimiento dentro de una transacción de escritura")
+            conn = abrir_conexion(self.ruta, self.config)
+            try:
+                yield conn
+            finally:
+                conn.close()
+
+@st.cache_resource(show_spinner=False)
+def _pool_conexiones(ruta, particion=False):
+    if particion:
+        return PoolConexiones(ruta, preparar=_adjuntar_principal)
+    return PoolConexiones(ruta, preparar=_adjuntar_particiones if DIR_PARTICIONES else None)
+
+def db_lectura():
+    return _pool_conexiones(ARCHIVO_DB).lectura()
+
+def db_escritura(partido=None):
+    # Con particiones, las escrituras de un partido (código o nombre) van al
+    # escritor de su archivo y no compiten con las de otros partidos
+    if partido is None or not DIR_PARTICIONES:
+        return _pool_conexiones(ARCHIVO_DB).escritura()
+    return _pool_conexiones(ruta_particion(partido), True).escritura()
+
+@contextmanager
+def db_escritura_global():
+    # Escritor principal y el de cada partición, siempre en el mismo orden: las
+    # escrituras anidadas reutilizan estas transacciones y una excepción las
+    # revierte todas (sin commit en dos fases entre archivos)
+    with ExitStack() as pila:
+        conn = pila.enter_context(db_escritura())
+        if DIR_PARTICIONES:
+            for escritura in escritores_particiones():
+                pila.enter_context(escritura)
+        yield conn
+
 # --- BASE DE DATOS CON MEJORAS DE SEGURIDAD Y CONTROL ---
-def init_db():
-    with sqlite3.connect('jne_verification.db') as conn:
-        c = conn.cursor()
+# Agregados de progreso por (usuario, fecha, partido), recalculados desde las filas crudas
+_SQL_RESUMEN_ANALISTAS = '''SELECT usuario, COALESCE(fecha, ''), COALESCE(partido, ''),
+                                 COUNT(*), SUM(COALESCE(conforme, 0)), SUM(COALESCE(para_perito, 0))
+                          FROM {origen} GROUP BY 1, 2, 3'''
+_SQL_RESUMEN_PERITOS = '''SELECT usuario, COALESCE(fecha, ''), COALESCE(partido, ''),
+                               COUNT(*), SUM(COALESCE(autentica, 0)), SUM(COALESCE(falsa, 0)),
+                               SUM(COALESCE(tiempo_min, 0))
+                        FROM {origen} GROUP BY 1, 2, 3'''
+SQL_RESUMEN_ANALISTAS = _SQL_RESUMEN_ANALISTAS.format(origen='analistas')
+SQL_RESUMEN_PERITOS = _SQL_RESUMEN_PERITOS.format(origen='peritos')
+# Tras archivar, los resúmenes siguen contando también las filas históricas
+SQL_RESUMEN_ANALISTAS_COMPLETO = _SQL_RESUMEN_ANALISTAS.format(
+    origen='(SELECT * FROM analistas UNION ALL SELECT * FROM analistas_historico)')
+SQL_RESUMEN_PERITOS_COMPLETO = _SQL_RESUMEN_PERITOS.format(
+    origen='(SELECT * FROM peritos UNION ALL SELECT * FROM peritos_historico)')
+
+# Cada migración es (versión, descripción, sentencias). Las versiones aplicadas
+# se registran en schema_version; las bases existentes se actualizan in situ.
+MIGRACIONES = [
+    (1, "Esquema inicial", [
         # Usuarios con sal
-        c.execute('''CREATE TABLE IF NOT EXISTS usuarios (
-                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                     username TEXT UNIQUE,
-                     password TEXT,
-                     salt TEXT,
-                     nombre TEXT,
-                     rol TEXT,
-                     activo INTEGER)''')
+        '''CREATE TABLE IF NOT EXISTS usuarios (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           username TEXT UNIQUE,
+           password TEXT,
+           salt TEXT,
+           nombre TEXT,
+           rol TEXT,
+           activo INTEGER)''',
         # Analistas
-        c.execute('''CREATE TABLE IF NOT EXISTS analistas (
-                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                     fecha TEXT,
-                     usuario TEXT,
-                     partido TEXT,
-                     hora_inicio TEXT,
-                     hora_fin TEXT,
-                     num_fic TEXT,
-                     dni TEXT,
-                     conforme INTEGER,
-                     para_perito INTEGER,
-                     observaciones TEXT,
-                     timestamp TEXT,
-                     FOREIGN KEY(usuario) REFERENCES usuarios(username))''')
+        '''CREATE TABLE IF NOT EXISTS analistas (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           fecha TEXT,
+           usuario TEXT,
+           partido TEXT,
+           hora_inicio TEXT,
+           hora_fin TEXT,
+           num_fic TEXT,
+           dni TEXT,
+           conforme INTEGER,
+           para_perito INTEGER,
+           observaciones TEXT,
+           timestamp TEXT,
+           FOREIGN KEY(usuario) REFERENCES usuarios(username))''',
         # Peritos
-        c.execute('''CREATE TABLE IF NOT EXISTS peritos (
-                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                     fecha TEXT,
-                     usuario TEXT,
-                     partido TEXT,
-                     inicio_informes TEXT,
-                     fin_informes TEXT,
-                     dni TEXT,
-                     num_fic TEXT,
-                     autentica INTEGER,
-                     falsa INTEGER,
-                     tiempo_min INTEGER,
-                     observaciones TEXT,
-                     informe TEXT,
-                     timestamp TEXT,
-                     FOREIGN KEY(usuario) REFERENCES usuarios(username))''')
+        '''CREATE TABLE IF NOT EXISTS peritos (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           fecha TEXT,
+           usuario TEXT,
+           partido TEXT,
+           inicio_informes TEXT,
+           fin_informes TEXT,
+           dni TEXT,
+           num_fic TEXT,
+           autentica INTEGER,
+           falsa INTEGER,
+           tiempo_min INTEGER,
+           observaciones TEXT,
+           informe TEXT,
+           timestamp TEXT,
+           FOREIGN KEY(usuario) REFERENCES usuarios(username))''',
         # Asignaciones
-        c.execute('''CREATE TABLE IF NOT EXISTS asignaciones (
-                     id INTEGER PRIMARY KEY AUTOINCREMENT,
-                     dni TEXT,
-                     num_fic TEXT,
-                     partido TEXT,
-                     asignado_a TEXT,
-                     tipo_asignacion TEXT,
-                     fecha_asignacion TEXT,
-                     completado INTEGER,
-                     FOREIGN KEY(asignado_a) REFERENCES usuarios(username))''')
-        conn.commit()
+        '''CREATE TABLE IF NOT EXISTS asignaciones (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           dni TEXT,
+           num_fic TEXT,
+           partido TEXT,
+           asignado_a TEXT,
+           tipo_asignacion TEXT,
+           fecha_asignacion TEXT,
+           completado INTEGER,
+           FOREIGN KEY(asignado_a) REFERENCES usuarios(username))''',
+    ]),
+    (2, "Catálogo de fichas (espejo de fichas.xlsx)", [
+        '''CREATE TABLE IF NOT EXISTS fichas (
+           num_fic TEXT NOT NULL,
+           cod_dni TEXT NOT NULL,
+           cod_op TEXT NOT NULL,
+           item TEXT,
+           row_hash TEXT,
+           actualizado TEXT,
+           PRIMARY KEY (num_fic, cod_dni, cod_op))''',
+        "CREATE INDEX IF NOT EXISTS idx_fichas_dni ON fichas (cod_dni)",
+        "CREATE INDEX IF NOT EXISTS idx_fichas_op ON fichas (cod_op, num_fic)",
+    ]),
+    (3, "Índices para colas pendientes, duplicados y reportes", [
+        '''CREATE INDEX IF NOT EXISTS idx_asignaciones_pendientes
+           ON asignaciones (asignado_a, tipo_asignacion, completado)''',
+        '''CREATE INDEX IF NOT EXISTS idx_asignaciones_ficha
+           ON asignaciones (dni, num_fic, tipo_asignacion)''',
+        "CREATE INDEX IF NOT EXISTS idx_analistas_usuario_fecha ON analistas (usuario, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_peritos_usuario_fecha ON peritos (usuario, fecha)",
+    ]),
+    (4, "Resúmenes de progreso mantenidos por triggers", [
+        '''CREATE TABLE IF NOT EXISTS resumen_analistas (
+           usuario TEXT,
+           fecha TEXT,
+           partido TEXT,
+           fichas INTEGER NOT NULL DEFAULT 0,
+           conformes INTEGER NOT NULL DEFAULT 0,
+           derivados INTEGER NOT NULL DEFAULT 0,
+           PRIMARY KEY (usuario, fecha, partido))''',
+        '''CREATE TABLE IF NOT EXISTS resumen_peritos (
+           usuario TEXT,
+           fecha TEXT,
+           partido TEXT,
+           informes INTEGER NOT NULL DEFAULT 0,
+           autenticas INTEGER NOT NULL DEFAULT 0,
+           falsas INTEGER NOT NULL DEFAULT 0,
+           tiempo_min INTEGER NOT NULL DEFAULT 0,
+           PRIMARY KEY (usuario, fecha, partido))''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_resumen_analistas_insert AFTER INSERT ON analistas BEGIN
+           INSERT INTO resumen_analistas (usuario, fecha, partido, fichas, conformes, derivados)
+           VALUES (NEW.usuario, COALESCE(NEW.fecha, ''), COALESCE(NEW.partido, ''), 1,
+                   COALESCE(NEW.conforme, 0), COALESCE(NEW.para_perito, 0))
+           ON CONFLICT (usuario, fecha, partido) DO UPDATE SET
+               fichas = fichas + 1,
+               conformes = conformes + excluded.conformes,
+               derivados = derivados + excluded.derivados;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_resumen_analistas_update AFTER UPDATE ON analistas BEGIN
+           UPDATE resumen_analistas SET
+               fichas = fichas - 1,
+               conformes = conformes - COALESCE(OLD.conforme, 0),
+               derivados = derivados - COALESCE(OLD.para_perito, 0)
+           WHERE usuario = OLD.usuario AND fecha = COALESCE(OLD.fecha, '') AND partido = COALESCE(OLD.partido, '');
+           INSERT INTO resumen_analistas (usuario, fecha, partido, fichas, conformes, derivados)
+           VALUES (NEW.usuario, COALESCE(NEW.fecha, ''), COALESCE(NEW.partido, ''), 1,
+                   COALESCE(NEW.conforme, 0), COALESCE(NEW.para_perito, 0))
+           ON CONFLICT (usuario, fecha, partido) DO UPDATE SET
+               fichas = fichas + 1,
+               conformes = conformes + excluded.conformes,
+               derivados = derivados + excluded.derivados;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_resumen_peritos_insert AFTER INSERT ON peritos BEGIN
+           INSERT INTO resumen_peritos (usuario, fecha, partido, informes, autenticas, falsas, tiempo_min)
+           VALUES (NEW.usuario, COALESCE(NEW.fecha, ''), COALESCE(NEW.partido, ''), 1,
+                   COALESCE(NEW.autentica, 0), COALESCE(NEW.falsa, 0), COALESCE(NEW.tiempo_min, 0))
+           ON CONFLICT (usuario, fecha, partido) DO UPDATE SET
+               informes = informes + 1,
+               autenticas = autenticas + excluded.autenticas,
+               falsas = falsas + excluded.falsas,
+               tiempo_min = tiempo_min + excluded.tiempo_min;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_resumen_peritos_update AFTER UPDATE ON peritos BEGIN
+           UPDATE resumen_peritos SET
+               informes = informes - 1,
+               autenticas = autenticas - COALESCE(OLD.autentica, 0),
+               falsas = falsas - COALESCE(OLD.falsa, 0),
+               tiempo_min = tiempo_min - COALESCE(OLD.tiempo_min, 0)
+           WHERE usuario = OLD.usuario AND fecha = COALESCE(OLD.fecha, '') AND partido = COALESCE(OLD.partido, '');
+           INSERT INTO resumen_peritos (usuario, fecha, partido, informes, autenticas, falsas, tiempo_min)
+           VALUES (NEW.usuario, COALESCE(NEW.fecha, ''), COALESCE(NEW.partido, ''), 1,
+                   COALESCE(NEW.autentica, 0), COALESCE(NEW.falsa, 0), COALESCE(NEW.tiempo_min, 0))
+           ON CONFLICT (usuario, fecha, partido) DO UPDATE SET
+               informes = informes + 1,
+               autenticas = autenticas + excluded.autenticas,
+               falsas = falsas + excluded.falsas,
+               tiempo_min = tiempo_min + excluded.tiempo_min;
+           END''',
+        "INSERT INTO resumen_analistas " + SQL_RESUMEN_ANALISTAS,
+        "INSERT INTO resumen_peritos " + SQL_RESUMEN_PERITOS,
+    ]),
+    (5, "Contador de versión de datos", [
+        '''CREATE TABLE IF NOT EXISTS version_datos (
+           id INTEGER PRIMARY KEY CHECK (id = 1),
+           version INTEGER NOT NULL)''',
+        "INSERT OR IGNORE INTO version_datos (id, version) VALUES (1, 1)",
+    ] + [
+        f'''CREATE TRIGGER IF NOT EXISTS trg_version_{tabla}_{evento.lower()} AFTER {evento} ON {tabla} BEGIN
+            UPDATE version_datos SET version = version + 1 WHERE id = 1;
+            END'''
+        for tabla in ('analistas', 'peritos') for evento in ('INSERT', 'UPDATE', 'DELETE')
+    ]),
+    (6, "Unicidad de resultados por (usuario, num_fic, dni)", [
+        # Se conserva el registro más reciente de cada duplicado
+        '''DELETE FROM analistas WHERE id NOT IN
+           (SELECT MAX(id) FROM analistas GROUP BY usuario, num_fic, dni)''',
+        '''DELETE FROM peritos WHERE id NOT IN
+           (SELECT MAX(id) FROM peritos GROUP BY usuario, num_fic, dni)''',
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_analistas_ficha ON analistas (usuario, num_fic, dni)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_peritos_ficha ON peritos (usuario, num_fic, dni)",
+        "DELETE FROM resumen_analistas",
+        "INSERT INTO resumen_analistas " + SQL_RESUMEN_ANALISTAS,
+        "DELETE FROM resumen_peritos",
+        "INSERT INTO resumen_peritos " + SQL_RESUMEN_PERITOS,
+    ]),
+    (7, "Trabajos en segundo plano", [
+        '''CREATE TABLE IF NOT EXISTS trabajos (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           tipo TEXT NOT NULL,
+           parametros TEXT,
+           estado TEXT NOT NULL DEFAULT 'pendiente',
+           progreso REAL NOT NULL DEFAULT 0,
+           mensaje TEXT,
+           resultado TEXT,
+           error TEXT,
+           cancelar INTEGER NOT NULL DEFAULT 0,
+           creado_por TEXT,
+           creado TEXT,
+           iniciado TEXT,
+           terminado TEXT)''',
+        "CREATE INDEX IF NOT EXISTS idx_trabajos_estado ON trabajos (estado)",
+        "CREATE INDEX IF NOT EXISTS idx_trabajos_creado_por ON trabajos (creado_por, id)",
+    ]),
+    (8, "Registro de partidos y archivos de partición", [
+        '''CREATE TABLE IF NOT EXISTS particiones (
+           numero INTEGER PRIMARY KEY,
+           archivo TEXT NOT NULL UNIQUE)''',
+        '''CREATE TABLE IF NOT EXISTS partidos (
+           cod_op TEXT PRIMARY KEY,
+           nombre TEXT NOT NULL UNIQUE,
+           particion INTEGER REFERENCES particiones(numero))''',
+        # Mismo formato de nombre que ya guardan asignaciones y resultados
+        "INSERT OR IGNORE INTO partidos (cod_op, nombre) SELECT DISTINCT cod_op, 'Partido ' || cod_op FROM fichas",
+    ]),
+    (9, "DNI repetidos en el catálogo", [
+        '''CREATE TABLE IF NOT EXISTS dni_sospechosos (
+           dni TEXT PRIMARY KEY,
+           fichas INTEGER NOT NULL,
+           partidos INTEGER NOT NULL,
+           detectado TEXT)''',
+        # Carga inicial; después la mantiene actualizar_sospechosos() en cada ingesta
+        '''INSERT OR IGNORE INTO dni_sospechosos (dni, fichas, partidos, detectado)
+           SELECT cod_dni, COUNT(DISTINCT num_fic), COUNT(DISTINCT cod_op), datetime('now', 'localtime')
+           FROM fichas WHERE cod_dni <> '' GROUP BY cod_dni
+           HAVING COUNT(DISTINCT num_fic) > 1 OR COUNT(DISTINCT cod_op) > 1''',
+    ]),
+    (10, "Índices por hora de registro para el rendimiento del tablero", [
+        "CREATE INDEX IF NOT EXISTS idx_analistas_timestamp ON analistas (timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_peritos_timestamp ON peritos (timestamp)",
+    ]),
+    (11, "Tablas históricas por fecha y registro de mantenimiento", [
+        # Mismas columnas que las tablas calientes: SELECT * de una y otra se unen
+        '''CREATE TABLE IF NOT EXISTS analistas_historico (
+           id INTEGER PRIMARY KEY,
+           fecha TEXT,
+           usuario TEXT,
+           partido TEXT,
+           hora_inicio TEXT,
+           hora_fin TEXT,
+           num_fic TEXT,
+           dni TEXT,
+           conforme INTEGER,
+           para_perito INTEGER,
+           observaciones TEXT,
+           timestamp TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS peritos_historico (
+           id INTEGER PRIMARY KEY,
+           fecha TEXT,
+           usuario TEXT,
+           partido TEXT,
+           inicio_informes TEXT,
+           fin_informes TEXT,
+           dni TEXT,
+           num_fic TEXT,
+           autentica INTEGER,
+           falsa INTEGER,
+           tiempo_min INTEGER,
+           observaciones TEXT,
+           informe TEXT,
+           timestamp TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS asignaciones_historico (
+           id INTEGER PRIMARY KEY,
+           dni TEXT,
+           num_fic TEXT,
+           partido TEXT,
+           asignado_a TEXT,
+           tipo_asignacion TEXT,
+           fecha_asignacion TEXT,
+           completado INTEGER)''',
+        "CREATE INDEX IF NOT EXISTS idx_analistas_historico_fecha ON analistas_historico (fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_peritos_historico_fecha ON peritos_historico (fecha)",
+        '''CREATE INDEX IF NOT EXISTS idx_asignaciones_historico_ficha
+           ON asignaciones_historico (dni, num_fic, tipo_asignacion)''',
+        # Búsqueda de los días cerrados en las tablas calientes
+        "CREATE INDEX IF NOT EXISTS idx_analistas_fecha ON analistas (fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_peritos_fecha ON peritos (fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_asignaciones_fecha ON asignaciones (fecha_asignacion)",
+        '''CREATE TABLE IF NOT EXISTS mantenimientos (
+           id INTEGER PRIMARY KEY AUTOINCREMENT,
+           corte TEXT NOT NULL,
+           archivadas INTEGER,
+           compactados INTEGER,
+           inicio TEXT,
+           fin TEXT)''',
+    ]),
+    (12, "Estado explícito de las asignaciones", [
+        "ALTER TABLE asignaciones ADD COLUMN estado TEXT NOT NULL DEFAULT 'pendiente'",
+        "ALTER TABLE asignaciones_historico ADD COLUMN estado TEXT NOT NULL DEFAULT 'pendiente'",
+        # Las analistas cerradas con un resultado "para perito" quedan como derivadas
+        '''UPDATE asignaciones SET estado = CASE WHEN tipo_asignacion = 'analista' AND EXISTS (
+               SELECT 1 FROM analistas r WHERE r.usuario = asignaciones.asignado_a
+                   AND r.num_fic = asignaciones.num_fic AND r.dni = asignaciones.dni AND r.para_perito = 1)
+               THEN 'derivado' ELSE 'completado' END
+           WHERE completado = 1''',
+        '''UPDATE asignaciones_historico SET estado = CASE WHEN tipo_asignacion = 'analista' AND EXISTS (
+               SELECT 1 FROM (SELECT usuario, num_fic, dni, para_perito FROM analistas
+                              UNION ALL SELECT usuario, num_fic, dni, para_perito FROM analistas_historico) r
+               WHERE r.usuario = asignaciones_historico.asignado_a AND r.num_fic = asignaciones_historico.num_fic
+                   AND r.dni = asignaciones_historico.dni AND r.para_perito = 1)
+               THEN 'derivado' ELSE 'completado' END
+           WHERE completado = 1''',
+        # La cola sólo indexa lo activo: su tamaño no depende del historial
+        "DROP INDEX IF EXISTS idx_asignaciones_pendientes",
+        '''CREATE INDEX IF NOT EXISTS idx_asignaciones_activas ON asignaciones (asignado_a, tipo_asignacion, id)
+           WHERE estado IN ('pendiente', 'en_curso')''',
+        # Escritores que sólo conocen completado (importaciones externas, scripts)
+        '''CREATE TRIGGER IF NOT EXISTS trg_asignaciones_completado_insert AFTER INSERT ON asignaciones
+           WHEN NEW.completado = 1 AND NEW.estado IN ('pendiente', 'en_curso') BEGIN
+           UPDATE asignaciones SET estado = 'completado' WHERE id = NEW.id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_asignaciones_completado_update AFTER UPDATE OF completado ON asignaciones
+           WHEN (NEW.completado = 1) <> (NEW.estado IN ('completado', 'derivado')) BEGIN
+           UPDATE asignaciones SET estado = CASE WHEN NEW.completado = 1 THEN 'completado' ELSE 'pendiente' END
+           WHERE id = NEW.id;
+           END''',
+    ]),
+    (13, "Bolsa compartida de fichas con reclamos por préstamo", [
+        "ALTER TABLE asignaciones ADD COLUMN vence_reclamo TEXT",
+        "ALTER TABLE asignaciones_historico ADD COLUMN vence_reclamo TEXT",
+        # Fichas sin destinatario, en el orden en que se publicaron
+        '''CREATE INDEX IF NOT EXISTS idx_asignaciones_bolsa ON asignaciones (partido, tipo_asignacion, id)
+           WHERE asignado_a IS NULL AND estado = 'pendiente\'''',
+        '''CREATE INDEX IF NOT EXISTS idx_asignaciones_reclamos ON asignaciones (vence_reclamo)
+           WHERE estado = 'en_curso' AND vence_reclamo IS NOT NULL''',
+    ]),
+    (14, "Búsqueda de texto en observaciones e índices del explorador", [
+        # FTS5 de contenido externo: el texto vive en la tabla, el índice sólo
+        # guarda los términos (sin tildes ni mayúsculas)
+        f'''CREATE VIRTUAL TABLE IF NOT EXISTS {tabla}_fts USING fts5(
+            observaciones, content='{tabla}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2')'''
+        for tabla in ('analistas', 'peritos', 'analistas_historico', 'peritos_historico')
+    ] + [
+        sentencia
+        for tabla in ('analistas', 'peritos', 'analistas_historico', 'peritos_historico')
+        for sentencia in (
+            f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_insert AFTER INSERT ON {tabla} BEGIN
+                INSERT INTO {tabla}_fts (rowid, observaciones) VALUES (NEW.id, NEW.observaciones);
+                END''',
+            f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_delete AFTER DELETE ON {tabla} BEGIN
+                INSERT INTO {tabla}_fts ({tabla}_fts, rowid, observaciones)
+                VALUES ('delete', OLD.id, OLD.observaciones);
+                END''',
+            f'''CREATE TRIGGER IF NOT EXISTS trg_{tabla}_fts_update AFTER UPDATE OF observaciones ON {tabla}
+                WHEN OLD.observaciones IS NOT NEW.observaciones BEGIN
+                INSERT INTO {tabla}_fts ({tabla}_fts, rowid, observaciones)
+                VALUES ('delete', OLD.id, OLD.observaciones);
+                INSERT INTO {tabla}_fts (rowid, observaciones) VALUES (NEW.id, NEW.observaciones);
+                END''',
+            f"INSERT INTO {tabla}_fts ({tabla}_fts) VALUES ('rebuild')",
+        )
+    ] + [
+        "CREATE INDEX IF NOT EXISTS idx_analistas_partido_fecha ON analistas (partido, fecha)",
+        "CREATE INDEX IF NOT EXISTS idx_peritos_partido_fecha ON peritos (partido, fecha)",
+        # Las marcas poco frecuentes se filtran por índice parcial
+        "CREATE INDEX IF NOT EXISTS idx_analistas_para_perito ON analistas (partido, fecha) WHERE para_perito = 1",
+        "CREATE INDEX IF NOT EXISTS idx_peritos_falsas ON peritos (partido, fecha) WHERE falsa = 1",
+    ]),
+    (15, "Latido de los trabajos en segundo plano", [
+        "ALTER TABLE trabajos ADD COLUMN latido TEXT",
+    ]),
+    (16, "Estado de las asignaciones según sus resultados", [
+        # La versión original nunca marcaba completado en las asignaciones de
+        # analista: las que ya tienen resultado se cierran como en la migración 12
+        '''UPDATE asignaciones SET completado = 1, estado = CASE WHEN EXISTS (
+               SELECT 1 FROM (SELECT usuario, num_fic, dni, para_perito FROM analistas
+                              UNION ALL SELECT usuario, num_fic, dni, para_perito FROM analistas_historico) r
+               WHERE r.usuario = asignaciones.asignado_a AND r.num_fic = asignaciones.num_fic
+                   AND r.dni = asignaciones.dni AND r.para_perito = 1)
+               THEN 'derivado' ELSE 'completado' END
+           WHERE tipo_asignacion = 'analista' AND estado IN ('pendiente', 'en_curso') AND EXISTS (
+               SELECT 1 FROM (SELECT usuario, num_fic, dni FROM analistas
+                              UNION ALL SELECT usuario, num_fic, dni FROM analistas_historico) r
+               WHERE r.usuario = asignaciones.asignado_a AND r.num_fic = asignaciones.num_fic
+                   AND r.dni = asignaciones.dni)''',
+        # ...y cerraba las de perito por DNI y partido: sin informe propio
+        # vuelven a la cola, también las que ya se habían archivado
+        '''UPDATE asignaciones SET completado = 0, estado = 'pendiente'
+           WHERE tipo_asignacion = 'perito' AND estado = 'completado' AND NOT EXISTS (
+               SELECT 1 FROM (SELECT usuario, num_fic, dni FROM peritos
+                              UNION ALL SELECT usuario, num_fic, dni FROM peritos_historico) r
+               WHERE r.usuario = asignaciones.asignado_a AND r.num_fic = asignaciones.num_fic
+                   AND r.dni = asignaciones.dni)''',
+        '''UPDATE asignaciones_historico SET completado = 0, estado = 'pendiente'
+           WHERE tipo_asignacion = 'perito' AND estado = 'completado' AND NOT EXISTS (
+               SELECT 1 FROM (SELECT usuario, num_fic, dni FROM peritos
+                              UNION ALL SELECT usuario, num_fic, dni FROM peritos_historico) r
+               WHERE r.usuario = asignaciones_historico.asignado_a AND r.num_fic = asignaciones_historico.num_fic
+                   AND r.dni = asignaciones_historico.dni)''',
+        "INSERT INTO asignaciones SELECT * FROM asignaciones_historico WHERE estado = 'pendiente'",
+        "DELETE FROM asignaciones_historico WHERE estado = 'pendiente'",
+    ]),
+]
+
+def aplicar_migraciones(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    descripcion TEXT,
+                    aplicada TEXT)''')
+    aplicadas = []
+    # Lectura sin bloqueo primero: en un arranque con el esquema al día no se
+    # toma el lock de escritura ni una vez
+    existentes = {v for (v,) in conn.execute("SELECT version FROM schema_version")}
+    for version, descripcion, sentencias in MIGRACIONES:
+        if version in existentes:
+            continue
+        # BEGIN IMMEDIATE serializa a otros procesos que migren a la vez
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                conn.rollback()
+                continue
+            for sentencia in sentencias:
+                conn.execute(sentencia)
+            conn.execute("INSERT INTO schema_version (version, descripcion, aplicada) VALUES (?, ?, ?)",
+                         (version, descripcion, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+            conn.commit()
+            aplicadas.append(version)
+        except Exception:
+            conn.rollback()
+            raise
+    return aplicadas
+
+def init_db():
+    conn = abrir_conexion()
+    try:
+        aplicadas = aplicar_migraciones(conn)
+        particiones = conn.execute("SELECT numero, archivo FROM particiones").fetchall()
+    finally:
+        conn.close()
+    # Cada archivo de partición lleva el mismo esquema, índices y triggers
+    if DIR_PARTICIONES:
+        for numero, archivo in particiones:
+            preparar_particion(os.path.join(DIR_PARTICIONES, archivo), numero)
+    return aplicadas
 
 def create_admin_user():
-    with sqlite3.connect('jne_verification.db') as conn:
+    with db_escritura() as conn:
         c = conn.cursor()
         c.execute("SELECT * FROM usuarios WHERE username='admin'")
         if not c.fetchone():
@@ -86,7 +802,370 @@ def create_admin_user():
             hashed_password = hashlib.sha256(('admin123' + salt).encode()).hexdigest()
             c.execute("INSERT INTO usuarios (username, password, salt, nombre, rol, activo) VALUES (?, ?, ?, ?, ?, ?)",
                       ('admin', hashed_password, salt, 'Administrador', 'admin', 1))
-            conn.commit()
+
+# --- PARTICIONES POR PARTIDO ---
+# Con DIR_PARTICIONES, asignaciones, analistas y peritos (con sus resúmenes)
+# viven en un archivo por partido, enrutado por COD_OP, con su propio escritor.
+# La base principal conserva usuarios, fichas, trabajos y el registro de
+# partidos; sus conexiones adjuntan las particiones en sólo lectura y crean
+# vistas TEMP UNION ALL con el nombre de cada tabla, de modo que reportes,
+# exportaciones y colas usan las mismas consultas que con un solo archivo.
+TABLAS_HISTORICAS = {'asignaciones': 'asignaciones_historico', 'analistas': 'analistas_historico',
+                     'peritos': 'peritos_historico'}
+TABLAS_PARTICIONADAS = (['asignaciones', 'analistas', 'peritos', 'resumen_analistas', 'resumen_peritos']
+                        + list(TABLAS_HISTORICAS.values()))
+TABLAS_CON_ID = ['asignaciones', 'analistas', 'peritos']
+# Tablas cuyos registros se reparten por partido al particionar una base
+TABLAS_POR_PARTIDO = TABLAS_CON_ID + list(TABLAS_HISTORICAS.values())
+# Los ids de la partición N empiezan en N << 40: no chocan entre archivos
+BITS_ID_PARTICION = 40
+TTL_REGISTRO_PARTICIONES = 60
+
+class RegistroParticiones:
+    # Copia en memoria de las tablas partidos y particiones, releída cada
+    # TTL_REGISTRO_PARTICIONES segundos o tras dar de alta un partido
+    def __init__(self):
+        self.generacion = 0
+        self.partidos = {}
+        self.particion = {}
+        self.archivos = {}
+        self._leido = None
+        self._candado = threading.Lock()
+
+    def actualizar(self, conn, forzar=False):
+        if not forzar and self._leido is not None and time.monotonic() - self._leido < TTL_REGISTRO_PARTICIONES:
+            return
+        filas = conn.execute("SELECT cod_op, nombre, particion FROM partidos "
+                             "ORDER BY LENGTH(cod_op), cod_op").fetchall()
+        archivos = {numero: os.path.join(DIR_PARTICIONES, archivo) for numero, archivo
+                    in conn.execute("SELECT numero, archivo FROM particiones ORDER BY numero")}
+        with self._candado:
+            if archivos != self.archivos:
+                self.generacion += 1
+            self.archivos = archivos
+            self.partidos = {cod: nombre for cod, nombre, _ in filas}
+            self.particion = {clave: particion for cod, nombre, particion in filas for clave in (cod, nombre)}
+            self._leido = time.monotonic()
+
+    def invalidar(self):
+        self._leido = None
+
+@st.cache_resource(show_spinner=False)
+def registro_particiones():
+    return RegistroParticiones()
+
+def _uri_solo_lectura(ruta):
+    return f"file:{urllib.parse.quote(os.path.abspath(ruta))}?mode=ro"
+
+def _adjuntar_particiones(conn, generacion):
+    # Conexiones de la base principal: se vuelven a adjuntar los archivos
+    # cuando el registro cambia. En sólo lectura, un BEGIN IMMEDIATE del
+    # escritor principal no bloquea a los escritores de partición.
+    registro = registro_particiones()
+    registro.actualizar(conn)
+    if generacion == registro.generacion:
+        return generacion
+    for tabla in TABLAS_PARTICIONADAS + ['version_datos']:
+        conn.execute(f"DROP VIEW IF EXISTS temp.{tabla}")
+    for (esquema,) in conn.execute("SELECT name FROM pragma_database_list "
+                                   "WHERE name NOT IN ('main', 'temp')").fetchall():
+        conn.execute(f"DETACH DATABASE {esquema}")
+    esquemas = ['main']
+    for numero, ruta in registro.archivos.items():
+        conn.execute(f"ATTACH DATABASE ? AS p{numero}", (_uri_solo_lectura(ruta),))
+        esquemas.append(f"p{numero}")
+    # Las tablas propias de la principal quedan vacías tras particionar_base()
+    for tabla in TABLAS_PARTICIONADAS:
+        conn.execute(f"CREATE TEMP VIEW {tabla} AS "
+                     + " UNION ALL ".join(f"SELECT * FROM {esquema}.{tabla}" for esquema in esquemas))
+    # Cada archivo cuenta sus escrituras: la suma sólo crece
+    conn.execute("CREATE TEMP VIEW version_datos AS SELECT 1 AS id, SUM(version) AS version FROM ("
+                 + " UNION ALL ".join(f"SELECT version FROM {esquema}.version_datos" for esquema in esquemas) + ")")
+    return registro.generacion
+
+def _adjuntar_principal(conn, adjuntada):
+    # Escritores de partición: las fichas se leen de la base principal
+    if not adjuntada:
+        conn.execute("ATTACH DATABASE ? AS principal", (_uri_solo_lectura(ARCHIVO_DB),))
+        conn.execute("CREATE TEMP VIEW IF NOT EXISTS fichas AS SELECT rowid, * FROM principal.fichas")
+        conn.execute("CREATE TEMP VIEW IF NOT EXISTS dni_sospechosos AS SELECT * FROM principal.dni_sospechosos")
+    return True
+
+def preparar_particion(ruta, numero):
+    # Esquema completo (mismas migraciones que la principal) e ids desde numero << 40
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    conn = abrir_conexion(ruta)
+    try:
+        aplicar_migraciones(conn)
+        conn.executemany("INSERT INTO sqlite_sequence (name, seq) SELECT ?, ? "
+                         "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)",
+                         [(tabla, numero << BITS_ID_PARTICION, tabla) for tabla in TABLAS_CON_ID])
+        conn.commit()
+    finally:
+        conn.close()
+
+def _particion_para(conn, cod):
+    archivos = conn.execute("SELECT COUNT(*) FROM particiones").fetchone()[0]
+    if archivos >= MAX_ARCHIVOS_PARTICION:
+        # Sin más archivos adjuntables: reparto circular entre los existentes
+        con_particion = conn.execute("SELECT COUNT(*) FROM partidos WHERE particion IS NOT NULL").fetchone()[0]
+        return con_particion % archivos + 1
+    archivo = f"partido_{re.sub(r'[^0-9A-Za-z_-]', '_', cod)}.db"
+    numero = conn.execute("INSERT INTO particiones (archivo) VALUES (?) RETURNING numero", (archivo,)).fetchall()[0][0]
+    preparar_particion(os.path.join(DIR_PARTICIONES, archivo), numero)
+    return numero
+
+def registrar_partidos(codigos):
+    # Alta de los COD_OP nuevos del catálogo y, con particiones, asignación de
+    # archivo a los partidos que aún no lo tienen
+    with db_escritura() as conn:
+        conocidos = {row[0] for row in conn.execute("SELECT cod_op FROM partidos")}
+        nuevos = sorted(set(codigos) - conocidos, key=lambda cod: (len(cod), cod))
+        conn.executemany("INSERT INTO partidos (cod_op, nombre) VALUES (?, ?)",
+                         [(cod, f"Partido {cod}") for cod in nuevos])
+        asignados = 0
+        if DIR_PARTICIONES:
+            for (cod,) in conn.execute("SELECT cod_op FROM partidos WHERE particion IS NULL "
+                                       "ORDER BY LENGTH(cod_op), cod_op").fetchall():
+                conn.execute("UPDATE partidos SET particion = ? WHERE cod_op = ?", (_particion_para(conn, cod), cod))
+                asignados += 1
+    if nuevos or asignados:
+        registro_particiones().invalidar()
+    return nuevos
+
+def partidos():
+    # {COD_OP: nombre} de los partidos del catálogo
+    registro = registro_particiones()
+    with db_lectura() as conn:
+        registro.actualizar(conn)
+    return dict(registro.partidos)
+
+def ruta_particion(partido):
+    registro = registro_particiones()
+    if partido not in registro.particion:
+        with db_lectura() as conn:
+            registro.actualizar(conn, forzar=True)
+    numero = registro.particion.get(partido)
+    if numero is None:
+        raise ValueError(f"Partido sin partición registrada: {partido}")
+    return registro.archivos[numero]
+
+def pools_particiones():
+    # Pool de cada archivo que guarda resultados: el principal, o cada
+    # partición en modo particionado
+    if not DIR_PARTICIONES:
+        return [_pool_conexiones(ARCHIVO_DB)]
+    registro = registro_particiones()
+    with db_lectura() as conn:
+        registro.actualizar(conn)
+    return [_pool_conexiones(ruta, True) for ruta in registro.archivos.values()]
+
+def escritores_particiones():
+    return [pool.escritura() for pool in pools_particiones()]
+
+def _por_particion(resultados):
+    # Grupos (partido, filas) que comparten archivo; sin particiones, uno solo
+    if not DIR_PARTICIONES:
+        return [(None, resultados)]
+    grupos = {}
+    for res in resultados:
+        grupos.setdefault(ruta_particion(res['partido']), []).append(res)
+    return [(grupo[0]['partido'], grupo) for grupo in grupos.values()]
+
+def filas_sin_particionar():
+    with db_lectura() as conn:
+        return sum(conn.execute(f"SELECT COUNT(*) FROM main.{tabla}").fetchone()[0] for tabla in TABLAS_POR_PARTIDO)
+
+def particionar_base():
+    # Herramienta de migración: mueve a sus particiones las filas de una base
+    # de archivo único. INSERT OR IGNORE la hace repetible si se interrumpe.
+    if not DIR_PARTICIONES:
+        raise ValueError("Define JNE_DIR_PARTICIONES para particionar la base")
+    with db_lectura() as conn:
+        codigos = [row[0] for row in conn.execute("SELECT DISTINCT cod_op FROM fichas")]
+    registrar_partidos(codigos)
+    registro = registro_particiones()
+    with db_lectura() as conn:
+        registro.actualizar(conn, forzar=True)
+        nombres = {row[0] for tabla in TABLAS_POR_PARTIDO
+                   for row in conn.execute(f"SELECT DISTINCT partido FROM main.{tabla}")}
+    desconocidos = sorted(str(nombre) for nombre in nombres if nombre not in registro.particion)
+    if desconocidos:
+        raise ValueError(f"Registros con partido sin partición: {', '.join(desconocidos)}")
+    movidas = dict.fromkeys(TABLAS_POR_PARTIDO, 0)
+    with db_escritura_global() as principal:
+        antes = _totales_resumen(principal)
+        for ruta in registro.archivos.values():
+            with _pool_conexiones(ruta, True).escritura() as conn:
+                antes = [a + b for a, b in zip(antes, _totales_resumen(conn))]
+        for numero, ruta in registro.archivos.items():
+            claves = [clave for clave, particion in registro.particion.items() if particion == numero]
+            marcadores = ', '.join('?' for _ in claves)
+            # Anidada: reutiliza la transacción abierta por db_escritura_global
+            with _pool_conexiones(ruta, True).escritura() as conn:
+                for tabla in TABLAS_POR_PARTIDO:
+                    movidas[tabla] += conn.execute(f"INSERT OR IGNORE INTO {tabla} SELECT * FROM principal.{tabla} "
+                                                   f"WHERE partido IN ({marcadores})", claves).rowcount
+                # Los triggers sólo cuentan las filas calientes copiadas: el
+                # resumen de la partición se recalcula también con el histórico
+                for tabla, sql in (('resumen_analistas', SQL_RESUMEN_ANALISTAS_COMPLETO),
+                                   ('resumen_peritos', SQL_RESUMEN_PERITOS_COMPLETO)):
+                    conn.execute(f"DELETE FROM {tabla}")
+                    conn.execute(f"INSERT INTO {tabla} " + sql)
+        for tabla in TABLAS_PARTICIONADAS:
+            principal.execute(f"DELETE FROM main.{tabla}")
+        despues = [0] * len(antes)
+        for ruta in registro.archivos.values():
+            with _pool_conexiones(ruta, True).escritura() as conn:
+                despues = [a + b for a, b in zip(despues, _totales_resumen(conn))]
+        if despues != antes:
+            # La excepción revierte la transacción global: la base queda como estaba
+            raise RuntimeError(f"Los totales de los resúmenes cambiarían al particionar: {antes} → {despues}")
+    return movidas
+
+def _totales_resumen(conn):
+    return [*conn.execute("SELECT COALESCE(SUM(fichas), 0), COALESCE(SUM(conformes), 0), "
+                          "COALESCE(SUM(derivados), 0) FROM main.resumen_analistas").fetchone(),
+            *conn.execute("SELECT COALESCE(SUM(informes), 0), COALESCE(SUM(autenticas), 0), "
+                          "COALESCE(SUM(falsas), 0), COALESCE(SUM(tiempo_min), 0) "
+                          "FROM main.resumen_peritos").fetchone()]
+
+# --- RESÚMENES DE PROGRESO ---
+def reconstruir_resumenes():
+    # Recalcula los resúmenes desde las filas crudas y devuelve las diferencias
+    # que había respecto de lo mantenido por los triggers (archivo por archivo)
+    diferencias = {'resumen_analistas': 0, 'resumen_peritos': 0}
+    for escritura in escritores_particiones():
+        with escritura as conn:
+            diferencias['resumen_analistas'] += _diferencias_resumen(conn, 'resumen_analistas',
+                                                                     SQL_RESUMEN_ANALISTAS_COMPLETO)
+            diferencias['resumen_peritos'] += _diferencias_resumen(conn, 'resumen_peritos',
+                                                                   SQL_RESUMEN_PERITOS_COMPLETO)
+            conn.execute("DELETE FROM resumen_analistas")
+            conn.execute("INSERT INTO resumen_analistas " + SQL_RESUMEN_ANALISTAS_COMPLETO)
+            conn.execute("DELETE FROM resumen_peritos")
+            conn.execute("INSERT INTO resumen_peritos " + SQL_RESUMEN_PERITOS_COMPLETO)
+    return diferencias
+
+def _diferencias_resumen(conn, tabla, sql_crudo):
+    # Filas presentes en un lado y no en el otro (EXCEPT en ambos sentidos)
+    mantenido = f"SELECT * FROM {tabla}"
+    return conn.execute(f"SELECT COUNT(*) FROM (SELECT * FROM ({mantenido} EXCEPT {sql_crudo}) "
+                        f"UNION ALL SELECT * FROM ({sql_crudo} EXCEPT {mantenido}))").fetchone()[0]
+
+# --- ARCHIVO HISTÓRICO Y MANTENIMIENTO ---
+# Los días cerrados (anteriores a DIAS_RETENCION) pasan de las tablas calientes
+# a las *_historico del mismo archivo, un día por transacción; las asignaciones,
+# sólo si están completadas. Los resúmenes no cambian (no hay trigger de
+# borrado) y las exportaciones leen la unión cuando el rango llega al histórico.
+DIAS_RETENCION = int(os.environ.get("JNE_DIAS_RETENCION", "14"))
+INTERVALO_MANTENIMIENTO_H = float(os.environ.get("JNE_INTERVALO_MANTENIMIENTO_H", "24"))
+REVISION_MANTENIMIENTO_S = 600
+UMBRAL_PAGINAS_LIBRES = 0.25
+COLUMNAS_FECHA = {'asignaciones': 'fecha_asignacion', 'analistas': 'fecha', 'peritos': 'fecha'}
+
+def _condicion_archivo(tabla):
+    condicion = f"{COLUMNAS_FECHA[tabla]} = ?"
+    # Las pendientes siguen en la cola aunque sean antiguas
+    return condicion + f" AND NOT {SQL_ACTIVA}" if tabla == 'asignaciones' else condicion
+
+def _dias_por_archivar(conn, corte):
+    return [row[0] for row in conn.execute(
+        f'''SELECT fecha FROM analistas WHERE fecha < :corte
+           UNION SELECT fecha FROM peritos WHERE fecha < :corte
+           UNION SELECT fecha_asignacion FROM asignaciones WHERE fecha_asignacion < :corte AND NOT {SQL_ACTIVA}
+           ORDER BY 1''', {'corte': corte})]
+
+def archivar_historial(corte, avance=None):
+    pendientes = []
+    for pool in pools_particiones():
+        with pool.lectura() as conn:
+            pendientes.extend((pool, dia) for dia in _dias_por_archivar(conn, corte))
+    movidas = dict.fromkeys(TABLAS_HISTORICAS, 0)
+    for n, (pool, dia) in enumerate(pendientes, start=1):
+        # Transacciones cortas: los guardados interactivos esperan un día, no el archivo completo
+        with pool.escritura() as conn:
+            for tabla, historica in TABLAS_HISTORICAS.items():
+                condicion = _condicion_archivo(tabla)
+                movidas[tabla] += conn.execute(f"INSERT INTO {historica} SELECT * FROM {tabla} WHERE {condicion}",
+                                               (dia,)).rowcount
+                conn.execute(f"DELETE FROM {tabla} WHERE {condicion}", (dia,))
+        if avance:
+            avance(n / len(pendientes), f"{n} de {len(pendientes)} días archivados ({dia})")
+    return movidas
+
+def compactar_archivos():
+    # ANALYZE acotado en cada archivo; VACUUM sólo si las páginas libres pasan
+    # del umbral, porque reescribe el archivo con el escritor tomado
+    pools = [_pool_conexiones(ARCHIVO_DB)] + (pools_particiones() if DIR_PARTICIONES else [])
+    compactados = 0
+    for pool in pools:
+        with pool.mantenimiento() as conn:
+            paginas = conn.execute("PRAGMA page_count").fetchone()[0]
+            libres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if paginas and libres / paginas >= UMBRAL_PAGINAS_LIBRES:
+                conn.execute("VACUUM")
+                compactados += 1
+            conn.execute("PRAGMA analysis_limit = 1000")
+            conn.execute("ANALYZE")
+    return compactados
+
+def fecha_corte_historico(conn):
+    # Todo lo archivado es anterior a este día (None: nada archivado)
+    return conn.execute("SELECT MAX(corte) FROM mantenimientos").fetchone()[0]
+
+def ejecutar_mantenimiento(dias_retencion=DIAS_RETENCION, avance=None):
+    corte = (datetime.now() - timedelta(days=dias_retencion)).strftime("%Y-%m-%d")
+    # El corte se registra antes de mover filas: una exportación que empiece a
+    # mitad del archivo ya lee también el histórico
+    with db_escritura() as conn:
+        mantenimiento_id = conn.execute("INSERT INTO mantenimientos (corte, inicio) VALUES (?, ?) RETURNING id",
+                                        (corte, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))).fetchall()[0][0]
+    movidas = archivar_historial(corte, avance)
+    compactados = compactar_archivos()
+    resultados = limpiar_resultados_trabajos()
+    with db_escritura() as conn:
+        conn.execute("UPDATE mantenimientos SET archivadas = ?, compactados = ?, fin = ? WHERE id = ?",
+                     (sum(movidas.values()), compactados, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                      mantenimiento_id))
+    return {'corte': corte, 'movidas': movidas, 'compactados': compactados, 'resultados': resultados}
+
+def mantenimiento_vencido(conn):
+    ultimo = conn.execute("SELECT MAX(inicio) FROM mantenimientos").fetchone()[0]
+    return not ultimo or datetime.now() - datetime.strptime(ultimo, "%Y-%m-%d %H:%M:%S") >= timedelta(
+        hours=INTERVALO_MANTENIMIENTO_H)
+
+def programar_mantenimiento(usuario='sistema', forzar=False):
+    # Comprobación y alta en la misma transacción: BEGIN IMMEDIATE evita que
+    # dos procesos encolen el mismo mantenimiento. None si no corresponde.
+    gestor = gestor_trabajos()
+    with db_escritura() as conn:
+        # Un mantenimiento cuyo proceso murió no bloquea los siguientes
+        interrumpir_trabajos_huerfanos(conn)
+        if conn.execute("SELECT 1 FROM trabajos WHERE tipo = 'mantenimiento' "
+                        "AND estado IN ('pendiente', 'en_curso')").fetchone():
+            return None
+        if forzar or mantenimiento_vencido(conn):
+            return gestor.enviar('mantenimiento', {'dias_retencion': DIAS_RETENCION}, usuario)
+    return None
+
+class ProgramadorMantenimiento:
+    def __init__(self, revision=REVISION_MANTENIMIENTO_S):
+        self._hilo = threading.Thread(target=self._bucle, args=(revision,), name="mantenimiento", daemon=True)
+        self._hilo.start()
+
+    def _bucle(self, revision):
+        while True:
+            time.sleep(revision)
+            try:
+                programar_mantenimiento()
+            except Exception:
+                # Base ocupada o cerrándose: se reintenta en la próxima revisión
+                pass
+
+@st.cache_resource(show_spinner=False)
+def programador_mantenimiento():
+    return ProgramadorMantenimiento()
 
 # --- FUNCIONES AUXILIARES ---
 def hash_password(password, salt=None):
@@ -95,7 +1174,7 @@ def hash_password(password, salt=None):
     return hashlib.sha256((password + salt).encode()).hexdigest(), salt
 
 def login(username, password):
-    with sqlite3.connect('jne_verification.db') as conn:
+    with db_lectura() as conn:
         c = conn.cursor()
         c.execute("SELECT id, username, password, salt, nombre, rol FROM usuarios WHERE username=? AND activo=1", (username,))
         user = c.fetchone()
@@ -108,47 +1187,1101 @@ def login(username, password):
             }
     return None
 
-def cargar_fichas(partido_cod=None):
+# --- INGESTA DEL CATÁLOGO EN SQLITE ---
+# Lee el workbook en modo streaming y sólo escribe las filas nuevas o
+# modificadas (comparando un hash por fila con el almacenado).
+def _texto_celda(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor).strip()
+
+def _leer_filas_fichas(ruta):
+    from openpyxl import load_workbook
+    wb = load_workbook(ruta, read_only=True, data_only=True)
     try:
-        df = pd.read_excel(ARCHIVO_FICHAS, dtype={'item': str, 'NUM_FIC': str, 'COD_OP': str, 'COD_DNI': str})
-        required_cols = ['item', 'NUM_FIC', 'COD_OP', 'COD_DNI']
-        if not all(col in df.columns for col in required_cols):
-            raise ValueError(f"Archivo incompleto. Faltan columnas: {required_cols}")
-        if partido_cod:
-            return df[df['COD_OP'] == partido_cod]
-        return df
+        filas = wb.active.iter_rows(values_only=True)
+        encabezado = [_texto_celda(celda) for celda in next(filas, ())]
+        if not all(col in encabezado for col in COLUMNAS_FICHAS):
+            raise ValueError(f"Archivo incompleto. Faltan columnas: {COLUMNAS_FICHAS}")
+        posiciones = [encabezado.index(col) for col in COLUMNAS_FICHAS]
+        for fila in filas:
+            valores = [_texto_celda(fila[i]) if i < len(fila) else '' for i in posiciones]
+            if not valores[1] and not valores[3]:
+                continue
+            yield valores
+    finally:
+        wb.close()
+
+def _hash_fila(valores):
+    return hashlib.sha1('\x1f'.join(valores).encode()).hexdigest()
+
+def ingestar_fichas(ruta=ARCHIVO_FICHAS, lote=5000, progreso=None):
+    resumen = {'nuevas': 0, 'actualizadas': 0, 'sin_cambios': 0, 'eliminadas': 0}
+    ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with db_lectura() as conn:
+        existentes = {(num_fic, cod_dni, cod_op): row_hash for num_fic, cod_dni, cod_op, row_hash
+                      in conn.execute("SELECT num_fic, cod_dni, cod_op, row_hash FROM fichas")}
+    # Cada lote se escribe en su propia transacción corta para no retener al
+    # escritor compartido mientras openpyxl analiza el resto del archivo
+    pendientes = []
+    codigos = set()
+    dnis = set()
+    presentes = set()
+    for valores in _leer_filas_fichas(ruta):
+        item, num_fic, cod_op, cod_dni = valores
+        codigos.add(cod_op)
+        clave = (num_fic, cod_dni, cod_op)
+        presentes.add(clave)
+        row_hash = _hash_fila(valores)
+        previo = existentes.get(clave)
+        if previo == row_hash:
+            resumen['sin_cambios'] += 1
+            continue
+        resumen['nuevas' if previo is None else 'actualizadas'] += 1
+        existentes[clave] = row_hash
+        dnis.add(cod_dni)
+        pendientes.append((num_fic, cod_dni, cod_op, item, row_hash, ahora))
+        if len(pendientes) >= lote:
+            _upsert_fichas(pendientes)
+            pendientes = []
+            if progreso:
+                progreso(resumen)
+    if pendientes:
+        _upsert_fichas(pendientes)
+    # Claves que ya no están en el archivo (fichas retiradas o con el DNI
+    # corregido): salen del catálogo salvo que ya se hayan asignado
+    retiradas = [clave for clave in existentes if clave not in presentes]
+    for inicio in range(0, len(retiradas), lote):
+        resumen['eliminadas'] += _eliminar_fichas(retiradas[inicio:inicio + lote])
+    dnis.update(cod_dni for _, cod_dni, _ in retiradas)
+    # Los partidos salen del propio catálogo
+    registrar_partidos(codigos)
+    if dnis:
+        actualizar_sospechosos(dnis)
+    if progreso:
+        progreso(resumen)
+    return resumen
+
+def _upsert_fichas(filas):
+    with db_escritura() as conn:
+        conn.executemany('''INSERT INTO fichas (num_fic, cod_dni, cod_op, item, row_hash, actualizado)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (num_fic, cod_dni, cod_op) DO UPDATE SET
+                                item = excluded.item,
+                                row_hash = excluded.row_hash,
+                                actualizado = excluded.actualizado''', filas)
+
+def _eliminar_fichas(claves):
+    # El escritor principal ve las asignaciones de todas las particiones
+    with db_escritura() as conn:
+        return conn.executemany('''DELETE FROM fichas
+                                   WHERE num_fic = ? AND cod_dni = ? AND cod_op = ?
+                                     AND NOT EXISTS (SELECT 1 FROM asignaciones a
+                                                     WHERE a.dni = fichas.cod_dni AND a.num_fic = fichas.num_fic)
+                                     AND NOT EXISTS (SELECT 1 FROM asignaciones_historico h
+                                                     WHERE h.dni = fichas.cod_dni AND h.num_fic = fichas.num_fic)''',
+                                claves).rowcount
+
+def _hash_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+@st.cache_resource(max_entries=1, show_spinner="Sincronizando catálogo de fichas...")
+def _sincronizar_fichas_db(ruta, contenido):
+    # Una ingesta por contenido del archivo y por proceso: el hash también
+    # detecta las reescrituras que conservan fecha de modificación y tamaño
+    resumen = ingestar_fichas(ruta)
+    derivar_sospechosas()
+    return resumen
+
+def sincronizar_fichas_db():
+    try:
+        return _sincronizar_fichas_db(ARCHIVO_FICHAS, _hash_archivo(ARCHIVO_FICHAS))
     except Exception as e:
-        st.error(f"Error al cargar fichas.xlsx: {str(e)}")
+        st.error(f"Error al sincronizar fichas.xlsx: {str(e)}")
         return None
 
-def get_asignaciones_pendientes(usuario_id, tipo):
-    with sqlite3.connect('jne_verification.db') as conn:
+# --- DETECCIÓN DE DNI REPETIDOS ---
+# Un mismo DNI firmando en varias fichas o para varios partidos es la señal
+# principal de fraude. La detección es vectorizada: factorize hace de índice
+# hash sobre COD_DNI y los pares distintos (DNI, ficha) y (DNI, partido) se
+# cuentan con pd.unique (hash, sin ordenar) + bincount, sin bucles en Python.
+UMBRAL_DETECCION_COMPLETA = 50000
+LOTE_DERIVACION_SOSPECHOSAS = 2000
+
+def detectar_duplicados(fichas):
+    import numpy as np
+    import pandas as pd
+    # fichas: DataFrame con num_fic, cod_dni y cod_op; devuelve los DNI marcados
+    fichas = fichas[fichas['cod_dni'] != '']
+    dni, dnis = pd.factorize(fichas['cod_dni'])
+    dni = dni.astype(np.int64)
+
+    def distintos(columna):
+        codigos, valores = pd.factorize(fichas[columna])
+        base = max(len(valores), 1)
+        pares = pd.unique(dni * base + codigos)
+        return np.bincount(pares // base, minlength=len(dnis))
+
+    por_fichas, por_partidos = distintos('num_fic'), distintos('cod_op')
+    marcados = (por_fichas > 1) | (por_partidos > 1)
+    return pd.DataFrame({'dni': np.asarray(dnis)[marcados], 'fichas': por_fichas[marcados],
+                         'partidos': por_partidos[marcados]})
+
+def actualizar_sospechosos(dnis=None):
+    import pandas as pd
+    # Incremental: sólo se recalculan los DNI de las fichas nuevas o cambiadas
+    # (búsqueda por idx_fichas_dni); sin lista, o si es muy grande, el catálogo completo
+    completa = dnis is None or len(dnis) > UMBRAL_DETECCION_COMPLETA
+    ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # En el escritor: ve las fichas de una ingesta que aún no se ha confirmado
+    with db_escritura() as conn:
+        if completa:
+            fichas = pd.read_sql("SELECT num_fic, cod_dni, cod_op FROM fichas", conn)
+        else:
+            lista = json.dumps(sorted(dnis))
+            fichas = pd.read_sql("SELECT num_fic, cod_dni, cod_op FROM fichas "
+                                 "WHERE cod_dni IN (SELECT value FROM json_each(?))", conn, params=(lista,))
+        marcados = detectar_duplicados(fichas)
+        if completa:
+            conn.execute("DELETE FROM dni_sospechosos")
+        else:
+            conn.execute("DELETE FROM dni_sospechosos WHERE dni IN (SELECT value FROM json_each(?))", (lista,))
+        conn.executemany("INSERT INTO dni_sospechosos (dni, fichas, partidos, detectado) VALUES (?, ?, ?, ?)",
+                         [(dni, int(n_fichas), int(n_partidos), ahora) for dni, n_fichas, n_partidos
+                          in marcados.itertuples(index=False)])
+    return len(marcados)
+
+def derivar_sospechosas(destino=None):
+    # Fichas con DNI marcado que nadie tiene asignadas: directo a la cola de
+    # peritos, por lotes y en el escritor de cada partido
+    if (destino or DESTINO_SOSPECHOSAS) != 'perito' or not peritos_activos():
+        return 0
+    total = 0
+    for partido_cod, nombre in partidos().items():
+        while True:
+            with db_escritura(partido_cod) as conn:
+                filas = conn.execute(_sql_fichas_sin_asignar("f.cod_dni, f.num_fic")
+                                     + " AND f.cod_dni IN (SELECT dni FROM dni_sospechosos) ORDER BY f.rowid LIMIT ?",
+                                     (partido_cod, LOTE_DERIVACION_SOSPECHOSAS)).fetchall()
+                if filas:
+                    derivar_a_peritos(conn, [{'dni': dni, 'num_fic': num_fic, 'partido': nombre}
+                                             for dni, num_fic in filas])
+            total += len(filas)
+            if len(filas) < LOTE_DERIVACION_SOSPECHOSAS:
+                break
+    return total
+
+def resumen_sospechosos():
+    import pandas as pd
+    with db_lectura() as conn:
+        dnis, varios_partidos = conn.execute("SELECT COUNT(*), COALESCE(SUM(partidos > 1), 0) "
+                                             "FROM dni_sospechosos").fetchone()
+        fichas, sin_asignar = conn.execute('''SELECT COUNT(*), COALESCE(SUM(NOT EXISTS (
+                                                  SELECT 1 FROM asignaciones a
+                                                  WHERE a.dni = f.cod_dni AND a.num_fic = f.num_fic)
+                                                  AND NOT EXISTS (
+                                                  SELECT 1 FROM asignaciones_historico h
+                                                  WHERE h.dni = f.cod_dni AND h.num_fic = f.num_fic)), 0)
+                                              FROM dni_sospechosos s JOIN fichas f ON f.cod_dni = s.dni''').fetchone()
+        principales = pd.read_sql('''SELECT dni, fichas, partidos, detectado FROM dni_sospechosos
+                                     ORDER BY partidos DESC, fichas DESC, dni LIMIT 100''', conn)
+    return {'dnis': dnis, 'varios_partidos': varios_partidos, 'fichas': fichas,
+            'sin_asignar': sin_asignar, 'principales': principales}
+
+# --- COLAS DE TRABAJO PAGINADAS ---
+# Ciclo de vida de una asignación, siempre por id: pendiente → en_curso (su
+# página se mostró o se reclamó de la bolsa) → completado | derivado (al
+# guardar el resultado, en la misma transacción). completado (0/1) se mantiene
+# en sincronía.
+# Paginación por clave (id) sobre el índice parcial idx_asignaciones_activas:
+# cada página lee sólo sus filas y la sesión guarda el id tras el que empieza.
+# El predicado de estado debe escribirse literal para que se use el índice.
+ESTADOS_ASIGNACION = ('pendiente', 'en_curso', 'completado', 'derivado')
+SQL_ACTIVA = "estado IN ('pendiente', 'en_curso')"
+SQL_PENDIENTES = f"FROM asignaciones WHERE asignado_a = ? AND tipo_asignacion = ? AND {SQL_ACTIVA}"
+
+def contar_pendientes(usuario, tipo, hasta_id=None):
+    with db_lectura() as conn:
+        if hasta_id is None:
+            return conn.execute(f"SELECT COUNT(*) {SQL_PENDIENTES}", (usuario, tipo)).fetchone()[0]
+        return conn.execute(f"SELECT COUNT(*) {SQL_PENDIENTES} AND id <= ?",
+                            (usuario, tipo, hasta_id)).fetchone()[0]
+
+def get_asignaciones_pendientes(usuario, tipo, limite, despues_de=0):
+    with db_lectura() as conn:
         c = conn.cursor()
-        c.execute('''SELECT a.dni, a.num_fic, a.partido 
-                     FROM asignaciones a
-                     JOIN usuarios u ON a.asignado_a = u.username
-                     WHERE u.id = ? AND a.tipo_asignacion = ? AND a.completado = 0''',
-                  (usuario_id, tipo))
-        return [{'dni': row[0], 'num_fic': row[1], 'partido': row[2]} for row in c.fetchall()]
-
-# --- EXPORTAR REPORTE A EXCEL ---
-def exportar_reporte_excel():
-    conn = sqlite3.connect('jne_verification.db')
+        c.execute(f"SELECT id, dni, num_fic, partido, estado, vence_reclamo {SQL_PENDIENTES} "
+                  f"AND id > ? ORDER BY id LIMIT ?", (usuario, tipo, despues_de, limite))
+        return [{'id': row[0], 'dni': row[1], 'num_fic': row[2], 'partido': row[3], 'estado': row[4],
+                 'vence_reclamo': row[5]}
+                for row in c.fetchall()]
+
+def iniciar_asignaciones(usuario, fichas):
+    # pendiente → en_curso de las fichas mostradas, y los reclamos de la bolsa
+    # se renuevan pasada la mitad del plazo; sin escritura si no hace falta
+    ahora = datetime.now()
+    renovar = (ahora + timedelta(minutes=MINUTOS_RECLAMO / 2)).strftime("%Y-%m-%d %H:%M:%S")
+    vence = _vencimiento_reclamo(ahora)
+    nuevas = [ficha for ficha in fichas
+              if ficha['estado'] == 'pendiente' or (ficha['vence_reclamo'] and ficha['vence_reclamo'] < renovar)]
+    for partido_grupo, grupo in _por_particion(nuevas):
+        with db_escritura(partido_grupo) as conn:
+            # El destinatario se comprueba: un reclamo vencido pudo volver a la bolsa
+            conn.executemany(f'''UPDATE asignaciones SET estado = 'en_curso',
+                                    vence_reclamo = CASE WHEN vence_reclamo IS NULL THEN NULL ELSE ? END
+                                 WHERE id = ? AND asignado_a = ? AND {SQL_ACTIVA}''',
+                             [(vence, ficha['id'], usuario) for ficha in grupo])
+    for ficha in nuevas:
+        ficha['estado'] = 'en_curso'
+        if ficha['vence_reclamo']:
+            ficha['vence_reclamo'] = vence
+    return len(nuevas)
+
+def cursor_pagina_anterior(usuario, tipo, limite, antes_de):
+    with db_lectura() as conn:
+        primero = conn.execute(f"SELECT MIN(id) FROM (SELECT id {SQL_PENDIENTES} AND id < ? "
+                               f"ORDER BY id DESC LIMIT ?)", (usuario, tipo, antes_de, limite)).fetchone()[0]
+    return primero - 1 if primero else 0
+
+def paginar_pendientes(usuario, tipo, clave_cursor, por_pagina):
+    total = contar_pendientes(usuario, tipo)
+    if not total:
+        return total, []
+    cursor = st.session_state.get(clave_cursor, 0)
+    fichas = get_asignaciones_pendientes(usuario, tipo, por_pagina, cursor)
+    if not fichas and cursor:
+        cursor = st.session_state[clave_cursor] = 0
+        fichas = get_asignaciones_pendientes(usuario, tipo, por_pagina, cursor)
+    iniciar_asignaciones(usuario, fichas)
+    pagina = contar_pendientes(usuario, tipo, cursor) // por_pagina + 1 if cursor else 1
+    paginas = (total // por_pagina) + (1 if total % por_pagina else 0)
+
+    # Los botones mueven el cursor en su callback: el clic ya provoca el rerun
+    # (del fragmento que contenga la cola, si lo hay)
+    col_anterior, col_info, col_siguiente = st.columns([1, 2, 1])
+    col_anterior.button("◀ Anterior", key=f"{clave_cursor}_anterior", disabled=not cursor,
+                        on_click=_retroceder_cursor, args=(clave_cursor, usuario, tipo, por_pagina, fichas[0]['id']))
+    col_info.write(f"Página {pagina} de {paginas} ({total} pendientes)")
+    col_siguiente.button("Siguiente ▶", key=f"{clave_cursor}_siguiente", disabled=pagina >= paginas,
+                         on_click=_mover_cursor, args=(clave_cursor, fichas[-1]['id']))
+    return total, fichas
+
+def _mover_cursor(clave_cursor, valor):
+    st.session_state[clave_cursor] = valor
+
+def _retroceder_cursor(clave_cursor, usuario, tipo, por_pagina, primer_id):
+    st.session_state[clave_cursor] = cursor_pagina_anterior(usuario, tipo, por_pagina, primer_id)
+
+# --- ASIGNACIÓN MASIVA ---
+MODOS_REPARTO = {
+    'equitativo': 'Equitativo (round-robin)',
+    'por_carga': 'Según carga pendiente',
+    'bolsa': 'Bolsa compartida (cada analista reclama su siguiente página)'
+}
 
+def _sql_fichas_sin_asignar(columnas):
+    # Sin asignación de ningún tipo: las sospechosas que ya fueron derivadas
+    # directamente a peritos no se reparten además a analistas
+    return f'''SELECT {columnas} FROM fichas f
+              WHERE f.cod_op = ?
+                AND NOT EXISTS (SELECT 1 FROM asignaciones a
+                                WHERE a.dni = f.cod_dni AND a.num_fic = f.num_fic)
+                AND NOT EXISTS (SELECT 1 FROM asignaciones_historico h
+                                WHERE h.dni = f.cod_dni AND h.num_fic = f.num_fic)'''
+
+def contar_fichas_sin_asignar(conn, partido_cod):
+    return conn.execute(_sql_fichas_sin_asignar("COUNT(*)"), (partido_cod,)).fetchone()[0]
+
+def carga_pendiente(conn, usuarios, tipo):
+    marcadores = ', '.join('?' for _ in usuarios)
+    filas = conn.execute(f'''SELECT asignado_a, COUNT(*) FROM asignaciones
+                             WHERE asignado_a IN ({marcadores}) AND tipo_asignacion = ? AND {SQL_ACTIVA}
+                             GROUP BY asignado_a''', (*usuarios, tipo)).fetchall()
+    carga = dict.fromkeys(usuarios, 0)
+    carga.update(filas)
+    return carga
+
+def _carga_global(conn, usuarios, tipo):
+    # El escritor de una partición sólo ve su archivo: la carga de todos los
+    # partidos se lee de las vistas globales
+    if not DIR_PARTICIONES:
+        return carga_pendiente(conn, usuarios, tipo)
+    with db_lectura() as lector:
+        return carga_pendiente(lector, usuarios, tipo)
+
+def repartir(elementos, usuarios, carga=None):
+    # Sin carga: round-robin. Con carga: cada elemento va al usuario con menos pendientes.
+    if carga is None:
+        return [(elemento, usuarios[i % len(usuarios)]) for i, elemento in enumerate(elementos)]
+    monticulo = [(carga.get(usuario, 0), orden, usuario) for orden, usuario in enumerate(usuarios)]
+    heapq.heapify(monticulo)
+    reparto = []
+    for elemento in elementos:
+        pendientes, orden, usuario = monticulo[0]
+        reparto.append((elemento, usuario))
+        heapq.heapreplace(monticulo, (pendientes + 1, orden, usuario))
+    return reparto
+
+def destinatarios_reparto(analistas, modo):
+    # En la bolsa las fichas quedan sin destinatario (asignado_a NULL)
+    if modo == 'bolsa':
+        return [None]
+    if not analistas:
+        raise ValueError("Selecciona al menos un analista")
+    return list(analistas)
+
+def asignar_fichas(partido_cod, cantidad, analistas, modo='equitativo'):
+    analistas = destinatarios_reparto(analistas, modo)
+    fecha = datetime.now().strftime("%Y-%m-%d")
+    nombre = partidos().get(partido_cod)
+    if nombre is None:
+        raise ValueError(f"Partido desconocido: {partido_cod}")
+    # La selección y la inserción comparten la transacción del escritor
+    with db_escritura(partido_cod) as conn:
+        # Las fichas con DNI repetido se asignan primero
+        fichas = conn.execute(_sql_fichas_sin_asignar("f.cod_dni, f.num_fic")
+                              + " ORDER BY f.cod_dni IN (SELECT dni FROM dni_sospechosos) DESC, f.rowid LIMIT ?",
+                              (partido_cod, cantidad)).fetchall()
+        carga = _carga_global(conn, analistas, 'analista') if modo == 'por_carga' else None
+        reparto = repartir(fichas, analistas, carga)
+        conn.executemany('''INSERT INTO asignaciones
+                            (dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion, completado)
+                            VALUES (?, ?, ?, ?, 'analista', ?, 0)''',
+                         [(dni, num_fic, nombre, analista, fecha)
+                          for (dni, num_fic), analista in reparto])
+    resumen = dict.fromkeys(analistas, 0)
+    for _, analista in reparto:
+        resumen[analista] += 1
+    return resumen
+
+# --- BOLSA COMPARTIDA ---
+# Modo pull: las fichas publicadas con el modo 'bolsa' no tienen destinatario y
+# cada analista reclama la siguiente página de un partido con un solo
+# UPDATE ... RETURNING en la transacción del escritor de ese partido, así dos
+# analistas nunca reciben la misma ficha. El reclamo es un préstamo: vence a
+# los MINUTOS_RECLAMO sin que su página se vuelva a mostrar, y el siguiente
+# reclamo del partido lo devuelve a la bolsa. Cada analista retiene como mucho
+# una página reclamada por partido.
+MINUTOS_RECLAMO = int(os.environ.get("JNE_MINUTOS_RECLAMO", "30"))
+FICHAS_POR_RECLAMO = int(os.environ.get("JNE_FICHAS_POR_RECLAMO", "10"))
+SQL_EN_BOLSA = "asignado_a IS NULL AND estado = 'pendiente'"
+SQL_RECLAMO_VENCIDO = "estado = 'en_curso' AND vence_reclamo IS NOT NULL AND vence_reclamo < ?"
+
+def _vencimiento_reclamo(ahora):
+    return (ahora + timedelta(minutes=MINUTOS_RECLAMO)).strftime("%Y-%m-%d %H:%M:%S")
+
+def liberar_reclamos_vencidos(conn, ahora=None):
+    ahora = (ahora or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+    return conn.execute(f"UPDATE asignaciones SET asignado_a = NULL, estado = 'pendiente', vence_reclamo = NULL "
+                        f"WHERE {SQL_RECLAMO_VENCIDO}", (ahora,)).rowcount
+
+def fichas_en_bolsa(conn):
+    # Por nombre de partido; los reclamos vencidos cuentan como disponibles
+    ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    filas = conn.execute(f'''SELECT partido, COUNT(*) FROM (
+                                 SELECT partido FROM asignaciones
+                                 WHERE tipo_asignacion = 'analista' AND {SQL_EN_BOLSA}
+                                 UNION ALL
+                                 SELECT partido FROM asignaciones
+                                 WHERE tipo_asignacion = 'analista' AND {SQL_RECLAMO_VENCIDO})
+                             GROUP BY partido''', (ahora,)).fetchall()
+    return dict(filas)
+
+def reclamar_fichas(usuario, partido_cod, cantidad=FICHAS_POR_RECLAMO):
+    nombre = partidos().get(partido_cod)
+    if nombre is None:
+        raise ValueError(f"Partido desconocido: {partido_cod}")
+    ahora = datetime.now()
+    with db_escritura(partido_cod) as conn:
+        liberar_reclamos_vencidos(conn, ahora)
+        retenidas = conn.execute(f"SELECT COUNT(*) FROM asignaciones WHERE asignado_a = ? "
+                                 f"AND tipo_asignacion = 'analista' AND {SQL_ACTIVA} "
+                                 f"AND partido = ? AND vence_reclamo IS NOT NULL",
+                                 (usuario, nombre)).fetchone()[0]
+        if retenidas >= cantidad:
+            return []
+        filas = conn.execute(f'''UPDATE asignaciones SET asignado_a = ?, estado = 'en_curso', vence_reclamo = ?
+                                 WHERE id IN (SELECT id FROM asignaciones
+                                              WHERE partido = ? AND tipo_asignacion = 'analista' AND {SQL_EN_BOLSA}
+                                              ORDER BY id LIMIT ?)
+                                 RETURNING id, dni, num_fic, partido, estado, vence_reclamo''',
+                             (usuario, _vencimiento_reclamo(ahora), nombre, cantidad - retenidas)).fetchall()
+    # RETURNING no garantiza orden
+    return [{'id': row[0], 'dni': row[1], 'num_fic': row[2], 'partido': row[3], 'estado': row[4],
+             'vence_reclamo': row[5]}
+            for row in sorted(filas)]
+
+# --- DERIVACIÓN A PERITOS ---
+# 'por_carga' envía cada caso al perito con menos pendientes; 'afinidad' usa un
+# hash estable (rendezvous) para que un mismo DNI vaya siempre al mismo perito.
+MODO_DERIVACION = os.environ.get("JNE_MODO_DERIVACION", "por_carga")
+
+@st.cache_data(ttl=300, show_spinner=False)
+def peritos_activos():
+    # Se invalida al crear usuarios; el TTL cubre cambios hechos fuera de la app
+    with db_lectura() as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT username FROM usuarios WHERE rol = 'perito' AND activo = 1 ORDER BY username")]
+
+def _perito_por_afinidad(dni, peritos):
+    return max(peritos, key=lambda perito: hashlib.sha1(f"{perito}:{dni}".encode()).digest())
+
+def derivar_a_peritos(conn, casos, modo=MODO_DERIVACION):
+    # Escribe dentro de la transacción del llamador; devuelve la carga resultante.
+    # Las fichas que ya tienen asignación pericial no se vuelven a derivar.
+    peritos = peritos_activos()
+    if not peritos or not casos:
+        return {}
+    ya_derivadas = set().union(*(_pares_existentes(conn, tabla, "t.tipo_asignacion = 'perito'", (), casos)
+                                 for tabla in ('asignaciones', 'asignaciones_historico')))
+    casos = [caso for caso in casos if (caso['num_fic'], caso['dni']) not in ya_derivadas]
+    carga = _carga_global(conn, peritos, 'perito')
+    if modo == 'afinidad':
+        reparto = [(caso, _perito_por_afinidad(caso['dni'], peritos)) for caso in casos]
+    else:
+        reparto = repartir(casos, peritos, carga)
+    fecha = datetime.now().strftime("%Y-%m-%d")
+    conn.executemany('''INSERT INTO asignaciones
+                        (dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion, completado)
+                        VALUES (?, ?, ?, ?, 'perito', ?, 0)''',
+                     [(caso['dni'], caso['num_fic'], caso['partido'], perito, fecha) for caso, perito in reparto])
+    for _, perito in reparto:
+        carga[perito] += 1
+    return carga
+
+# --- GUARDADO DE RESULTADOS ---
+# Cada página se valida completa y se escribe en una sola transacción: UPSERT
+# contra los índices únicos (usuario, num_fic, dni), de modo que un doble envío
+# actualiza en lugar de duplicar, y cierre de las asignaciones por id.
+def _pares_existentes(conn, tabla, condicion, parametros, casos):
+    # Pares (num_fic, dni) de `casos` que ya tienen fila en `tabla`; se recorre
+    # la lista de claves y cada una se busca por índice
+    if not casos:
+        return set()
+    valores = ', '.join('(?, ?)' for _ in casos)
+    pares = [valor for caso in casos for valor in (caso['num_fic'], caso['dni'])]
+    return set(conn.execute(f'''WITH claves (num_fic, dni) AS (VALUES {valores})
+                               SELECT c.num_fic, c.dni FROM claves c
+                               WHERE EXISTS (SELECT 1 FROM {tabla} t
+                                             WHERE t.num_fic = c.num_fic AND t.dni = c.dni AND {condicion})''',
+                            (*pares, *parametros)))
+
+def _estado_filas(resultados, existentes):
+    return [{'num_fic': res['num_fic'], 'dni': res['dni'],
+             'estado': 'actualizado' if (res['num_fic'], res['dni']) in existentes else 'nuevo'}
+            for res in resultados]
+
+def validar_verificaciones(resultados):
+    return [f"Ficha {res['num_fic']}: no puede marcarse conforme y derivarse a perito a la vez"
+            for res in resultados if res['conforme'] and res['para_perito']]
+
+def validar_informes(resultados):
+    return [f"Debes marcar si la firma es auténtica o falsa para la ficha {res['num_fic']}"
+            for res in resultados if bool(res['autentica']) == bool(res['falsa'])]
+
+def guardar_verificaciones(usuario, partido, hora_inicio, hora_fin, resultados):
+    ahora = datetime.now()
+    fecha, timestamp = ahora.strftime("%Y-%m-%d"), ahora.strftime("%Y-%m-%d %H:%M:%S")
+    existentes = set()
+    # Una transacción por archivo de partición (una sola sin particiones)
+    for partido_grupo, grupo in _por_particion(resultados):
+        with db_escritura(partido_grupo) as conn:
+            existentes |= _pares_existentes(conn, 'analistas', "t.usuario = ?", (usuario,), grupo)
+            conn.executemany('''INSERT INTO analistas
+                                (fecha, usuario, partido, hora_inicio, hora_fin,
+                                 num_fic, dni, conforme, para_perito, observaciones, timestamp)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                ON CONFLICT (usuario, num_fic, dni) DO UPDATE SET
+                                    fecha = excluded.fecha,
+                                    partido = excluded.partido,
+                                    hora_inicio = excluded.hora_inicio,
+                                    hora_fin = excluded.hora_fin,
+                                    conforme = excluded.conforme,
+                                    para_perito = excluded.para_perito,
+                                    observaciones = excluded.observaciones,
+                                    timestamp = excluded.timestamp''',
+                             [(fecha, usuario, partido, hora_inicio, hora_fin, res['num_fic'], res['dni'],
+                               int(res['conforme']), int(res['para_perito']), res['observaciones'], timestamp)
+                              for res in grupo])
+            # El estado refleja el último resultado guardado (también en un doble envío);
+            # un reclamo vencido que volvió a la bolsa queda a nombre de quien lo guardó
+            conn.executemany("UPDATE asignaciones SET estado = ?, completado = 1, "
+                             "asignado_a = COALESCE(asignado_a, ?) WHERE id = ?",
+                             [('derivado' if res['para_perito'] else 'completado', usuario, res['id'])
+                              for res in grupo])
+            derivar_a_peritos(conn, [res for res in grupo if res['para_perito']])
+    return _estado_filas(resultados, existentes)
+
+def guardar_informes(usuario, inicio_informes, fin_informes, resultados):
+    ahora = datetime.now()
+    fecha, timestamp = ahora.strftime("%Y-%m-%d"), ahora.strftime("%Y-%m-%d %H:%M:%S")
+    existentes = set()
+    for partido_grupo, grupo in _por_particion(resultados):
+        with db_escritura(partido_grupo) as conn:
+            existentes |= _pares_existentes(conn, 'peritos', "t.usuario = ?", (usuario,), grupo)
+            conn.executemany('''INSERT INTO peritos
+                                (fecha, usuario, partido, inicio_informes, fin_informes,
+                                 dni, num_fic, autentica, falsa, tiempo_min, observaciones, timestamp)
+                                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                ON CONFLICT (usuario, num_fic, dni) DO UPDATE SET
+                                    fecha = excluded.fecha,
+                                    partido = excluded.partido,
+                                    inicio_informes = excluded.inicio_informes,
+                                    fin_informes = excluded.fin_informes,
+                                    autentica = excluded.autentica,
+                                    falsa = excluded.falsa,
+                                    tiempo_min = excluded.tiempo_min,
+                                    observaciones = excluded.observaciones,
+                                    timestamp = excluded.timestamp''',
+                             [(fecha, usuario, res['partido'], inicio_informes, fin_informes, res['dni'],
+                               res['num_fic'], int(res['autentica']), int(res['falsa']), res['tiempo_min'],
+                               res['observaciones'], timestamp)
+                              for res in grupo])
+            conn.executemany("UPDATE asignaciones SET estado = 'completado', completado = 1 WHERE id = ?",
+                             [(res['id'],) for res in grupo])
+    return _estado_filas(resultados, existentes)
+
+def mostrar_resultado_guardado(clave):
+    estados = st.session_state.pop(clave, None)
+    if estados:
+        actualizadas = [e['num_fic'] for e in estados if e['estado'] == 'actualizado']
+        st.success(f"{len(estados) - len(actualizadas)} registros nuevos, {len(actualizadas)} actualizados")
+        if actualizadas:
+            st.caption(f"Fichas que ya tenían resultado y se actualizaron: {', '.join(actualizadas)}")
+
+# --- EXPORTACIÓN DE REPORTES ---
+# Las filas se leen en bloques y se escriben en un buffer en memoria, sin
+# cargar las tablas completas en DataFrames ni dejar archivos en disco.
+FORMATOS_EXPORTACION = {
+    'xlsx': ('Excel (.xlsx)', 'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('CSV (.zip)', 'zip', 'application/zip'),
+    'parquet': ('Parquet (.zip)', 'zip', 'application/zip'),
+}
+TABLAS_EXPORTACION = {'Analistas': 'analistas', 'Peritos': 'peritos'}
+FILAS_POR_BLOQUE = 5000
+
+def version_datos():
+    # Los triggers la incrementan con cada escritura de resultados: como parte
+    # de la clave de una caché, cualquier escritura invalida la entrada
+    with db_lectura() as conn:
+        return conn.execute("SELECT version FROM version_datos WHERE id = 1").fetchone()[0]
+
+def _condiciones_resultados(fecha_desde=None, fecha_hasta=None, partido=None, usuario=None):
+    condiciones, parametros = [], []
+    if fecha_desde:
+        condiciones.append("fecha >= ?")
+        parametros.append(str(fecha_desde))
+    if fecha_hasta:
+        condiciones.append("fecha <= ?")
+        parametros.append(str(fecha_hasta))
+    if partido:
+        condiciones.append("partido = ?")
+        parametros.append(partido)
+    if usuario:
+        condiciones.append("usuario = ?")
+        parametros.append(usuario)
+    return condiciones, parametros
+
+def _origenes_resultados(conn, tabla, fecha_desde=None):
+    origenes = [tabla]
+    corte = fecha_corte_historico(conn)
+    if corte and (not fecha_desde or str(fecha_desde) < corte):
+        # El rango llega a días archivados: se lee también el histórico
+        origenes.insert(0, TABLAS_HISTORICAS[tabla])
+    return origenes
+
+def _consulta_exportacion(conn, tabla, fecha_desde=None, fecha_hasta=None, partido=None, usuario=None):
+    condiciones, parametros = _condiciones_resultados(fecha_desde, fecha_hasta, partido, usuario)
+    where = f" WHERE {' AND '.join(condiciones)}" if condiciones else ""
+    origenes = _origenes_resultados(conn, tabla, fecha_desde)
+    sql = " UNION ALL ".join(f"SELECT * FROM {origen}{where}" for origen in origenes)
+    return f"{sql} ORDER BY id", parametros * len(origenes)
+
+def _bloques(conn, tabla, filtros, avance=None):
+    sql, parametros = _consulta_exportacion(conn, tabla, **filtros)
+    cursor = conn.execute(sql, parametros)
+    columnas = [d[0] for d in cursor.description]
+    yield columnas
+    while True:
+        bloque = cursor.fetchmany(FILAS_POR_BLOQUE)
+        if not bloque:
+            break
+        yield bloque
+        if avance:
+            avance(len(bloque))
+
+def _exportar_xlsx(conn, filtros, buffer, avance=None):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
     try:
-        df_analistas = pd.read_sql("SELECT * FROM analistas", conn)
-        df_peritos = pd.read_sql("SELECT * FROM peritos", conn)
-
-        nombre_archivo = f"reporte_jne_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx"
-
-        with pd.ExcelWriter(nombre_archivo, engine='openpyxl') as writer:
-            df_analistas.to_excel(writer, sheet_name="Analistas", index=False)
-            df_peritos.to_excel(writer, sheet_name="Peritos", index=False)
+        for hoja, tabla in TABLAS_EXPORTACION.items():
+            ws = wb.create_sheet(hoja)
+            for bloque in _bloques(conn, tabla, filtros, avance):
+                if isinstance(bloque[0], str):
+                    ws.append(bloque)
+                    continue
+                for fila in bloque:
+                    ws.append(fila)
+    except BaseException:
+        # Hojas a medio escribir (p. ej. un trabajo cancelado)
+        for ws in wb.worksheets:
+            ws.close()
+        raise
+    wb.save(buffer)
+
+def _exportar_csv(conn, filtros, buffer, avance=None):
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for tabla in TABLAS_EXPORTACION.values():
+            with zf.open(f"{tabla}.csv", 'w') as destino:
+                texto = io.TextIOWrapper(destino, encoding='utf-8-sig', newline='')
+                escritor = csv.writer(texto)
+                for bloque in _bloques(conn, tabla, filtros, avance):
+                    if isinstance(bloque[0], str):
+                        escritor.writerow(bloque)
+                    else:
+                        escritor.writerows(bloque)
+                texto.flush()
+                texto.detach()
+
+def _esquema_arrow(conn, tabla):
+    import pyarrow as pa
+    return pa.schema([(nombre, pa.int64() if tipo.upper() == 'INTEGER' else pa.string())
+                      for _, nombre, tipo, *_ in conn.execute(f"PRAGMA table_info({tabla})")])
+
+def _exportar_parquet(conn, filtros, buffer, avance=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as zf:
+        for tabla in TABLAS_EXPORTACION.values():
+            esquema = _esquema_arrow(conn, tabla)
+            with zf.open(f"{tabla}.parquet", 'w') as destino:
+                with pq.ParquetWriter(destino, esquema) as escritor:
+                    bloques = _bloques(conn, tabla, filtros, avance)
+                    columnas = next(bloques)
+                    for bloque in bloques:
+                        datos = {col: [fila[i] for fila in bloque] for i, col in enumerate(columnas)}
+                        escritor.write_table(pa.Table.from_pydict(datos, schema=esquema))
+
+EXPORTADORES = {'xlsx': _exportar_xlsx, 'csv': _exportar_csv, 'parquet': _exportar_parquet}
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _exportacion_cacheada(version, formato, filtros):
+    # Clave con la versión de datos: ver version_datos()
+    buffer = io.BytesIO()
+    with db_lectura() as conn:
+        EXPORTADORES[formato](conn, dict(filtros), buffer)
+    return buffer.getvalue()
+
+def exportar_reporte(formato='xlsx', **filtros):
+    filtros = tuple(sorted((clave, valor) for clave, valor in filtros.items() if valor))
+    _, extension, mime = FORMATOS_EXPORTACION[formato]
+    nombre_archivo = f"reporte_jne_{datetime.now().strftime('%Y%m%d_%H%M')}.{extension}"
+    return nombre_archivo, _exportacion_cacheada(version_datos(), formato, filtros), mime
+
+def exportar_reporte_excel(**filtros):
+    return exportar_reporte('xlsx', **filtros)
+
+# --- EXPLORADOR DE RESULTADOS ---
+# Los filtros se convierten en WHERE sobre los índices de cada tabla y la
+# paginación es por clave (id descendente): al navegador sólo llega una página.
+# El texto libre usa los índices FTS5 de observaciones, consultados en cada
+# archivo (con particiones, MATCH no atraviesa las vistas UNION ALL); el
+# conteo se corta en MAX_CONTEO_EXPLORADOR.
+FILAS_EXPLORADOR = 50
+MAX_CONTEO_EXPLORADOR = 10000
+COLUMNAS_EXPLORADOR = {
+    'analistas': ['id', 'fecha', 'usuario', 'partido', 'num_fic', 'dni', 'conforme', 'para_perito',
+                  'observaciones'],
+    'peritos': ['id', 'fecha', 'usuario', 'partido', 'num_fic', 'dni', 'autentica', 'falsa', 'tiempo_min',
+                'observaciones'],
+}
+MARCAS_EXPLORADOR = {'analistas': {'conforme': "Conforme", 'para_perito': "Para perito"},
+                     'peritos': {'autentica': "Auténtica", 'falsa': "Falsa"}}
+
+def _consulta_fts(texto):
+    # Cada palabra entre comillas: todas deben aparecer y el texto del usuario
+    # nunca se interpreta como sintaxis FTS5
+    return " ".join(f'"{palabra}"' for palabra in re.findall(r"\w+", texto or '')) or None
+
+def _consulta_explorador(conn, tabla, columnas, antes_de=None, fecha_desde=None, fecha_hasta=None,
+                         partido=None, usuario=None, marcas=None, texto=None):
+    condiciones, parametros = _condiciones_resultados(fecha_desde, fecha_hasta, partido, usuario)
+    for marca, valor in (marcas or {}).items():
+        if marca not in MARCAS_EXPLORADOR[tabla]:
+            raise ValueError(f"Filtro desconocido: {marca}")
+        # Literal, para que se usen los índices parciales (para_perito = 1, falsa = 1)
+        condiciones.append(f"{marca} = {int(bool(valor))}")
+    if antes_de is not None:
+        condiciones.append("id < ?")
+        parametros.append(antes_de)
+    busqueda = _consulta_fts(texto)
+    esquemas = [row[0] for row in conn.execute("SELECT name FROM pragma_database_list WHERE name <> 'temp'")]
+    consultas, todos = [], []
+    for origen in _origenes_resultados(conn, tabla, fecha_desde):
+        propias, valores = list(condiciones), list(parametros)
+        if busqueda:
+            propias.append("id IN (" + " UNION ALL ".join(
+                f"SELECT rowid FROM {esquema}.{origen}_fts WHERE {origen}_fts MATCH ?" for esquema in esquemas) + ")")
+            valores += [busqueda] * len(esquemas)
+        where = f" WHERE {' AND '.join(propias)}" if propias else ""
+        consultas.append(f"SELECT {columnas} FROM {origen}{where}")
+        todos += valores
+    return " UNION ALL ".join(consultas), todos
+
+def explorar_resultados(tabla, filtros, antes_de=None, limite=FILAS_EXPLORADOR):
+    columnas = COLUMNAS_EXPLORADOR[tabla]
+    with db_lectura() as conn:
+        sql, parametros = _consulta_explorador(conn, tabla, ', '.join(columnas), antes_de, **filtros)
+        filas = conn.execute(f"{sql} ORDER BY id DESC LIMIT ?", (*parametros, limite + 1)).fetchall()
+    return {'columnas': columnas, 'filas': filas[:limite], 'hay_mas': len(filas) > limite}
+
+def contar_resultados(tabla, filtros):
+    with db_lectura() as conn:
+        sql, parametros = _consulta_explorador(conn, tabla, '1', **filtros)
+        return conn.execute(f"SELECT COUNT(*) FROM ({sql} LIMIT ?)",
+                            (*parametros, MAX_CONTEO_EXPLORADOR + 1)).fetchone()[0]
+
+# --- TABLERO DE REPORTES ---
+# Agregados y figuras de reportes_page se calculan una vez por versión de datos
+# y se comparten entre sesiones; con JNE_TTL_TABLERO > 0 la versión se relee
+# como mucho cada TTL segundos (casi en tiempo real, sin consultas por visita).
+MAX_VERSIONES_TABLERO = int(os.environ.get("JNE_MAX_VERSIONES_TABLERO", "8"))
+TTL_TABLERO = float(os.environ.get("JNE_TTL_TABLERO", "0"))
+HORAS_RENDIMIENTO = 48
+
+SQL_RENDIMIENTO = '''
+    WITH por_hora AS (
+        SELECT 'Analista' AS rol, usuario, substr(timestamp, 1, 13) || ':00' AS hora, COUNT(*) AS fichas
+        FROM analistas WHERE timestamp >= :desde GROUP BY hora, usuario
+        UNION ALL
+        SELECT 'Perito', usuario, substr(timestamp, 1, 13) || ':00', COUNT(*)
+        FROM peritos WHERE timestamp >= :desde GROUP BY substr(timestamp, 1, 13), usuario)
+    SELECT rol, usuario, hora, fichas,
+           SUM(fichas) OVER (PARTITION BY rol, usuario ORDER BY hora) AS acumulado,
+           ROUND(AVG(fichas) OVER (PARTITION BY rol, usuario ORDER BY hora
+                                   ROWS BETWEEN 2 PRECEDING AND CURRENT ROW), 1) AS media_movil
+    FROM por_hora ORDER BY hora, rol, usuario'''
+
+@st.cache_resource(show_spinner=False)
+def _version_tablero_compartida():
+    return {'version': None, 'leida': 0.0}
+
+def version_tablero():
+    if not TTL_TABLERO:
+        return version_datos()
+    estado = _version_tablero_compartida()
+    if estado['version'] is None or time.monotonic() - estado['leida'] >= TTL_TABLERO:
+        estado['version'], estado['leida'] = version_datos(), time.monotonic()
+    return estado['version']
+
+@st.cache_resource(max_entries=MAX_VERSIONES_TABLERO, ttl=TTL_TABLERO or None, show_spinner=False)
+def _tablero_cacheado(version, desde):
+    import pandas as pd
+    import plotly.express as px
+    # Clave con la versión de datos: ver version_datos(). El resultado se
+    # comparte sin copiar; no debe modificarse.
+    with db_lectura() as conn:
+        analistas_group = pd.read_sql('''SELECT usuario, SUM(fichas) AS total_fichas,
+                                               SUM(conformes) AS conformes, SUM(derivados) AS derivados
+                                        FROM resumen_analistas GROUP BY usuario
+                                        HAVING SUM(fichas) > 0''', conn)
+        peritos_group = pd.read_sql('''SELECT usuario, SUM(informes) AS informes_realizados,
+                                             ROUND(SUM(tiempo_min) * 1.0 / SUM(informes), 1) AS promedio_tiempo,
+                                             SUM(autenticas) AS autenticas, SUM(falsas) AS falsas
+                                      FROM resumen_peritos GROUP BY usuario
+                                      HAVING SUM(informes) > 0''', conn)
+        rendimiento = pd.read_sql(SQL_RENDIMIENTO, conn, params={'desde': desde})
+
+    tablero = {
+        'total_analistas': int(analistas_group['total_fichas'].sum()),
+        'total_peritos': int(peritos_group['informes_realizados'].sum()),
+        'derivados': int(analistas_group['derivados'].sum()),
+        'autenticas': int(peritos_group['autenticas'].sum()),
+        'falsas': int(peritos_group['falsas'].sum()),
+        'fig_analistas': None, 'fig_peritos': None, 'fig_rendimiento': None,
+    }
+    if not analistas_group.empty:
+        analistas_group['porcentaje'] = (analistas_group['total_fichas'] / 420) * 100
+        tablero['fig_analistas'] = px.bar(analistas_group,
+                                          x='usuario',
+                                          y='total_fichas',
+                                          color='porcentaje',
+                                          title="Fichas Revisadas por Analista",
+                                          labels={'total_fichas': 'Fichas revisadas', 'usuario': 'Analista'},
+                                          color_continuous_scale='Blues')
+    if not peritos_group.empty:
+        tablero['fig_peritos'] = px.bar(peritos_group,
+                                        x='usuario',
+                                        y='informes_realizados',
+                                        color='autenticas',
+                                        title="Informes Realizados por Perito",
+                                        labels={'informes_realizados': 'Total de Informes', 'usuario': 'Perito'},
+                                        color_continuous_scale='Greens')
+    if not rendimiento.empty:
+        tablero['fig_rendimiento'] = px.line(rendimiento,
+                                             x='hora',
+                                             y='fichas',
+                                             color='usuario',
+                                             line_dash='rol',
+                                             markers=True,
+                                             hover_data=['acumulado', 'media_movil'],
+                                             title=f"Fichas por Hora (últimas {HORAS_RENDIMIENTO} h)",
+                                             labels={'fichas': 'Fichas por hora', 'hora': 'Hora',
+                                                     'acumulado': 'Acumulado', 'media_movil': 'Media 3 h'})
+    return tablero
+
+def tablero_reportes():
+    # La ventana del rendimiento avanza por horas completas
+    desde = datetime.fromtimestamp(time.time() - HORAS_RENDIMIENTO * 3600).strftime("%Y-%m-%d %H:00:00")
+    return _tablero_cacheado(version_tablero(), desde)
+
+# --- TRABAJOS EN SEGUNDO PLANO ---
+# Las operaciones pesadas se registran en la tabla trabajos y corren en un pool
+# de hilos del proceso: sobreviven a reruns y recargas del navegador, publican
+# su avance en la tabla y se cancelan marcando `cancelar`.
+DIR_TRABAJOS = os.environ.get("JNE_DIR_TRABAJOS", "trabajos")
+MAX_HILOS_TRABAJOS = int(os.environ.get("JNE_HILOS_TRABAJOS", "2"))
+# Cada proceso renueva el latido de sus trabajos activos; los que dejan de
+# latir (proceso o contenedor caído) se marcan como interrumpidos
+SEGUNDOS_LATIDO_TRABAJO = 30
+MINUTOS_TRABAJO_HUERFANO = int(os.environ.get("JNE_MINUTOS_TRABAJO_HUERFANO", "5"))
+DIAS_RESULTADOS_TRABAJO = int(os.environ.get("JNE_DIAS_RESULTADOS_TRABAJO", "7"))
+UMBRAL_ASIGNACION_TRABAJO = 5000
+LOTE_ASIGNACION_TRABAJO = 5000
+ESTADOS_TRABAJO = {
+    'pendiente': "⏳ Pendiente",
+    'en_curso': "⚙️ En curso",
+    'completado': "✅ Completado",
+    'error': "❌ Error",
+    'cancelado': "🚫 Cancelado",
+    'interrumpido': "⚠️ Interrumpido",
+}
 
-        return nombre_archivo
+class TrabajoCancelado(Exception):
+    pass
+
+def interrumpir_trabajos_huerfanos(conn):
+    ahora = datetime.now()
+    corte = (ahora - timedelta(minutes=MINUTOS_TRABAJO_HUERFANO)).strftime("%Y-%m-%d %H:%M:%S")
+    return conn.execute("UPDATE trabajos SET estado = 'interrumpido', terminado = ? "
+                        "WHERE estado IN ('pendiente', 'en_curso') AND COALESCE(latido, creado) < ?",
+                        (ahora.strftime("%Y-%m-%d %H:%M:%S"), corte)).rowcount
+
+def limpiar_resultados_trabajos(dias=DIAS_RESULTADOS_TRABAJO):
+    # Por fecha del archivo: también los de otros procesos que comparten DIR_TRABAJOS
+    if not os.path.isdir(DIR_TRABAJOS):
+        return 0
+    corte = time.time() - dias * 86400
+    eliminados = 0
+    for nombre in os.listdir(DIR_TRABAJOS):
+        ruta = os.path.join(DIR_TRABAJOS, nombre)
+        if nombre.startswith("reporte_") and os.path.getmtime(ruta) < corte:
+            os.remove(ruta)
+            eliminados += 1
+    with db_escritura() as conn:
+        conn.execute("UPDATE trabajos SET resultado = NULL WHERE resultado IS NOT NULL AND terminado < ?",
+                     (datetime.fromtimestamp(corte).strftime("%Y-%m-%d %H:%M:%S"),))
+    return eliminados
+
+def _avance_trabajo(trabajo_id, fraccion, mensaje):
+    with db_escritura() as conn:
+        cancelar = conn.execute("UPDATE trabajos SET progreso = ?, mensaje = ?, latido = ? WHERE id = ? "
+                                "RETURNING cancelar",
+                                (round(min(fraccion, 1.0), 4), mensaje,
+                                 datetime.now().strftime("%Y-%m-%d %H:%M:%S"), trabajo_id)).fetchall()[0][0]
+    if cancelar:
+        raise TrabajoCancelado()
+
+def _trabajo_asignacion(trabajo_id, partido_cod, cantidad, analistas, modo):
+    # Lotes con su propia transacción: el escritor queda libre entre lotes para
+    # los guardados interactivos, y una cancelación conserva los lotes completos.
+    # El tamaño es múltiplo del número de analistas para no sesgar el reparto.
+    analistas = destinatarios_reparto(analistas, modo)
+    lote = max(1, LOTE_ASIGNACION_TRABAJO // len(analistas)) * len(analistas)
+    asignadas = dict.fromkeys(analistas, 0)
+    total = 0
+    while total < cantidad:
+        resumen = asignar_fichas(partido_cod, min(lote, cantidad - total), analistas, modo)
+        if not any(resumen.values()):
+            break
+        for analista, n in resumen.items():
+            asignadas[analista] += n
+        total = sum(asignadas.values())
+        _avance_trabajo(trabajo_id, total / cantidad, f"{total} de {cantidad} fichas asignadas")
+    detalle = ", ".join(f"{analista or 'bolsa compartida'} ({n})" for analista, n in asignadas.items())
+    return None, f"{total} fichas asignadas: {detalle}"
+
+def _trabajo_exportacion(trabajo_id, formato, filtros):
+    _, extension, _ = FORMATOS_EXPORTACION[formato]
+    os.makedirs(DIR_TRABAJOS, exist_ok=True)
+    ruta = os.path.join(DIR_TRABAJOS, f"reporte_{trabajo_id}.{extension}")
+    escritas = 0
+    with db_lectura() as conn:
+        # Conteo y exportación sobre la misma instantánea
+        conn.execute("BEGIN")
+        total = 0
+        for tabla in TABLAS_EXPORTACION.values():
+            sql, parametros = _consulta_exportacion(conn, tabla, **filtros)
+            total += conn.execute(f"SELECT COUNT(*) FROM ({sql})", parametros).fetchone()[0]
+
+        def avance(filas):
+            nonlocal escritas
+            escritas += filas
+            _avance_trabajo(trabajo_id, escritas / max(total, 1), f"{escritas} de {total} filas exportadas")
 
-    finally:
-        conn.close()
+        try:
+            with open(ruta, 'wb') as destino:
+                EXPORTADORES[formato](conn, filtros, destino, avance)
+        except BaseException:
+            if os.path.exists(ruta):
+                os.remove(ruta)
+            raise
+    return ruta, f"{total} filas exportadas"
+
+def _trabajo_mantenimiento(trabajo_id, dias_retencion):
+    resultado = ejecutar_mantenimiento(
+        dias_retencion, lambda fraccion, mensaje: _avance_trabajo(trabajo_id, fraccion, mensaje))
+    return None, (f"{sum(resultado['movidas'].values())} registros archivados (anteriores a {resultado['corte']}); "
+                  f"{resultado['compactados']} archivos compactados; "
+                  f"{resultado['resultados']} resultados de trabajos eliminados")
+
+TIPOS_TRABAJO = {
+    'asignacion': _trabajo_asignacion,
+    'exportacion': _trabajo_exportacion,
+    'mantenimiento': _trabajo_mantenimiento,
+}
+ETIQUETAS_TRABAJO = {'asignacion': "Asignación", 'exportacion': "Exportación", 'mantenimiento': "Mantenimiento"}
+
+class GestorTrabajos:
+    def __init__(self, max_hilos=MAX_HILOS_TRABAJOS):
+        self._ejecutor = ThreadPoolExecutor(max_workers=max_hilos, thread_name_prefix="trabajo")
+        self._futuros = {}
+        # Sólo los trabajos sin latido: los activos de otros procesos siguen su curso
+        with db_escritura() as conn:
+            interrumpir_trabajos_huerfanos(conn)
+        limpiar_resultados_trabajos()
+        self._hilo_latido = threading.Thread(target=self._latir, name="latido_trabajos", daemon=True)
+        self._hilo_latido.start()
+
+    def _latir(self):
+        while True:
+            time.sleep(SEGUNDOS_LATIDO_TRABAJO)
+            # Incluye los que esperan en la cola del pool
+            activos = list(self._futuros)
+            if not activos:
+                continue
+            try:
+                with db_escritura() as conn:
+                    conn.execute(f"UPDATE trabajos SET latido = ? WHERE id IN ({', '.join('?' for _ in activos)})",
+                                 (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), *activos))
+            except Exception:
+                # Base ocupada: el margen de MINUTOS_TRABAJO_HUERFANO cubre varios latidos
+                pass
+
+    def enviar(self, tipo, parametros, usuario):
+        if tipo not in TIPOS_TRABAJO:
+            raise ValueError(f"Tipo de trabajo desconocido: {tipo}")
+        # El trabajo recibe exactamente lo que queda registrado
+        parametros = json.loads(json.dumps(parametros, default=str))
+        ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with db_escritura() as conn:
+            trabajo_id = conn.execute(
+                "INSERT INTO trabajos (tipo, parametros, creado_por, creado, latido) VALUES (?, ?, ?, ?, ?)",
+                (tipo, json.dumps(parametros), usuario, ahora, ahora)).lastrowid
+        self._futuros[trabajo_id] = self._ejecutor.submit(self._ejecutar, trabajo_id, tipo, parametros)
+        return trabajo_id
+
+    def _ejecutar(self, trabajo_id, tipo, parametros):
+        try:
+            with db_escritura() as conn:
+                iniciado = conn.execute("UPDATE trabajos SET estado = 'en_curso', iniciado = ? "
+                                        "WHERE id = ? AND cancelar = 0 RETURNING id",
+                                        (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), trabajo_id)).fetchall()
+            if not iniciado:
+                return
+            resultado, mensaje, error = None, None, None
+            try:
+                resultado, mensaje = TIPOS_TRABAJO[tipo](trabajo_id, **parametros)
+                estado = 'completado'
+            except TrabajoCancelado:
+                estado = 'cancelado'
+            except Exception as e:
+                estado, error = 'error', str(e)
+            with db_escritura() as conn:
+                conn.execute('''UPDATE trabajos SET estado = ?, resultado = ?, error = ?, terminado = ?,
+                                    mensaje = COALESCE(?, mensaje),
+                                    progreso = CASE WHEN ? = 'completado' THEN 1 ELSE progreso END
+                                WHERE id = ?''',
+                             (estado, resultado, error, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                              mensaje, estado, trabajo_id))
+        finally:
+            self._futuros.pop(trabajo_id, None)
+
+    def cancelar(self, trabajo_id):
+        with db_escritura() as conn:
+            conn.execute("UPDATE trabajos SET cancelar = 1 WHERE id = ?", (trabajo_id,))
+            # Los que aún esperan en la cola del pool se cierran aquí mismo
+            conn.execute("UPDATE trabajos SET estado = 'cancelado', terminado = ? WHERE id = ? AND estado = 'pendiente'",
+                         (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), trabajo_id))
+        futuro = self._futuros.get(trabajo_id)
+        if futuro:
+            futuro.cancel()
+
+@st.cache_resource(show_spinner=False)
+def gestor_trabajos():
+    return GestorTrabajos()
+
+def _leer_resultado(ruta):
+    with open(ruta, 'rb') as f:
+        return f.read()
+
+def _lista_trabajos(creado_por, limite, habia_activos):
+    condicion, parametros = ("WHERE creado_por = ?", (creado_por,)) if creado_por else ("", ())
+    with db_lectura() as conn:
+        trabajos = conn.execute(f'''SELECT id, tipo, estado, progreso, mensaje, resultado, error,
+                                           creado_por, creado, terminado
+                                    FROM trabajos {condicion} ORDER BY id DESC LIMIT ?''',
+                                (*parametros, limite)).fetchall()
+    if not trabajos:
+        st.info("No hay trabajos registrados")
+        return
+    activos = 0
+    for trabajo_id, tipo, estado, progreso, mensaje, resultado, error, autor, creado, terminado in trabajos:
+        with st.container(border=True):
+            st.write(f"**#{trabajo_id} · {ETIQUETAS_TRABAJO.get(tipo, tipo)}** — {ESTADOS_TRABAJO.get(estado, estado)} "
+                     f"· {autor} · {creado}" + (f" → {terminado}" if terminado else ""))
+            if estado in ('pendiente', 'en_curso'):
+                activos += 1
+                st.progress(progreso, text=mensaje or "En espera")
+                if st.button("Cancelar", key=f"cancelar_trabajo_{trabajo_id}"):
+                    gestor_trabajos().cancelar(trabajo_id)
+                    st.rerun(scope="fragment")
+            elif estado == 'error':
+                st.error(error)
+            elif mensaje:
+                st.caption(mensaje)
+            if estado == 'completado' and resultado and os.path.exists(resultado):
+                st.download_button("📄 Descargar", data=lambda ruta=resultado: _leer_resultado(ruta),
+                                   file_name=os.path.basename(resultado), key=f"descargar_trabajo_{trabajo_id}")
+    if habia_activos and not activos:
+        # Terminó lo que se estaba siguiendo: un rerun completo detiene el sondeo
+        st.rerun()
+
+def panel_trabajos(creado_por=None, limite=20, intervalo=2):
+    gestor_trabajos()
+    condicion, parametros = (" AND creado_por = ?", (creado_por,)) if creado_por else ("", ())
+    with db_lectura() as conn:
+        activos = conn.execute("SELECT COUNT(*) FROM trabajos WHERE estado IN ('pendiente', 'en_curso')" + condicion,
+                               parametros).fetchone()[0]
+    # Solo se sondea mientras haya trabajos activos, y lo que se reejecuta es el
+    # fragmento, no la página completa
+    st.fragment(run_every=intervalo if activos else None)(_lista_trabajos)(creado_por, limite, bool(activos))
 
 # --- PÁGINAS ---
 def login_page():
@@ -160,357 +2293,566 @@ def login_page():
             user = login(username, password)
             if user:
                 st.session_state['user'] = user
-                st.success(f"Bienvenido {user['nombre']}")
-                time.sleep(1)
                 st.rerun()
             else:
                 st.error("Usuario o contraseña incorrectos")
 
+@medir_pagina
 def admin_page():
     st.title("Panel de Administración")
-    tab1, tab2, tab3 = st.tabs(["Usuarios", "Asignaciones", "Reportes"])
-    
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["Usuarios", "Asignaciones", "Reportes", "Trabajos", "Rendimiento"])
+
+    # Cada pestaña es un fragmento: sus botones y selectores solo reejecutan la pestaña
     with tab1:
-        st.subheader("Gestión de Usuarios")
-        with sqlite3.connect('jne_verification.db') as conn:
-            usuarios = pd.read_sql("SELECT id, username, nombre, rol, activo FROM usuarios", conn)
-            st.dataframe(usuarios)
-            with st.expander("Crear Nuevo Usuario"):
-                with st.form("nuevo_usuario"):
-                    username = st.text_input("Nombre de usuario")
-                    password = st.text_input("Contraseña", type="password")
-                    nombre = st.text_input("Nombre completo")
-                    rol = st.selectbox("Rol", ["analista", "perito", "admin"])
-                    activo = st.checkbox("Activo", value=True)
-                    if st.form_submit_button("Registrar"):
-                        try:
-                            hashed_pw, salt = hash_password(password)
-                            conn.execute(
-                                "INSERT INTO usuarios (username, password, salt, nombre, rol, activo) VALUES (?, ?, ?, ?, ?, ?)",
-                                (username, hashed_pw, salt, nombre, rol, int(activo)))
-                            conn.commit()
-                            st.success("Usuario creado exitosamente")
-                            time.sleep(1)
-                            st.rerun()
-                        except sqlite3.IntegrityError:
-                            st.error("El nombre de usuario ya existe")
-                        except Exception as e:
-                            st.error(f"Error al registrar: {str(e)}")
-    
+        pestana_usuarios()
+
     with tab2:
-        st.subheader("Asignación de Trabajo")
-        fichas_df = cargar_fichas()
-        if fichas_df is None:
-            st.error("No se pudo cargar el archivo de fichas")
-            return
-        with st.expander("Asignar Fichas a Analistas"):
-            with st.form("asignar_analistas"):
-                partido_cod = st.selectbox("Partido", list(PARTIDOS.keys()), format_func=lambda x: PARTIDOS[x])
-                fichas_partido = fichas_df[fichas_df['COD_OP'] == partido_cod]
-                disponibles = len(fichas_partido)
-                cantidad = st.number_input("Cantidad de fichas", min_value=1, max_value=disponibles, value=min(420, disponibles))
-                usuario = st.selectbox("Analista",
-                                      pd.read_sql("SELECT username FROM usuarios WHERE rol = 'analista'", conn)['username'].tolist())
-                if st.form_submit_button("Asignar"):
-                    conn = sqlite3.connect('jne_verification.db')
-                    try:
-                        c = conn.cursor()
-                        fichas_a_asignar = fichas_partido.head(cantidad)
-                        for _, ficha in fichas_a_asignar.iterrows():
-                            c.execute('''SELECT 1 FROM asignaciones 
-                                        WHERE dni = ? AND num_fic = ? AND tipo_asignacion = ?''',
-                                     (ficha['COD_DNI'], ficha['NUM_FIC'], 'analista'))
-                            if not c.fetchone():
-                                conn.execute('''INSERT INTO asignaciones 
-                                              (dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion, completado)
-                                              VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                                          (ficha['COD_DNI'], ficha['NUM_FIC'], PARTIDOS[partido_cod],
-                                           usuario, 'analista', datetime.now().strftime("%Y-%m-%d"), 0))
-                        conn.commit()
-                        st.success(f"{cantidad} fichas asignadas a {usuario}")
-                        time.sleep(1)
-                        st.rerun()
-                    except Exception as e:
-                        conn.rollback()
-                        st.error(f"Error al asignar: {str(e)}")
-                    finally:
-                        conn.close()
+        pestana_asignaciones()
 
     with tab3:
-        st.subheader("Reportes de Progreso")
-        conn = sqlite3.connect('jne_verification.db')
+        pestana_reportes()
+
+    with tab4:
+        st.subheader("Trabajos en segundo plano")
+        panel_trabajos()
+
+    with tab5:
+        panel_rendimiento()
+
+def mostrar_aviso(clave):
+    aviso = st.session_state.pop(clave, None)
+    if aviso:
+        nivel, mensaje = aviso
+        getattr(st, nivel)(mensaje)
+
+# Los formularios de administración escriben en callbacks: se ejecutan antes
+# que el fragmento, que así se dibuja ya con los datos nuevos, sin un rerun extra
+def _registrar_usuario():
+    try:
+        hashed_pw, salt = hash_password(st.session_state.nuevo_password)
+        with db_escritura() as conn:
+            conn.execute(
+                "INSERT INTO usuarios (username, password, salt, nombre, rol, activo) VALUES (?, ?, ?, ?, ?, ?)",
+                (st.session_state.nuevo_username, hashed_pw, salt, st.session_state.nuevo_nombre,
+                 st.session_state.nuevo_rol, int(st.session_state.nuevo_activo)))
+        peritos_activos.clear()
+        st.session_state.aviso_usuarios = ('success', "Usuario creado exitosamente")
+    except sqlite3.IntegrityError:
+        st.session_state.aviso_usuarios = ('error', "El nombre de usuario ya existe")
+    except Exception as e:
+        st.session_state.aviso_usuarios = ('error', f"Error al registrar: {str(e)}")
+
+def _asignar_analistas():
+    partido_cod = st.session_state.asignacion_partido
+    cantidad = int(st.session_state.asignacion_cantidad)
+    seleccion = st.session_state.asignacion_analistas
+    modo = st.session_state.asignacion_modo
+    try:
+        if cantidad >= UMBRAL_ASIGNACION_TRABAJO:
+            # Las asignaciones grandes van al pool de trabajos
+            destinatarios_reparto(seleccion, modo)
+            trabajo_id = gestor_trabajos().enviar(
+                'asignacion', {'partido_cod': partido_cod, 'cantidad': cantidad, 'analistas': seleccion, 'modo': modo},
+                st.session_state['user']['username'])
+            st.session_state.aviso_asignacion = (
+                'info', f"Asignación enviada como trabajo #{trabajo_id}; sigue su avance en la pestaña Trabajos")
+        else:
+            resumen = asignar_fichas(partido_cod, cantidad, seleccion, modo)
+            detalle = ", ".join(f"{analista or 'bolsa compartida'} ({n})" for analista, n in resumen.items())
+            st.session_state.aviso_asignacion = ('success', f"{sum(resumen.values())} fichas asignadas: {detalle}")
+    except Exception as e:
+        st.session_state.aviso_asignacion = ('error', f"Error al asignar: {str(e)}")
+
+def _derivar_sospechosas():
+    try:
+        derivadas = derivar_sospechosas('perito')
+        if derivadas:
+            st.session_state.aviso_sospechosos = ('success', f"{derivadas} fichas derivadas a peritos")
+        else:
+            st.session_state.aviso_sospechosos = ('warning', "No se derivó ninguna ficha (¿hay peritos activos?)")
+    except Exception as e:
+        st.session_state.aviso_sospechosos = ('error', f"Error al derivar: {str(e)}")
+
+def _recalcular_sospechosos():
+    try:
+        marcados = actualizar_sospechosos()
+        st.session_state.aviso_sospechosos = ('success', f"Detección completa: {marcados} DNI marcados")
+    except Exception as e:
+        st.session_state.aviso_sospechosos = ('error', f"Error al recalcular: {str(e)}")
+
+def _ejecutar_mantenimiento():
+    try:
+        trabajo_id = programar_mantenimiento(st.session_state['user']['username'], forzar=True)
+        if trabajo_id is None:
+            st.session_state.aviso_mantenimiento = ('warning', "Ya hay un mantenimiento en curso")
+        else:
+            st.session_state.aviso_mantenimiento = ('info', f"Mantenimiento enviado como trabajo #{trabajo_id}; "
+                                                            "sigue su avance en la pestaña Trabajos")
+    except Exception as e:
+        st.session_state.aviso_mantenimiento = ('error', f"Error al programar: {str(e)}")
+
+@st.fragment
+@medir_pagina
+def pestana_usuarios():
+    import pandas as pd
+    st.subheader("Gestión de Usuarios")
+    mostrar_aviso('aviso_usuarios')
+    with db_lectura() as conn:
+        usuarios = pd.read_sql("SELECT id, username, nombre, rol, activo FROM usuarios", conn)
+    st.dataframe(usuarios)
+    with st.expander("Crear Nuevo Usuario"):
+        with st.form("nuevo_usuario"):
+            st.text_input("Nombre de usuario", key="nuevo_username")
+            st.text_input("Contraseña", type="password", key="nuevo_password")
+            st.text_input("Nombre completo", key="nuevo_nombre")
+            st.selectbox("Rol", ["analista", "perito", "admin"], key="nuevo_rol")
+            st.checkbox("Activo", value=True, key="nuevo_activo")
+            st.form_submit_button("Registrar", on_click=_registrar_usuario)
+
+@st.fragment
+@medir_pagina
+def pestana_asignaciones():
+    import pandas as pd
+    st.subheader("Asignación de Trabajo")
+    if sincronizar_fichas_db() is None:
+        st.error("No se pudo cargar el archivo de fichas")
+        return
+    with st.expander("Catálogo de Fichas"):
+        with db_lectura() as conn:
+            total_catalogo = conn.execute("SELECT COUNT(*) FROM fichas").fetchone()[0]
+        st.write(f"Fichas en base de datos: {total_catalogo}")
+        if st.button("Sincronizar catálogo"):
+            try:
+                resumen = ingestar_fichas()
+                derivadas = derivar_sospechosas()
+                st.success(f"Nuevas: {resumen['nuevas']} | Actualizadas: {resumen['actualizadas']} | "
+                           f"Sin cambios: {resumen['sin_cambios']} | Eliminadas: {resumen['eliminadas']} | "
+                           f"Sospechosas derivadas a peritos: {derivadas}")
+            except Exception as e:
+                st.error(f"Error al sincronizar: {str(e)}")
+    with st.expander("DNI repetidos (posible fraude)"):
+        mostrar_aviso('aviso_sospechosos')
+        sospechosos = resumen_sospechosos()
+        col_dnis, col_partidos, col_fichas, col_libres = st.columns(4)
+        col_dnis.metric("DNI marcados", sospechosos['dnis'])
+        col_partidos.metric("En varios partidos", sospechosos['varios_partidos'])
+        col_fichas.metric("Fichas afectadas", sospechosos['fichas'])
+        col_libres.metric("Sin asignar", sospechosos['sin_asignar'])
+        if not sospechosos['principales'].empty:
+            st.dataframe(sospechosos['principales'], hide_index=True)
+        col_derivar, col_recalcular = st.columns(2)
+        col_derivar.button("Derivar sin asignar a peritos", on_click=_derivar_sospechosas,
+                           disabled=not sospechosos['sin_asignar'])
+        col_recalcular.button("Recalcular sobre todo el catálogo", on_click=_recalcular_sospechosos)
+        st.caption(f"Destino de las fichas sospechosas: {DESTINO_SOSPECHOSAS}")
+    with st.expander("Asignar Fichas a Analistas"):
+        mostrar_aviso('aviso_asignacion')
+        lista_partidos = partidos()
+        partido_cod = st.selectbox("Partido", list(lista_partidos.keys()), format_func=lambda x: lista_partidos[x],
+                                   key="asignacion_partido")
+        with db_lectura() as conn:
+            disponibles = contar_fichas_sin_asignar(conn, partido_cod)
+            en_bolsa = fichas_en_bolsa(conn).get(lista_partidos[partido_cod], 0)
+            analistas = [row[0] for row in conn.execute(
+                "SELECT username FROM usuarios WHERE rol = 'analista' AND activo = 1 ORDER BY username")]
+        st.write(f"Fichas sin asignar en {lista_partidos[partido_cod]}: {disponibles}")
+        st.caption(f"En la bolsa compartida, sin reclamar: {en_bolsa}")
+        if disponibles:
+            with st.form("asignar_analistas"):
+                st.number_input("Cantidad de fichas", min_value=1, max_value=disponibles,
+                                value=min(420, disponibles), key="asignacion_cantidad")
+                st.multiselect("Analistas", analistas, key="asignacion_analistas")
+                st.radio("Reparto", list(MODOS_REPARTO.keys()), format_func=lambda x: MODOS_REPARTO[x],
+                         horizontal=True, key="asignacion_modo")
+                st.form_submit_button("Asignar", on_click=_asignar_analistas)
+
+    with st.expander("Carga de Peritos"):
+        peritos = peritos_activos()
+        if peritos:
+            with db_lectura() as conn:
+                carga = carga_pendiente(conn, peritos, 'perito')
+            st.dataframe(pd.DataFrame(list(carga.items()), columns=['Perito', 'Casos pendientes']),
+                         hide_index=True)
+            st.caption(f"Modo de derivación: {MODO_DERIVACION}")
+        else:
+            st.info("No hay peritos activos registrados")
+
+@st.fragment
+@medir_pagina
+def pestana_reportes():
+    st.subheader("Reportes de Progreso")
+    with db_lectura() as conn:
+        corte = fecha_corte_historico(conn)
+        ultimo = conn.execute("SELECT corte, archivadas, compactados, inicio, fin FROM mantenimientos "
+                              "ORDER BY id DESC LIMIT 1").fetchone()
+
+    explorador_resultados()
+    if corte:
+        st.caption(f"Sin filtro de fechas se incluyen los registros archivados (anteriores al {corte}); "
+                   "con un rango posterior sólo se leen las tablas calientes.")
+
+    with st.expander("Archivo histórico y mantenimiento"):
+        mostrar_aviso('aviso_mantenimiento')
+        if ultimo:
+            corte_ultimo, archivadas, compactados, inicio, fin = ultimo
+            st.write(f"Último mantenimiento: {inicio} → {fin or 'en curso'} · corte {corte_ultimo} · "
+                     f"{archivadas or 0} registros archivados · {compactados or 0} archivos compactados")
+        else:
+            st.write("Aún no se ha ejecutado ningún mantenimiento")
+        st.caption(f"Se archivan los días con más de {DIAS_RETENCION} días de antigüedad"
+                   + (f", cada {INTERVALO_MANTENIMIENTO_H:g} h" if INTERVALO_MANTENIMIENTO_H > 0 else ""))
+        st.button("Ejecutar mantenimiento ahora", on_click=_ejecutar_mantenimiento)
+
+    if st.button("Reconstruir resúmenes"):
         try:
-            df_analistas = pd.read_sql("SELECT * FROM analistas", conn)
-            df_peritos = pd.read_sql("SELECT * FROM peritos", conn)
+            diferencias = reconstruir_resumenes()
+            if any(diferencias.values()):
+                st.warning(f"Resúmenes reconstruidos. Filas inconsistentes corregidas: {diferencias}")
+            else:
+                st.success("Resúmenes consistentes con los registros")
+        except Exception as e:
+            st.error(f"Error al reconstruir: {str(e)}")
+
+def explorador_resultados():
+    import pandas as pd
+    tabla = st.radio("Resultados de", list(COLUMNAS_EXPLORADOR), format_func=str.capitalize, horizontal=True,
+                     key="explorador_tabla", on_change=_reiniciar_explorador)
+    with st.form("explorador_filtros"):
+        col_usuario, col_partido, col_desde, col_hasta = st.columns(4)
+        usuario = col_usuario.text_input("Usuario", key="explorador_usuario")
+        partido = col_partido.selectbox("Partido", ['', *partidos().values()], key="explorador_partido",
+                                        format_func=lambda nombre: nombre or "Todos")
+        fecha_desde = col_desde.date_input("Desde", value=None, key="explorador_desde")
+        fecha_hasta = col_hasta.date_input("Hasta", value=None, key="explorador_hasta")
+        columnas = st.columns(len(MARCAS_EXPLORADOR[tabla]) + 1)
+        marcas = {}
+        for col, (marca, etiqueta) in zip(columnas, MARCAS_EXPLORADOR[tabla].items()):
+            valor = col.selectbox(etiqueta, ["Todas", "Sí", "No"], key=f"explorador_{marca}")
+            if valor != "Todas":
+                marcas[marca] = valor == "Sí"
+        texto = columnas[-1].text_input("Observaciones con las palabras", key="explorador_texto",
+                                        placeholder="firma ilegible")
+        st.form_submit_button("Buscar", on_click=_reiniciar_explorador)
+
+    filtros = {'fecha_desde': fecha_desde, 'fecha_hasta': fecha_hasta, 'partido': partido or None,
+               'usuario': usuario.strip() or None, 'marcas': marcas, 'texto': texto}
+    cursores = st.session_state.setdefault('explorador_cursores', [None])
+    pagina = explorar_resultados(tabla, filtros, cursores[-1])
+    total = contar_resultados(tabla, filtros)
+    st.caption(f"Más de {MAX_CONTEO_EXPLORADOR} resultados" if total > MAX_CONTEO_EXPLORADOR
+               else f"{total} resultados")
+    st.dataframe(pd.DataFrame(pagina['filas'], columns=pagina['columnas']), hide_index=True, width="stretch")
+
+    col_anterior, col_info, col_siguiente = st.columns([1, 2, 1])
+    col_anterior.button("◀ Anterior", key="explorador_anterior", disabled=len(cursores) == 1,
+                        on_click=_retroceder_explorador)
+    col_info.write(f"Página {len(cursores)}")
+    col_siguiente.button("Siguiente ▶", key="explorador_siguiente", disabled=not pagina['hay_mas'],
+                         on_click=_avanzar_explorador, args=(pagina['filas'][-1][0] if pagina['filas'] else None,))
+
+# La pila de cursores (id tras el que empieza cada página) se reinicia al
+# cambiar los filtros
+def _reiniciar_explorador():
+    st.session_state.explorador_cursores = [None]
+
+def _avanzar_explorador(cursor):
+    st.session_state.explorador_cursores.append(cursor)
+
+def _retroceder_explorador():
+    st.session_state.explorador_cursores.pop()
+
+def resumen_metricas(eventos):
+    import pandas as pd
+    df = pd.DataFrame(eventos, columns=['tipo', 'pagina', 'sql', 'ms', 'filas', 'consultas',
+                                        'sentencias', 'repetidas', 'ts'])
+    percentiles = lambda g: g['ms'].quantile([0.5, 0.95]).round(2).set_axis(['p50_ms', 'p95_ms'])
+    paginas = df[df['tipo'] == 'pagina']
+    sql = df[df['tipo'] == 'sql']
+    reruns = df[df['tipo'] == 'rerun']
+
+    por_pagina = pd.DataFrame(columns=['pagina', 'renders', 'p50_ms', 'p95_ms'])
+    if not paginas.empty:
+        por_pagina = (paginas.groupby('pagina').apply(percentiles, include_groups=False)
+                      .join(paginas.groupby('pagina').size().rename('renders')).reset_index())
+
+    por_consulta = pd.DataFrame(columns=['sql', 'ejecuciones', 'total_ms', 'p50_ms', 'p95_ms', 'filas'])
+    if not sql.empty:
+        por_consulta = (sql.groupby('sql').apply(percentiles, include_groups=False)
+                        .join(sql.groupby('sql').agg(ejecuciones=('ms', 'size'), total_ms=('ms', 'sum'),
+                                                     filas=('filas', 'sum')))
+                        .reset_index().sort_values('p95_ms', ascending=False))
+
+    n_mas_1 = Counter()
+    for repetidas in reruns['repetidas'].dropna():
+        for consulta, veces in repetidas.items():
+            n_mas_1[consulta] = max(n_mas_1[consulta], veces)
+
+    return {
+        'por_pagina': por_pagina,
+        'por_consulta': por_consulta,
+        'n_mas_1': pd.DataFrame(n_mas_1.most_common(), columns=['sql', 'max_por_rerun']),
+        'reruns': reruns[['pagina', 'ms', 'consultas', 'sentencias']],
+    }
+
+@st.fragment
+def panel_rendimiento():
+    st.subheader("Rendimiento")
+    if not INSTRUMENTACION:
+        st.info("Instrumentación desactivada: se activa con JNE_INSTRUMENTACION=1")
+        return
 
-            st.write("**Progreso de Analistas**")
-            st.dataframe(df_analistas)
+    metricas = metricas_proceso()
+    resumen = resumen_metricas(list(metricas.eventos))
+    reruns = resumen['reruns']
 
-            st.write("**Progreso de Peritos**")
-            st.dataframe(df_peritos)
-        finally:
-            conn.close()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Reruns medidos", len(reruns))
+    col2.metric("Consultas por rerun (p95)", int(reruns['consultas'].quantile(0.95)) if len(reruns) else 0)
+    col3.metric("Sentencias por rerun (p95)", int(reruns['sentencias'].quantile(0.95)) if len(reruns) else 0)
+
+    st.write("**Tiempo de render por página**")
+    st.dataframe(resumen['por_pagina'], hide_index=True)
+
+    st.write("**Consultas más lentas**")
+    st.dataframe(resumen['por_consulta'].head(20), hide_index=True)
+
+    st.write(f"**Posibles N+1** (misma consulta ≥ {UMBRAL_N_MAS_1} veces en un rerun)")
+    if resumen['n_mas_1'].empty:
+        st.caption("Sin patrones repetidos")
+    else:
+        st.dataframe(resumen['n_mas_1'], hide_index=True)
 
+    if metricas.archivo:
+        st.caption(f"Eventos también en {metricas.archivo}")
+    if st.button("Vaciar métricas"):
+        metricas.vaciar()
+        st.rerun(scope="fragment")
+
+@medir_pagina
 def analista_page():
     user = st.session_state['user']
     st.title(f"Formulario de Analista - {user['nombre']}")
+    mostrar_resultado_guardado('guardado_analista')
+    bolsa_analista(user)
 
-    if 'asignaciones_analista' not in st.session_state:
-        asignaciones = get_asignaciones_pendientes(user['id'], 'analista')
-        st.session_state.asignaciones_analista = asignaciones
-    else:
-        asignaciones = st.session_state.asignaciones_analista
-
-    if not asignaciones:
+    if not contar_pendientes(user['username'], 'analista'):
         st.warning("No tienes fichas asignadas para revisar hoy")
         return
 
-    partido = st.selectbox("Partido", list(PARTIDOS.values()))
+    jornada('inicio_jornada', 'fin_jornada')
+    cola_analista(user)
 
-    if 'inicio_jornada' not in st.session_state:
-        if st.button("⏰ Iniciar jornada"):
-            st.session_state.inicio_jornada = datetime.now().strftime("%H:%M")
-            st.success(f"Jornada iniciada a las {st.session_state.inicio_jornada}")
-            st.rerun()
+def bolsa_analista(user):
+    mostrar_aviso('aviso_bolsa')
+    with db_lectura() as conn:
+        disponibles = fichas_en_bolsa(conn)
+    if not disponibles:
+        return
+    nombres = {cod: nombre for cod, nombre in partidos().items() if nombre in disponibles}
+    with st.container(border=True):
+        col_partido, col_boton = st.columns([3, 1], vertical_alignment="bottom")
+        col_partido.selectbox("Bolsa compartida", list(nombres), key="bolsa_partido",
+                              format_func=lambda cod: f"{nombres[cod]} ({disponibles[nombres[cod]]} disponibles)")
+        col_boton.button("📥 Reclamar siguiente página", on_click=_reclamar_fichas, args=(user['username'],))
+
+def _reclamar_fichas(usuario):
+    try:
+        fichas = reclamar_fichas(usuario, st.session_state.bolsa_partido)
+        if fichas:
+            # La cola se abre en la página recién reclamada
+            st.session_state.cursor_analista = fichas[0]['id'] - 1
+            st.session_state.aviso_bolsa = (
+                'success', f"{len(fichas)} fichas reclamadas; la reserva vence si no vuelves a "
+                           f"abrir su página en {MINUTOS_RECLAMO} minutos")
+        else:
+            st.session_state.aviso_bolsa = (
+                'info', "Ya tienes una página reclamada sin terminar en este partido, "
+                           "o la bolsa se vació")
+    except Exception as e:
+        st.session_state.aviso_bolsa = ('error', f"Error al reclamar fichas: {str(e)}")
+
+def _marcar_hora(clave):
+    st.session_state[clave] = datetime.now().strftime("%H:%M")
+
+@st.fragment
+def jornada(clave_inicio, clave_fin):
+    # Iniciar o finalizar la jornada solo redibuja este bloque
+    if clave_inicio not in st.session_state:
+        st.button("⏰ Iniciar jornada", key=f"{clave_inicio}_boton", on_click=_marcar_hora, args=(clave_inicio,))
     else:
-        st.info(f"🕒 Jornada iniciada a las {st.session_state.inicio_jornada}")
+        st.info(f"🕒 Jornada iniciada a las {st.session_state[clave_inicio]}")
 
-        if 'fin_jornada' not in st.session_state:
-            if st.button("⏹️ Finalizar jornada"):
-                st.session_state.fin_jornada = datetime.now().strftime("%H:%M")
-                st.success(f"🏁 Jornada terminó a las {st.session_state.fin_jornada}")
-                st.rerun()
+        if clave_fin not in st.session_state:
+            st.button("⏹️ Finalizar jornada", key=f"{clave_fin}_boton", on_click=_marcar_hora, args=(clave_fin,))
         else:
-            st.success(f"✅ Jornada terminó a las {st.session_state.fin_jornada}")
-
+            st.success(f"✅ Jornada terminó a las {st.session_state[clave_fin]}")
+
+@st.fragment
+@medir_pagina
+def cola_analista(user):
+    import pandas as pd
+    # La paginación reejecuta solo la cola; al guardar se recarga la página
+    # completa para reiniciar la jornada y los contadores
     MAX_FICHAS_POR_PAGINA = 10
-    total_fichas = len(asignaciones)
-    paginas = (total_fichas // MAX_FICHAS_POR_PAGINA) + (1 if total_fichas % MAX_FICHAS_POR_PAGINA else 0)
-    pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1)
+    _, fichas_pagina = paginar_pendientes(user['username'], 'analista', 'cursor_analista', MAX_FICHAS_POR_PAGINA)
 
-    inicio = (pagina - 1) * MAX_FICHAS_POR_PAGINA
-    fin = inicio + MAX_FICHAS_POR_PAGINA
-    fichas_pagina = asignaciones[inicio:fin]
+    if not fichas_pagina:
+        return
 
-    resultados = []
     with st.form("verificacion_firmas"):
-        for idx, ficha in enumerate(fichas_pagina):
-            with st.expander(f"Ficha {ficha['num_fic']} - DNI: {ficha['dni']}", expanded=False):
-                col_conforme, col_perito, col_obs = st.columns([1,1,3])
-                conforme = col_conforme.checkbox("Conforme ✓", key=f"conforme_{idx}")
-                para_perito = col_perito.checkbox("Para perito ⚠️", key=f"perito_{idx}")
-                observaciones = col_obs.text_input("Observaciones", key=f"obs_{idx}")
+        partido = st.selectbox("Partido", list(partidos().values()))
+        # Una sola tabla editable por página en lugar de tres widgets por ficha;
+        # la clave cambia con la página para no arrastrar ediciones entre páginas
+        editado = st.data_editor(
+            pd.DataFrame({'num_fic': [f['num_fic'] for f in fichas_pagina],
+                          'dni': [f['dni'] for f in fichas_pagina],
+                          'conforme': False, 'para_perito': False, 'observaciones': ''},
+                         index=[f['id'] for f in fichas_pagina]),
+            key=f"verificacion_{fichas_pagina[0]['id']}", hide_index=True, width="stretch",
+            disabled=['num_fic', 'dni'],
+            column_config={
+                'num_fic': "Ficha",
+                'dni': "DNI",
+                'conforme': st.column_config.CheckboxColumn("Conforme ✓"),
+                'para_perito': st.column_config.CheckboxColumn("Para perito ⚠️"),
+                'observaciones': st.column_config.TextColumn("Observaciones"),
+            })
 
+        if st.form_submit_button("Guardar Verificaciones"):
+            filas = editado.to_dict('index')
+            resultados = []
+            for ficha in fichas_pagina:
+                fila = filas[ficha['id']]
                 resultados.append({
+                    'id': ficha['id'],
                     'dni': ficha['dni'],
                     'num_fic': ficha['num_fic'],
                     'partido': ficha['partido'],
-                    'conforme': conforme,
-                    'para_perito': para_perito,
-                    'observaciones': observaciones
+                    'conforme': bool(fila['conforme']),
+                    'para_perito': bool(fila['para_perito']),
+                    'observaciones': fila['observaciones'] or ''
                 })
-
-        if st.form_submit_button("Guardar Verificaciones"):
-            try:
-                conn = sqlite3.connect('jne_verification.db')
-                cur = conn.cursor()
-                fecha = datetime.now().strftime("%Y-%m-%d")
-                hora_inicio = st.session_state.get('inicio_jornada', '')
-                hora_fin = st.session_state.get('fin_jornada', '')
-
-                for res in resultados:
-                    cur.execute('''INSERT INTO analistas 
-                                  (fecha, usuario, partido, hora_inicio, hora_fin, 
-                                   num_fic, dni, conforme, para_perito, observaciones, timestamp)
-                                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                               (fecha, user['username'], partido, hora_inicio, hora_fin,
-                                res['num_fic'], res['dni'], int(res['conforme']),
-                                int(res['para_perito']), res['observaciones'],
-                                datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-
-                    if res['para_perito']:
-                        peritos = pd.read_sql("SELECT username FROM usuarios WHERE rol = 'perito'", conn)
-                        if not peritos.empty:
-                            perito = peritos.iloc[hash(res['dni']) % len(peritos)]['username']
-                            cur.execute('''INSERT INTO asignaciones 
-                                           (dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion, completado)
-                                           VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                                        (res['dni'], res['num_fic'], res['partido'], perito, 'perito',
-                                         datetime.now().strftime("%Y-%m-%d"), 0))
-
-                conn.commit()
-                st.success("Verificaciones guardadas exitosamente")
-                time.sleep(1)
-                st.session_state.pop('asignaciones_analista', None)
-                st.session_state.pop('inicio_jornada', None)
-                st.session_state.pop('fin_jornada', None)
-                st.rerun()
-
-            except Exception as e:
-                conn.rollback()
-                st.error(f"Error al guardar los datos: {str(e)}")
-            finally:
-                conn.close()
-
+            errores = validar_verificaciones(resultados)
+            for error in errores:
+                st.error(error)
+            if not errores:
+                try:
+                    st.session_state.guardado_analista = guardar_verificaciones(
+                        user['username'], partido,
+                        st.session_state.get('inicio_jornada', ''),
+                        st.session_state.get('fin_jornada', ''),
+                        resultados)
+                    st.session_state.pop('inicio_jornada', None)
+                    st.session_state.pop('fin_jornada', None)
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error al guardar los datos: {str(e)}")
+
+@medir_pagina
 def perito_page():
     user = st.session_state['user']
     st.title(f"Formulario de Perito - {user['nombre']}")
+    mostrar_resultado_guardado('guardado_perito')
 
-    if 'asignaciones_perito' not in st.session_state:
-        asignaciones = get_asignaciones_pendientes(user['id'], 'perito')
-        st.session_state.asignaciones_perito = asignaciones
-    else:
-        asignaciones = st.session_state.asignaciones_perito
-
-    if not asignaciones:
+    if not contar_pendientes(user['username'], 'perito'):
         st.warning("No tienes informes pendientes para hoy")
         return
 
-    partido = st.selectbox("Partido", list(PARTIDOS.values()))
-
-    if 'inicio_jornada_perito' not in st.session_state:
-        if st.button("⏰ Iniciar jornada"):
-            st.session_state.inicio_jornada_perito = datetime.now().strftime("%H:%M")
-            st.success(f"Jornada iniciada a las {st.session_state.inicio_jornada_perito}")
-            st.rerun()
-    else:
-        st.info(f"🕒 Jornada iniciada a las {st.session_state.inicio_jornada_perito}")
-
-        if 'fin_jornada_perito' not in st.session_state:
-            if st.button("⏹️ Finalizar jornada"):
-                st.session_state.fin_jornada_perito = datetime.now().strftime("%H:%M")
-                st.success(f"🏁 Jornada terminó a las {st.session_state.fin_jornada_perito}")
-                st.rerun()
-        else:
-            st.success(f"✅ Jornada terminó a las {st.session_state.fin_jornada_perito}")
+    jornada('inicio_jornada_perito', 'fin_jornada_perito')
+    cola_perito(user)
 
+@st.fragment
+@medir_pagina
+def cola_perito(user):
+    import pandas as pd
     MAX_FICHAS_POR_PAGINA = 5
-    total_fichas = len(asignaciones)
-    paginas = (total_fichas // MAX_FICHAS_POR_PAGINA) + (1 if total_fichas % MAX_FICHAS_POR_PAGINA else 0)
-    pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1)
+    _, casos_pagina = paginar_pendientes(user['username'], 'perito', 'cursor_perito', MAX_FICHAS_POR_PAGINA)
 
-    inicio = (pagina - 1) * MAX_FICHAS_POR_PAGINA
-    fin = inicio + MAX_FICHAS_POR_PAGINA
-    casos_pagina = asignaciones[inicio:fin]
+    if not casos_pagina:
+        return
 
-    resultados = []
     with st.form("informe_pericial"):
-        for idx, caso in enumerate(casos_pagina):
-            with st.expander(f"Ficha: {caso['num_fic']} - DNI: {caso['dni']}", expanded=False):
-                st.markdown(f"**Análisis Grafológico - Ficha: {caso['num_fic']} | DNI: {caso['dni']}")
-
-                col1, col2, col3 = st.columns([1,1,2])
-                autentica = col1.checkbox("Auténtica ✓", key=f"aut_{idx}")
-                falsa = col2.checkbox("Falsa ✗", key=f"fals_{idx}")
-                tiempo_min = col3.number_input("Tiempo invertido (min)", min_value=1, max_value=120, value=40, key=f"time_{idx}")
-
-                observaciones = st.text_area("Observaciones técnicas", key=f"obs_{idx}")
+        st.selectbox("Partido", list(partidos().values()))
+        st.markdown("**Análisis Grafológico**")
+        editado = st.data_editor(
+            pd.DataFrame({'num_fic': [c['num_fic'] for c in casos_pagina],
+                          'dni': [c['dni'] for c in casos_pagina],
+                          'autentica': False, 'falsa': False, 'tiempo_min': 40, 'observaciones': ''},
+                         index=[c['id'] for c in casos_pagina]),
+            key=f"informe_{casos_pagina[0]['id']}", hide_index=True, width="stretch",
+            disabled=['num_fic', 'dni'],
+            column_config={
+                'num_fic': "Ficha",
+                'dni': "DNI",
+                'autentica': st.column_config.CheckboxColumn("Auténtica ✓"),
+                'falsa': st.column_config.CheckboxColumn("Falsa ✗"),
+                'tiempo_min': st.column_config.NumberColumn("Tiempo invertido (min)", min_value=1, max_value=120,
+                                                            step=1, required=True),
+                'observaciones': st.column_config.TextColumn("Observaciones técnicas"),
+            })
 
+        if st.form_submit_button("Guardar Informes"):
+            filas = editado.to_dict('index')
+            resultados = []
+            for caso in casos_pagina:
+                fila = filas[caso['id']]
                 resultados.append({
+                    'id': caso['id'],
                     'dni': caso['dni'],
                     'num_fic': caso['num_fic'],
                     'partido': caso['partido'],
-                    'autentica': autentica,
-                    'falsa': falsa,
-                    'tiempo_min': tiempo_min,
-                    'observaciones': observaciones
+                    'autentica': bool(fila['autentica']),
+                    'falsa': bool(fila['falsa']),
+                    'tiempo_min': int(fila['tiempo_min']),
+                    'observaciones': fila['observaciones'] or ''
                 })
-
-        if st.form_submit_button("Guardar Informes"):
-            try:
-                conn = sqlite3.connect('jne_verification.db')
-                cur = conn.cursor()
-                fecha = datetime.now().strftime("%Y-%m-%d")
-
-                for res in resultados:
-                    if not res['autentica'] and not res['falsa']:
-                        st.error(f"Debes marcar si la firma es auténtica o falsa para la ficha {res['num_fic']}")
-                        continue
-
-                    cur.execute('''INSERT INTO peritos 
-                                  (fecha, usuario, partido, inicio_informes, fin_informes,
-                                   dni, num_fic, autentica, falsa, tiempo_min, observaciones, timestamp)
-                                  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                               (fecha, user['username'], res['partido'],
-                                st.session_state.get('inicio_jornada_perito', ''),
-                                st.session_state.get('fin_jornada_perito', ''),
-                                res['dni'], res['num_fic'],
-                                int(res['autentica']), int(res['falsa']),
-                                res['tiempo_min'], res['observaciones'],
-                                datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
-                    
-                    cur.execute('''UPDATE asignaciones SET completado = 1 
-                                 WHERE dni = ? AND partido = ? AND tipo_asignacion = ?''',
-                              (res['dni'], res['partido'], 'perito'))
-
-                conn.commit()
-                st.success("Informes guardados exitosamente")
-                time.sleep(1)
-                st.session_state.pop('asignaciones_perito', None)
-                st.session_state.pop('inicio_jornada_perito', None)
-                st.session_state.pop('fin_jornada_perito', None)
-                st.rerun()
-
-            except Exception as e:
-                conn.rollback()
-                st.error(f"Error al guardar los datos: {str(e)}")
-            finally:
-                conn.close()
-
+            errores = validar_informes(resultados)
+            for error in errores:
+                st.error(error)
+            if not errores:
+                try:
+                    st.session_state.guardado_perito = guardar_informes(
+                        user['username'],
+                        st.session_state.get('inicio_jornada_perito', ''),
+                        st.session_state.get('fin_jornada_perito', ''),
+                        resultados)
+                    st.session_state.pop('inicio_jornada_perito', None)
+                    st.session_state.pop('fin_jornada_perito', None)
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error al guardar los datos: {str(e)}")
+
+@medir_pagina
 def reportes_page():
     st.title("📊 Reportes de Avance General")
 
-    conn = sqlite3.connect('jne_verification.db')
-
     try:
-        df_analistas = pd.read_sql("SELECT * FROM analistas", conn)
-        df_peritos = pd.read_sql("SELECT * FROM peritos", conn)
+        tablero = tablero_reportes()
+        total_analistas, total_peritos = tablero['total_analistas'], tablero['total_peritos']
 
         # Progreso por analista
-        if not df_analistas.empty:
-            analistas_group = df_analistas.groupby('usuario').agg(
-                total_fichas=('num_fic', 'count'),
-                conformes=('conforme', 'sum'),
-                derivados=('para_perito', 'sum')
-            ).reset_index()
-            analistas_group['porcentaje'] = (analistas_group['total_fichas'] / 420) * 100
-
+        if tablero['fig_analistas'] is not None:
             st.subheader("📈 Progreso por Analista")
-            fig_analistas = px.bar(analistas_group,
-                                  x='usuario',
-                                  y='total_fichas',
-                                  color='porcentaje',
-                                  title="Fichas Revisadas por Analista",
-                                  labels={'total_fichas': 'Fichas revisadas', 'usuario': 'Analista'},
-                                  color_continuous_scale='Blues')
-            st.plotly_chart(fig_analistas, use_container_width=True)
+            st.plotly_chart(tablero['fig_analistas'], use_container_width=True)
         else:
             st.info("No hay datos de analistas registrados aún.")
 
         # Progreso por perito
-        if not df_peritos.empty:
-            peritos_group = df_peritos.groupby('usuario').agg(
-                informes_realizados=('id', 'count'),
-                promedio_tiempo=('tiempo_min', 'mean'),
-                autenticas=('autentica', 'sum'),
-                falsas=('falsa', 'sum')
-            ).reset_index()
-            peritos_group['promedio_tiempo'] = peritos_group['promedio_tiempo'].round(1)
-
+        if tablero['fig_peritos'] is not None:
             st.subheader("⚖️ Progreso por Perito")
-            fig_peritos = px.bar(peritos_group,
-                                x='usuario',
-                                y='informes_realizados',
-                                color='autenticas',
-                                title="Informes Realizados por Perito",
-                                labels={'informes_realizados': 'Total de Informes', 'usuario': 'Perito'},
-                                color_continuous_scale='Greens')
-            st.plotly_chart(fig_peritos, use_container_width=True)
+            st.plotly_chart(tablero['fig_peritos'], use_container_width=True)
         else:
             st.info("No hay datos de peritos registrados aún.")
 
+        # Rendimiento por hora de cada usuario
+        st.subheader("⏱️ Rendimiento por Hora")
+        if tablero['fig_rendimiento'] is not None:
+            st.plotly_chart(tablero['fig_rendimiento'], use_container_width=True)
+        else:
+            st.info(f"Sin actividad en las últimas {HORAS_RENDIMIENTO} horas.")
+
         # Progreso general del proyecto
-        completado = len(df_analistas) + len(df_peritos)
+        completado = total_analistas + total_peritos
         porcentaje_completado = (completado / TOTAL_FICHAS) * 100
 
         st.subheader("📦 Progreso General del Proyecto")
@@ -521,31 +2863,60 @@ def reportes_page():
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("### 🔍 Análisis Preliminares")
-            st.markdown(f"- Fichas revisadas: {len(df_analistas)}")
-            st.markdown(f"- Derivadas a peritos: {df_analistas['para_perito'].sum()}")
+            st.markdown(f"- Fichas revisadas: {total_analistas}")
+            st.markdown(f"- Derivadas a peritos: {tablero['derivados']}")
         with col2:
             st.markdown("### 🧾 Informes Periciales")
-            st.markdown(f"- Informes realizados: {len(df_peritos)}")
-            st.markdown(f"- Auténticas: {df_peritos['autentica'].sum()}")
-            st.markdown(f"- Falsas: {df_peritos['falsa'].sum()}")
-
-        if st.button("📥 Exportar Reporte a Excel"):
-            nombre_archivo = exportar_reporte_excel()
-            with open(nombre_archivo, "rb") as f:
+            st.markdown(f"- Informes realizados: {total_peritos}")
+            st.markdown(f"- Auténticas: {tablero['autenticas']}")
+            st.markdown(f"- Falsas: {tablero['falsas']}")
+
+        with st.expander("📥 Exportar Reporte"):
+            with st.form("exportar_reporte"):
+                col_formato, col_partido, col_usuario = st.columns(3)
+                formato = col_formato.selectbox("Formato", list(FORMATOS_EXPORTACION.keys()),
+                                                format_func=lambda x: FORMATOS_EXPORTACION[x][0])
+                partido = col_partido.selectbox("Partido", ["Todos"] + list(partidos().values()))
+                usuario = col_usuario.text_input("Usuario (opcional)")
+                col_desde, col_hasta = st.columns(2)
+                fecha_desde = col_desde.date_input("Desde", value=None)
+                fecha_hasta = col_hasta.date_input("Hasta", value=None)
+                en_segundo_plano = st.checkbox("Generar en segundo plano (reportes grandes)")
+                generar = st.form_submit_button("Generar reporte")
+            filtros = {'fecha_desde': fecha_desde, 'fecha_hasta': fecha_hasta,
+                       'partido': None if partido == "Todos" else partido, 'usuario': usuario.strip()}
+            if generar and en_segundo_plano:
+                trabajo_id = gestor_trabajos().enviar(
+                    'exportacion', {'formato': formato,
+                                    'filtros': {clave: valor for clave, valor in filtros.items() if valor}},
+                    st.session_state['user']['username'])
+                st.info(f"Reporte enviado como trabajo #{trabajo_id}")
+            elif generar:
+                nombre_archivo, contenido, mime = exportar_reporte(formato, **filtros)
                 st.download_button(
-                    label="📄 Descargar Archivo Excel",
-                    data=f,
+                    label="📄 Descargar Reporte",
+                    data=contenido,
                     file_name=nombre_archivo,
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    mime=mime
                 )
+            with st.expander("Mis reportes en segundo plano"):
+                panel_trabajos(creado_por=st.session_state['user']['username'], limite=5)
 
     except Exception as e:
         st.error(f"Error al generar los reportes: {str(e)}")
-    finally:
-        conn.close()
         
 # --- MAIN ---
 def main():
+    if INSTRUMENTACION:
+        metricas_proceso().iniciar_rerun()
+        try:
+            _main()
+        finally:
+            metricas_proceso().terminar_rerun()
+    else:
+        _main()
+
+def _main():
     if 'user' not in st.session_state:
         login_page()
     else:
@@ -578,10 +2949,28 @@ def main():
         elif choice == "Ver Reportes":
             reportes_page()
 
-if __name__ == "__main__":
+@st.cache_resource(show_spinner=False)
+def inicializar_sistema(exigir_particionada=True):
+    # Migraciones y usuario admin: una sola vez por proceso, no en cada rerun
     init_db()
     create_admin_user()
+    if DIR_PARTICIONES:
+        registrar_partidos(())
+        if exigir_particionada and filas_sin_particionar():
+            raise RuntimeError("La base principal tiene registros sin particionar: "
+                               "ejecuta `python -m cli particionar` antes de iniciar la app")
+    else:
+        with db_lectura() as conn:
+            if conn.execute("SELECT 1 FROM particiones LIMIT 1").fetchone():
+                raise RuntimeError("La base está particionada por partido: define JNE_DIR_PARTICIONES")
+    return True
+
+if __name__ == "__main__":
+    st.set_page_config(page_title="Sistema - Verificación Firmas", layout="wide")
+    inicializar_sistema()
+    if INTERVALO_MANTENIMIENTO_H > 0:
+        programador_mantenimiento()
     main()
 
-# Nota al pie
-st.caption("© 2025 - Sistema de Verificación de Firmas desarrollado por Raúl Mauro | Versión 1.0")
+    # Nota al pie
+    st.caption("© 2025 - Sistema de Verificación de Firmas desarrollado por Raúl Mauro | Versión 1.0")
@@ -0,0 +1,104 @@
+"""Mide el arranque en frío de app.py: importación y primer render del login.
+
+Uso:
+    python benchmarks/bench_arranque.py [--repeticiones 5] [--app ruta/app.py]
+
+Cada medición corre en un intérprete nuevo, como un contenedor recién creado:
+
+- importar: `import app` (sin interfaz, como cli.py) y qué dependencias pesadas
+  quedan cargadas después
+- login_base_nueva: primer render del login contra una base vacía (migraciones)
+- login_frio: primer render del login contra una base ya migrada
+- login_caliente: segundo render en el mismo proceso (inicialización en caché)
+
+Con --app se mide otra versión del script (p. ej. `git show HEAD~1:app.py`)
+para comparar.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PESADOS = ['pandas', 'numpy', 'plotly.express', 'openpyxl', 'pyarrow']
+
+_IMPORTAR = '''
+import json, sys, time
+inicio = time.perf_counter()
+import app
+ms = (time.perf_counter() - inicio) * 1000
+print(json.dumps({'importar': ms, 'cargados': [m for m in %r if m in sys.modules]}))
+''' % PESADOS
+
+_LOGIN = '''
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file('app.py', default_timeout=600)
+inicio = time.perf_counter()
+at.run()
+primero = (time.perf_counter() - inicio) * 1000
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+inicio = time.perf_counter()
+at.run()
+segundo = (time.perf_counter() - inicio) * 1000
+print(json.dumps({'primero': primero, 'segundo': segundo,
+                  'cargados': [m for m in %r if m in sys.modules]}))
+''' % PESADOS
+
+
+def _ejecutar(codigo, directorio):
+    entorno = dict(os.environ, JNE_DB=os.path.join(directorio, "arranque.db"),
+                   JNE_INTERVALO_MANTENIMIENTO_H="0", PYTHONPATH=directorio)
+    salida = subprocess.run([sys.executable, "-c", codigo], cwd=directorio, env=entorno,
+                            capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def medir(app_py, repeticiones):
+    directorio = tempfile.mkdtemp(prefix="jne_arranque_")
+    try:
+        shutil.copy(app_py, os.path.join(directorio, "app.py"))
+        tiempos = {'importar': [], 'login_base_nueva': [], 'login_frio': [], 'login_caliente': []}
+        cargados = {}
+        for _ in range(repeticiones):
+            r = _ejecutar(_IMPORTAR, directorio)
+            tiempos['importar'].append(r['importar'])
+            cargados['importar'] = r['cargados']
+
+            for archivo in os.listdir(directorio):
+                if archivo.startswith("arranque.db"):
+                    os.remove(os.path.join(directorio, archivo))
+            tiempos['login_base_nueva'].append(_ejecutar(_LOGIN, directorio)['primero'])
+
+            r = _ejecutar(_LOGIN, directorio)
+            tiempos['login_frio'].append(r['primero'])
+            tiempos['login_caliente'].append(r['segundo'])
+            cargados['login'] = r['cargados']
+        return {'metricas_ms': {k: round(statistics.median(v), 1) for k, v in tiempos.items()},
+                'cargados': cargados}
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--app", default=os.path.join(RAIZ, "app.py"),
+                        help="script a medir (por defecto, el app.py del repositorio)")
+    args = parser.parse_args()
+
+    resultado = medir(args.app, args.repeticiones)
+    print(f"{'métrica':<18} {'ms (mediana)':>12}")
+    for metrica, ms in resultado['metricas_ms'].items():
+        print(f"{metrica:<18} {ms:>12.1f}")
+    for fase, modulos in resultado['cargados'].items():
+        print(f"cargados tras {fase}: {', '.join(modulos) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
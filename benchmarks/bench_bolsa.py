@@ -0,0 +1,117 @@
+"""Reparto previo (push) vs. bolsa compartida (pull) con analistas de distinta velocidad.
+
+Uso:
+    python benchmarks/bench_bolsa.py [--analistas 2 4 8] [--fichas 2000] [--pagina-ms 20]
+        [--reclamo-s 0.5] [--limite-s 60]
+
+Cada analista es un hilo que revisa una página de 10 fichas (espera pagina-ms
+multiplicado por 1, 2 o 3 según el analista) y la guarda con
+guardar_verificaciones. En "push" las fichas se reparten por igual al inicio;
+en "pull" cada analista reclama su siguiente página con reclamar_fichas. El
+último analista abandona tras su primera página: en push su bloque queda sin
+revisar, en pull su reclamo vence a los --reclamo-s segundos y lo toma otro.
+Se informa el tiempo hasta que la cola queda vacía (o el límite), las fichas
+revisadas y las revisadas dos veces, que deben ser 0.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+POR_PAGINA = 10
+
+
+def _preparar(modo, fichas, analistas):
+    import app
+
+    app.ARCHIVO_DB = os.path.join(tempfile.mkdtemp(prefix="jne_bench_"), f"{modo}_{len(analistas)}.db")
+    app.init_db()
+    with sqlite3.connect(app.ARCHIVO_DB) as conn:
+        conn.executemany("INSERT INTO usuarios (username, password, salt, nombre, rol, activo) "
+                         "VALUES (?, '', '', ?, 'analista', 1)", [(a, a) for a in analistas])
+        conn.execute("INSERT INTO partidos (cod_op, nombre) VALUES ('1', 'Partido 1')")
+        conn.executemany('''INSERT INTO asignaciones
+                            (dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion, completado)
+                            VALUES (?, ?, 'Partido 1', ?, 'analista', '2025-01-01', 0)''',
+                         [(f"{i:08d}", str(i), None if modo == 'pull' else analistas[i % len(analistas)])
+                          for i in range(fichas)])
+    app.registro_particiones().invalidar()
+
+
+def _revisar(app, usuario, pagina, espera):
+    time.sleep(espera)
+    app.guardar_verificaciones(usuario, 'Partido 1', '', '', [
+        dict(ficha, conforme=True, para_perito=False, observaciones='') for ficha in pagina])
+
+
+def ejecutar(modo, n_analistas, fichas, pagina_ms, limite_s):
+    import app
+
+    analistas = [f"analista_{i}" for i in range(n_analistas)]
+    _preparar(modo, fichas, analistas)
+    ausente = analistas[-1]
+    limite = time.perf_counter() + limite_s
+
+    def activas():
+        with app.db_lectura() as conn:
+            return conn.execute(f"SELECT COUNT(*) FROM asignaciones WHERE {app.SQL_ACTIVA}").fetchone()[0]
+
+    def analista(n, usuario):
+        espera = pagina_ms * (1 + n % 3) / 1000
+        while time.perf_counter() < limite:
+            pagina = app.get_asignaciones_pendientes(usuario, 'analista', POR_PAGINA)
+            if not pagina and modo == 'pull':
+                pagina = app.reclamar_fichas(usuario, '1', POR_PAGINA)
+            if usuario == ausente:
+                # Abre su primera página y se va sin guardarla
+                if pagina:
+                    app.iniciar_asignaciones(usuario, pagina)
+                return
+            if pagina:
+                _revisar(app, usuario, pagina, espera)
+            elif modo == 'push' or not activas():
+                return
+            else:
+                # Quedan reclamos ajenos en curso: pueden volver a la bolsa
+                time.sleep(espera)
+
+    hilos = [threading.Thread(target=analista, args=(n, usuario)) for n, usuario in enumerate(analistas)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    total = time.perf_counter() - inicio
+    with app.db_lectura() as conn:
+        revisadas, repetidas = conn.execute(
+            "SELECT COUNT(DISTINCT num_fic), COUNT(*) - COUNT(DISTINCT num_fic) FROM analistas").fetchone()
+    return total, revisadas, repetidas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--analistas", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--fichas", type=int, default=2000)
+    parser.add_argument("--pagina-ms", type=float, default=20)
+    parser.add_argument("--reclamo-s", type=float, default=0.5,
+                        help="duración del reclamo (en la app, JNE_MINUTOS_RECLAMO)")
+    parser.add_argument("--limite-s", type=float, default=60)
+    args = parser.parse_args()
+
+    import app
+    app.MINUTOS_RECLAMO = args.reclamo_s / 60
+    print(f"{'analistas':>9} {'modo':>5} {'segundos':>9} {'revisadas':>9} {'fichas/s':>9} {'repetidas':>9}")
+    for n in args.analistas:
+        for modo in ('push', 'pull'):
+            total, revisadas, repetidas = ejecutar(modo, n, args.fichas, args.pagina_ms, args.limite_s)
+            print(f"{n:>9} {modo:>5} {total:>9.2f} {revisadas:>9} {revisadas / total:>9.1f} {repetidas:>9}")
+
+
+if __name__ == "__main__":
+    main()
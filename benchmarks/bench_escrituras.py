@@ -0,0 +1,149 @@
+"""Prueba de estrés con escritores concurrentes: conexión directa vs. pool WAL.
+
+Uso:
+    python benchmarks/bench_escrituras.py [--escritores 24] [--guardados 20] [--lectores 4]
+
+Cada escritor simula el botón "Guardar Verificaciones" (10 filas en analistas
+y una derivación en asignaciones) mientras varios lectores recorren la tabla
+completa, como hace reportes_page. El modo "directo" reproduce el patrón
+anterior: una conexión nueva por operación con el journal por defecto.
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+FILAS_POR_PAGINA = 10
+
+
+def _guardar_pagina(conn, escritor, pagina):
+    ahora = time.strftime("%Y-%m-%d %H:%M:%S")
+    conn.executemany('''INSERT INTO analistas
+                        (fecha, usuario, partido, hora_inicio, hora_fin,
+                         num_fic, dni, conforme, para_perito, observaciones, timestamp)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                     [(ahora[:10], f"analista_{escritor}", 'Partido 1', '08:00', '',
+                       f"{pagina}-{i}", f"{escritor:04d}{pagina:04d}", 1, 0, '', ahora)
+                      for i in range(FILAS_POR_PAGINA)])
+    conn.execute('''INSERT INTO asignaciones
+                    (dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion, completado)
+                    VALUES (?, ?, 'Partido 1', 'perito_1', 'perito', ?, 0)''',
+                 (f"{escritor:04d}{pagina:04d}", str(pagina), ahora[:10]))
+
+
+def _directo(ruta):
+    def escribir(escritor, pagina):
+        conn = sqlite3.connect(ruta)
+        try:
+            _guardar_pagina(conn, escritor, pagina)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def leer():
+        conn = sqlite3.connect(ruta)
+        try:
+            conn.execute("SELECT * FROM analistas").fetchall()
+        finally:
+            conn.close()
+
+    return escribir, leer
+
+
+def _pool(ruta):
+    import app
+
+    pool = app.PoolConexiones(ruta)
+
+    def escribir(escritor, pagina):
+        with pool.escritura() as conn:
+            _guardar_pagina(conn, escritor, pagina)
+
+    def leer():
+        with pool.lectura() as conn:
+            conn.execute("SELECT * FROM analistas").fetchall()
+
+    return escribir, leer
+
+
+def ejecutar(modo, escritores, guardados, lectores):
+    import app
+
+    ruta = os.path.join(tempfile.mkdtemp(prefix="jne_bench_"), f"{modo}.db")
+    conn = app.abrir_conexion(ruta)
+    app.aplicar_migraciones(conn)
+    if modo == 'directo':
+        conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+
+    escribir, leer = (_directo if modo == 'directo' else _pool)(ruta)
+    latencias, errores = [], []
+    candado = threading.Lock()
+    terminado = threading.Event()
+
+    def escritor(n):
+        for pagina in range(guardados):
+            inicio = time.perf_counter()
+            try:
+                escribir(n, pagina)
+            except sqlite3.OperationalError as e:
+                with candado:
+                    errores.append(str(e))
+                continue
+            with candado:
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+    def lector():
+        while not terminado.is_set():
+            try:
+                leer()
+            except sqlite3.OperationalError as e:
+                with candado:
+                    errores.append(str(e))
+
+    hilos_lectura = [threading.Thread(target=lector) for _ in range(lectores)]
+    hilos_escritura = [threading.Thread(target=escritor, args=(n,)) for n in range(escritores)]
+    inicio = time.perf_counter()
+    for hilo in hilos_lectura + hilos_escritura:
+        hilo.start()
+    for hilo in hilos_escritura:
+        hilo.join()
+    total = time.perf_counter() - inicio
+    terminado.set()
+    for hilo in hilos_lectura:
+        hilo.join()
+
+    latencias.sort()
+    return {
+        'modo': modo,
+        'guardados_ok': len(latencias),
+        'errores': len(errores),
+        'bloqueos': sum('locked' in e for e in errores),
+        'p50_ms': round(statistics.median(latencias), 2) if latencias else None,
+        'p95_ms': round(latencias[int(len(latencias) * 0.95) - 1], 2) if latencias else None,
+        'max_ms': round(latencias[-1], 2) if latencias else None,
+        'total_s': round(total, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escritores", type=int, default=24)
+    parser.add_argument("--guardados", type=int, default=20)
+    parser.add_argument("--lectores", type=int, default=4)
+    parser.add_argument("--modos", nargs="+", default=['directo', 'pool'], choices=['directo', 'pool'])
+    args = parser.parse_args()
+
+    for modo in args.modos:
+        print(ejecutar(modo, args.escritores, args.guardados, args.lectores))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Mide el explorador de resultados (filtros indexados y búsqueda FTS5) por escala.
+
+Uso:
+    python benchmarks/bench_explorador.py [--escalas 100000 1000000] [--repeticiones 10]
+
+Carga N filas en analistas a través de los triggers (resúmenes, versión e
+índice FTS5), con un 0,1 % de observaciones "firma ilegible", y mide lo que
+hace un render del explorador (primera página + conteo acotado) con cada
+filtro. "texto_like" es la misma búsqueda con LIKE '%...%' sobre la tabla, como
+referencia de lo que cuesta sin el índice de texto.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+OBSERVACIONES = ['', '', '', 'sin observaciones', 'huella borrosa', 'DNI no coincide con el padrón',
+                 'firma distinta a la del RENIEC', 'ficha con enmendaduras', 'datos incompletos']
+
+
+def _poblar(conn, total, analistas=50, lote=50_000):
+    azar = random.Random(1)
+    for inicio in range(0, total, lote):
+        filas = []
+        for i in range(inicio, min(inicio + lote, total)):
+            observaciones = ("Firma ilegible en el reverso" if i % 1000 == 0
+                             else azar.choice(OBSERVACIONES))
+            filas.append((f"2025-01-{i % 28 + 1:02d}", f"analista_{i % analistas}", f"Partido {i % 4 + 1}",
+                          str(i), f"{i:08d}", int(i % 7 != 0), int(i % 7 == 0 and i % 3 == 0), observaciones))
+        conn.executemany('''INSERT INTO analistas
+                            (fecha, usuario, partido, hora_inicio, hora_fin,
+                             num_fic, dni, conforme, para_perito, observaciones, timestamp)
+                            VALUES (?, ?, ?, '', '', ?, ?, ?, ?, ?, '')''',
+                         [(f, u, p, n, d, c, pp, o) for f, u, p, n, d, c, pp, o in filas])
+        conn.commit()
+
+
+def _ms(fn, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def medir(escala, repeticiones):
+    import app
+
+    app.ARCHIVO_DB = os.path.join(tempfile.mkdtemp(prefix="jne_bench_"), f"explorador_{escala}.db")
+    app.init_db()
+    inicio = time.perf_counter()
+    with sqlite3.connect(app.ARCHIVO_DB) as conn:
+        _poblar(conn, escala)
+        conn.execute("ANALYZE")
+    carga = time.perf_counter() - inicio
+
+    def render(filtros):
+        return lambda: (app.explorar_resultados('analistas', filtros), app.contar_resultados('analistas', filtros))
+
+    def like():
+        with app.db_lectura() as conn:
+            conn.execute("SELECT * FROM analistas WHERE observaciones LIKE ? ORDER BY id DESC LIMIT ?",
+                         ('%firma ilegible%', app.FILAS_EXPLORADOR + 1)).fetchall()
+            conn.execute("SELECT COUNT(*) FROM (SELECT 1 FROM analistas WHERE observaciones LIKE ? LIMIT ?)",
+                         ('%firma ilegible%', app.MAX_CONTEO_EXPLORADOR + 1)).fetchone()
+
+    casos = {
+        'sin_filtros': render({}),
+        'usuario_fecha': render({'usuario': 'analista_7', 'fecha_desde': '2025-01-10', 'fecha_hasta': '2025-01-12'}),
+        'partido_para_perito': render({'partido': 'Partido 2', 'marcas': {'para_perito': True}}),
+        'texto_fts': render({'texto': 'firma ilegible'}),
+        'texto_fts_usuario': render({'texto': 'firma ilegible', 'usuario': 'analista_0'}),
+        'texto_like': like,
+    }
+    encontradas = app.contar_resultados('analistas', {'texto': 'firma ilegible'})
+    return carga, encontradas, {nombre: _ms(caso, repeticiones) for nombre, caso in casos.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escalas", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    for escala in args.escalas:
+        carga, encontradas, tiempos = medir(escala, args.repeticiones)
+        print(f"{escala} filas: carga {carga:.1f} s ({escala / carga:.0f} filas/s), "
+              f"'firma ilegible' en {encontradas}")
+        for nombre, ms in tiempos.items():
+            print(f"  {nombre:<22} {ms:>9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Mide la carga de una página de la cola pendiente a medida que crece asignaciones.
+
+Uso:
+    python benchmarks/bench_pendientes.py [--escalas 10000 100000 1000000] [--sin-indices]
+
+El usuario medido siempre tiene 420 fichas pendientes; el resto de filas son
+historial de otros analistas y asignaciones ya completadas. Cada consulta
+medida es lo que hace analista_page por rerun: COUNT(*) de pendientes y la
+página actual por clave. Con el índice parcial de asignaciones activas
+(migración 12) el tiempo por consulta debe mantenerse plano.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _preparar_entorno():
+    sys.path.insert(0, RAIZ)
+
+
+def _poblar(conn, total, pendientes=420, analistas=50):
+    conn.execute("INSERT INTO usuarios (username, password, salt, nombre, rol, activo) "
+                 "VALUES ('medido', '', '', 'Medido', 'analista', 1)")
+    filas = []
+    for i in range(total):
+        if i < pendientes:
+            filas.append((f"{i:08d}", str(i), 'Partido 1', 'medido', 'analista', '2025-01-01', 0))
+        elif i % 10 == 0:
+            filas.append((f"{i:08d}", str(i), 'Partido 1', 'medido', 'analista', '2025-01-01', 1))
+        else:
+            filas.append((f"{i:08d}", str(i), 'Partido 2', f"analista_{i % analistas}",
+                          'analista', '2025-01-01', 0))
+    conn.executemany('''INSERT INTO asignaciones
+                        (dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion, completado)
+                        VALUES (?, ?, ?, ?, ?, ?, ?)''', filas)
+    conn.commit()
+
+
+def medir(escala, sin_indices=False, repeticiones=20):
+    import app
+
+    # Una base nueva por escala (el pool de conexiones se indexa por ruta)
+    app.ARCHIVO_DB = os.path.join(tempfile.mkdtemp(prefix="jne_bench_"), f"bench_{escala}.db")
+    app.init_db()
+    with sqlite3.connect(app.ARCHIVO_DB) as conn:
+        if sin_indices:
+            conn.execute("DROP INDEX IF EXISTS idx_asignaciones_activas")
+        _poblar(conn, escala)
+    app.get_asignaciones_pendientes('medido', 'analista', 10)
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        pendientes = app.contar_pendientes('medido', 'analista')
+        app.get_asignaciones_pendientes('medido', 'analista', 10, 200)
+    return (time.perf_counter() - inicio) / repeticiones * 1000, pendientes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escalas", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--sin-indices", action="store_true",
+                        help="elimina el índice de pendientes para comparar")
+    args = parser.parse_args()
+
+    _preparar_entorno()
+    print(f"{'asignaciones':>14} {'pendientes':>10} {'ms/consulta':>12}")
+    for escala in args.escalas:
+        ms, pendientes = medir(escala, args.sin_indices)
+        print(f"{escala:>14} {pendientes:>10} {ms:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Generador de datos sintéticos para los benchmarks.
+
+Crea en un directorio de trabajo un fichas.xlsx con N fichas por COD_OP y una
+base SQLite con M analistas y K peritos, asignaciones pendientes sobre la mitad
+del catálogo e historial completado (asignaciones, analistas y peritos).
+
+Uso:
+    python benchmarks/datos_sinteticos.py DESTINO [--fichas-por-partido 1000]
+        [--partidos 2] [--analistas 10] [--peritos 3] [--historial 100000]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from openpyxl import Workbook
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CLAVE_USUARIOS = "bench"
+
+
+def _dni(n):
+    return f"{n % 100_000_000:08d}"
+
+
+def generar_fichas_xlsx(ruta, fichas_por_partido, partidos):
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("fichas")
+    ws.append(['item', 'NUM_FIC', 'COD_OP', 'COD_DNI'])
+    item = 0
+    for cod_op in range(1, partidos + 1):
+        for n in range(fichas_por_partido):
+            item += 1
+            ws.append([item, cod_op * 10_000_000 + n, str(cod_op), _dni(item * 7919)])
+    wb.save(ruta)
+    return item
+
+
+def _crear_usuarios(app, conn, analistas, peritos):
+    filas = []
+    for rol, cantidad in (('analista', analistas), ('perito', peritos)):
+        for n in range(1, cantidad + 1):
+            hashed, salt = app.hash_password(CLAVE_USUARIOS)
+            filas.append((f"{rol}_{n}", hashed, salt, f"{rol.capitalize()} {n}", rol, 1))
+    conn.executemany("INSERT OR IGNORE INTO usuarios (username, password, salt, nombre, rol, activo) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", filas)
+
+
+def _poblar_historial(conn, analistas, peritos, historial, lote=50_000):
+    fecha, timestamp = '2025-01-15', '2025-01-15 10:00:00'
+    for inicio in range(0, historial, lote):
+        rango = range(inicio, min(historial, inicio + lote))
+        conn.executemany('''INSERT INTO asignaciones
+                            (dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion,
+                             completado, estado)
+                            VALUES (?, ?, 'Partido 1', ?, 'analista', ?, 1, 'completado')''',
+                         ((_dni(i), f"H{i}", f"analista_{i % analistas + 1}", fecha) for i in rango))
+        conn.executemany('''INSERT INTO analistas
+                            (fecha, usuario, partido, hora_inicio, hora_fin, num_fic, dni,
+                             conforme, para_perito, observaciones, timestamp)
+                            VALUES (?, ?, 'Partido 1', '08:00', '17:00', ?, ?, ?, ?, ?, ?)''',
+                         ((fecha, f"analista_{i % analistas + 1}", f"H{i}", _dni(i), int(i % 10 != 0),
+                           int(i % 10 == 0), 'firma ilegible' if i % 97 == 0 else '', timestamp) for i in rango))
+        conn.executemany('''INSERT INTO peritos
+                            (fecha, usuario, partido, inicio_informes, fin_informes, dni, num_fic,
+                             autentica, falsa, tiempo_min, observaciones, timestamp)
+                            VALUES (?, ?, 'Partido 1', '08:00', '17:00', ?, ?, ?, ?, 40, '', ?)''',
+                         ((fecha, f"perito_{i % peritos + 1}", _dni(i), f"H{i}", int(i % 3 != 0),
+                           int(i % 3 == 0), timestamp) for i in rango if i % 10 == 0))
+        conn.commit()
+
+
+def generar(destino, fichas_por_partido=1000, partidos=2, analistas=10, peritos=3, historial=1000,
+            pendientes_perito=50):
+    """Deja listo DESTINO/fichas.xlsx y DESTINO/jne_bench.db; devuelve la ruta de la base."""
+    os.makedirs(destino, exist_ok=True)
+    ruta_db = os.path.join(destino, "jne_bench.db")
+    os.environ["JNE_DB"] = ruta_db
+    sys.path.insert(0, RAIZ)
+    import app
+
+    app.ARCHIVO_DB = ruta_db
+    ruta_fichas = os.path.join(destino, app.ARCHIVO_FICHAS)
+    generar_fichas_xlsx(ruta_fichas, fichas_por_partido, partidos)
+
+    app.init_db()
+    app.create_admin_user()
+    with app.db_escritura() as conn:
+        _crear_usuarios(app, conn, analistas, peritos)
+    app.ingestar_fichas(ruta_fichas)
+
+    # Mitad del catálogo pendiente en las colas de analistas; la otra mitad
+    # queda libre para el formulario de asignación
+    nombres = [f"analista_{n}" for n in range(1, analistas + 1)]
+    for cod in range(1, partidos + 1):
+        app.asignar_fichas(str(cod), fichas_por_partido // 2, nombres)
+
+    conn = sqlite3.connect(ruta_db)
+    try:
+        _poblar_historial(conn, analistas, peritos, historial)
+        conn.executemany('''INSERT INTO asignaciones
+                            (dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion, completado)
+                            VALUES (?, ?, 'Partido 1', ?, 'perito', '2025-01-15', 0)''',
+                         ((_dni(i), f"P{i}", f"perito_{i % peritos + 1}") for i in range(pendientes_perito * peritos)))
+        conn.commit()
+    finally:
+        conn.close()
+    return ruta_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("destino")
+    parser.add_argument("--fichas-por-partido", type=int, default=1000)
+    parser.add_argument("--partidos", type=int, default=2)
+    parser.add_argument("--analistas", type=int, default=10)
+    parser.add_argument("--peritos", type=int, default=3)
+    parser.add_argument("--historial", type=int, default=1000)
+    args = parser.parse_args()
+    print(generar(args.destino, args.fichas_por_partido, args.partidos, args.analistas,
+                  args.peritos, args.historial))
+
+
+if __name__ == "__main__":
+    main()
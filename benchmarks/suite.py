@@ -0,0 +1,204 @@
+"""Suite de benchmarks de los caminos críticos de app.py.
+
+Genera datos sintéticos por escala (ver datos_sinteticos.py), ejecuta la app
+sin navegador con streamlit.testing.v1.AppTest y mide:
+
+- la sincronización del catálogo de fichas (ingesta sin cambios y acierto de caché)
+- la detección completa de DNI repetidos (actualizar_sospechosos)
+- el formulario de asignación del panel de administración
+- la cola pendiente paginada (get_asignaciones_pendientes)
+- un cambio de página en el formulario de analista
+- los guardados de analista y perito
+- el reclamo de una página de la bolsa compartida (reclamar_fichas)
+- reportes_page (primera visita y acierto de la caché del tablero)
+- el explorador de resultados con búsqueda de texto (FTS5 sobre observaciones)
+- exportar_reporte_excel
+- el mantenimiento (archivo del historial y compactación) y la cola pendiente después
+
+Uso:
+    python benchmarks/suite.py [--escalas 1000 100000 1000000] [--salida resultados.json]
+        [--baseline baseline.json] [--tolerancia 0.25] [--umbral-ms 5]
+
+Con --baseline la suite termina con código 1 si alguna métrica empeora más de
+la tolerancia relativa (y más de --umbral-ms en absoluto) respecto a la base.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Sin mantenimiento programado de fondo durante las mediciones
+os.environ.setdefault("JNE_INTERVALO_MANTENIMIENTO_H", "0")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import datos_sinteticos  # noqa: E402
+
+
+def _ms(fn, repeticiones=1):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        fn()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return round(statistics.median(tiempos), 3)
+
+
+def _sesion(app, username):
+    with app.db_lectura() as conn:
+        fila = conn.execute("SELECT id, username, nombre, rol FROM usuarios WHERE username = ?",
+                            (username,)).fetchone()
+    return dict(zip(('id', 'username', 'nombre', 'rol'), fila))
+
+
+def _app_test(usuario, pagina=None):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=3600)
+    at.session_state['user'] = usuario
+    at.run()
+    if pagina:
+        at.sidebar.selectbox[0].select(pagina).run()
+    return at
+
+
+def _boton(at, etiqueta):
+    return next(b for b in at.button if b.label == etiqueta)
+
+
+def _marcar_todas(at, columna):
+    # Las páginas de analista y perito usan un st.data_editor por página; su
+    # estado se inyecta como lo enviaría el navegador
+    editor = next(e for e in at.main if type(e).__name__ == 'Dataframe')
+    clave = re.search(r'(verificacion|informe)_\d+', editor.proto.id).group(0)
+    at.session_state[clave] = {"edited_rows": {i: {columna: True} for i in range(len(editor.value))},
+                               "added_rows": [], "deleted_rows": []}
+
+
+def _verificar(at, metrica):
+    if at.exception:
+        raise RuntimeError(f"{metrica}: {at.exception[0].message}")
+
+
+def medir_escala(escala, max_fichas_por_partido, analistas, peritos):
+    destino = tempfile.mkdtemp(prefix=f"jne_suite_{escala}_")
+    anterior = os.getcwd()
+    os.chdir(destino)
+    try:
+        inicio = time.perf_counter()
+        datos_sinteticos.generar(destino, min(escala, max_fichas_por_partido), 2, analistas, peritos, escala)
+        preparacion = time.perf_counter() - inicio
+        import app
+
+        r = {}
+        r['ingesta_fichas_sin_cambios'] = _ms(app.ingestar_fichas)
+        app._sincronizar_fichas_db.clear()
+        app.sincronizar_fichas_db()
+        r['sincronizar_fichas_caliente'] = _ms(app.sincronizar_fichas_db, 20)
+        r['deteccion_duplicados'] = _ms(app.actualizar_sospechosos)
+
+        r['cola_pendiente_pagina'] = _ms(
+            lambda: (app.contar_pendientes('analista_1', 'analista'),
+                     app.get_asignaciones_pendientes('analista_1', 'analista', 10)), 20)
+
+        admin = _sesion(app, 'admin')
+        at = _app_test(admin, "Panel de Administración")
+        _verificar(at, 'admin_page')
+        at.multiselect[0].select('analista_1').select('analista_2')
+        r['admin_asignacion'] = _ms(lambda: _boton(at, 'Asignar').click().run())
+        _verificar(at, 'admin_asignacion')
+
+        at = _app_test(_sesion(app, 'analista_1'), "Formulario de Analista")
+        r['analista_paginacion'] = _ms(lambda: _boton(at, 'Siguiente ▶').click().run())
+        _verificar(at, 'analista_paginacion')
+        _marcar_todas(at, 'conforme')
+        r['analista_guardado'] = _ms(lambda: _boton(at, 'Guardar Verificaciones').click().run())
+        _verificar(at, 'analista_guardado')
+
+        at = _app_test(_sesion(app, 'perito_1'), "Formulario de Perito")
+        _marcar_todas(at, 'autentica')
+        r['perito_guardado'] = _ms(lambda: _boton(at, 'Guardar Informes').click().run())
+        _verificar(at, 'perito_guardado')
+
+        # Modo pull: cada reclamo es de otro analista (retienen una página cada uno)
+        app.asignar_fichas('1', 50, [], 'bolsa')
+        reclamantes = iter(f"analista_{n}" for n in range(3, 8))
+        r['bolsa_reclamo'] = _ms(lambda: app.reclamar_fichas(next(reclamantes), '1'), 5)
+
+        at = _app_test(admin)
+        r['reportes_page'] = _ms(lambda: at.sidebar.selectbox[0].select("Ver Reportes").run())
+        _verificar(at, 'reportes_page')
+        r['reportes_page_cache'] = _ms(at.run, 5)
+        _verificar(at, 'reportes_page_cache')
+
+        r['explorador_texto'] = _ms(
+            lambda: (app.explorar_resultados('analistas', {'texto': 'firma ilegible'}),
+                     app.contar_resultados('analistas', {'texto': 'firma ilegible'})), 20)
+        r['exportar_reporte_excel'] = _ms(app.exportar_reporte_excel)
+        # El historial sintético es de un solo día antiguo: se archiva completo
+        r['mantenimiento'] = _ms(app.ejecutar_mantenimiento)
+        r['cola_pendiente_archivada'] = _ms(
+            lambda: (app.contar_pendientes('analista_1', 'analista'),
+                     app.get_asignaciones_pendientes('analista_1', 'analista', 10)), 20)
+        return {'escala': escala, 'preparacion_s': round(preparacion, 2), 'metricas_ms': r}
+    finally:
+        os.chdir(anterior)
+        shutil.rmtree(destino, ignore_errors=True)
+
+
+def comparar(resultados, baseline, tolerancia, umbral_ms):
+    base = {res['escala']: res['metricas_ms'] for res in baseline['resultados']}
+    regresiones = []
+    for res in resultados:
+        for metrica, valor in res['metricas_ms'].items():
+            previo = base.get(res['escala'], {}).get(metrica)
+            if previo is None:
+                continue
+            if valor > previo * (1 + tolerancia) and valor - previo > umbral_ms:
+                regresiones.append({'escala': res['escala'], 'metrica': metrica,
+                                    'baseline_ms': previo, 'actual_ms': valor})
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--escalas", type=int, nargs="+", default=[1000],
+                        help="filas de historial por escala (p. ej. 1000 100000 1000000)")
+    parser.add_argument("--max-fichas-por-partido", type=int, default=20000,
+                        help="límite de filas del fichas.xlsx generado en escalas grandes")
+    parser.add_argument("--analistas", type=int, default=10)
+    parser.add_argument("--peritos", type=int, default=3)
+    parser.add_argument("--salida", help="archivo JSON de resultados (por defecto, stdout)")
+    parser.add_argument("--baseline", help="JSON de una ejecución anterior con el que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25)
+    parser.add_argument("--umbral-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    salida = {
+        'entorno': {'python': platform.python_version(), 'plataforma': platform.platform()},
+        'resultados': [medir_escala(escala, args.max_fichas_por_partido, args.analistas, args.peritos)
+                       for escala in args.escalas],
+    }
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            salida['regresiones'] = comparar(salida['resultados'], json.load(f),
+                                             args.tolerancia, args.umbral_ms)
+
+    texto = json.dumps(salida, indent=2, ensure_ascii=False)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+    if salida.get('regresiones'):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
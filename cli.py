@@ -0,0 +1,338 @@
+"""Línea de comandos del sistema de verificación, sin interfaz Streamlit.
+
+Usa la misma capa de datos que app.py (pool de conexiones, migraciones,
+guardados con UPSERT). Cada subcomando corre en una sola transacción, con
+escrituras por lotes y avance en stderr.
+
+Uso:
+    python -m cli fichas [--archivo fichas.xlsx]
+    python -m cli asignar --partido 1 --cantidad 420 --analistas ana1 ana2 [--modo por_carga]
+    python -m cli asignar --partido 1 --cantidad 5000 --modo bolsa
+    python -m cli importar {analistas,peritos} resultados.csv [--omitir-invalidas]
+    python -m cli exportar salida.zip [--formato csv] [--desde 2025-01-01] [--hasta ...]
+        [--partido ...] [--usuario ...]
+    python -m cli --particiones particiones/ particionar
+    python -m cli mantenimiento [--dias 14]
+    python -m cli mantenimiento --reconstruir-resumenes
+
+Con --particiones (o JNE_DIR_PARTICIONES) las asignaciones y resultados de
+cada partido van en su propio archivo; `particionar` mueve a esos archivos
+los registros de una base de archivo único.
+
+Con `--modo bolsa` las fichas se publican sin destinatario y cada analista
+reclama su siguiente página desde el formulario (el reclamo vence si la
+página no se vuelve a abrir en JNE_MINUTOS_RECLAMO minutos).
+
+`mantenimiento` archiva los días cerrados en las tablas *_historico y
+compacta los archivos (ANALYZE y, si hace falta, VACUUM); también borra los
+resultados de trabajos con más de JNE_DIAS_RESULTADOS_TRABAJO días. Pensado
+para cron. Con --reconstruir-resumenes, en cambio, recalcula resumen_analistas
+y resumen_peritos desde los registros (calientes e históricos) e informa las
+filas que estaban desalineadas.
+
+Columnas de los CSV de importación (encabezado obligatorio, UTF-8):
+    analistas: usuario, num_fic, dni, conforme, para_perito
+               [, observaciones, hora_inicio, hora_fin]
+    peritos:   usuario, num_fic, dni, autentica, falsa
+               [, tiempo_min, observaciones, inicio_informes, fin_informes]
+
+Cada fila debe corresponder a una asignación del usuario; las filas sin
+asignación o inválidas abortan la importación completa salvo con
+--omitir-invalidas, que las descarta y las informa.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+from streamlit import logger as st_logger
+
+st_logger.set_log_level("error")
+
+import app  # noqa: E402
+
+VERDADEROS = {'1', 'si', 'sí', 's', 'true', 'x', 'verdadero'}
+FALSOS = {'', '0', 'no', 'n', 'false', 'falso'}
+COLUMNAS_IMPORTACION = {
+    'analistas': (['usuario', 'num_fic', 'dni', 'conforme', 'para_perito'],
+                  ['observaciones', 'hora_inicio', 'hora_fin']),
+    'peritos': (['usuario', 'num_fic', 'dni', 'autentica', 'falsa'],
+                ['tiempo_min', 'observaciones', 'inicio_informes', 'fin_informes']),
+}
+MAX_ERRORES_MOSTRADOS = 20
+
+
+def _avance(mensaje):
+    print(mensaje, file=sys.stderr, flush=True)
+
+
+def _booleano(valor):
+    texto = (valor or '').strip().lower()
+    if texto in VERDADEROS:
+        return True
+    if texto in FALSOS:
+        return False
+    raise ValueError(f"valor booleano no reconocido: {valor!r}")
+
+
+# --- FICHAS ---
+def cmd_fichas(args):
+    inicio = time.perf_counter()
+    with app.db_escritura():
+        resumen = app.ingestar_fichas(args.archivo, lote=args.lote, progreso=lambda r: _avance(
+            f"  {r['nuevas'] + r['actualizadas'] + r['sin_cambios']} filas leídas (nuevas {r['nuevas']}, actualizadas {r['actualizadas']})"))
+    # Tras confirmar la carga, para que los escritores de partición vean las fichas nuevas
+    derivadas = app.derivar_sospechosas()
+    print(f"Nuevas: {resumen['nuevas']} | Actualizadas: {resumen['actualizadas']} | "
+          f"Sin cambios: {resumen['sin_cambios']} | Eliminadas: {resumen['eliminadas']} | Sospechosas derivadas a peritos: {derivadas} "
+          f"({time.perf_counter() - inicio:.1f} s)")
+    return 0
+
+
+# --- ASIGNACIÓN ---
+def cmd_asignar(args):
+    partidos = app.partidos()
+    if args.partido not in partidos:
+        raise ValueError(f"Partido desconocido: {args.partido}. Opciones: {', '.join(partidos)}")
+    with app.db_lectura() as conn:
+        activos = {row[0] for row in conn.execute(
+            "SELECT username FROM usuarios WHERE rol = 'analista' AND activo = 1")}
+    desconocidos = [analista for analista in args.analistas if analista not in activos]
+    if desconocidos:
+        raise ValueError(f"No son analistas activos: {', '.join(desconocidos)}")
+    resumen = app.asignar_fichas(args.partido, args.cantidad, args.analistas, args.modo)
+    for analista, n in resumen.items():
+        print(f"{analista or 'bolsa'}\t{n}")
+    print(f"{sum(resumen.values())} fichas asignadas en {partidos[args.partido]}")
+    return 0
+
+
+# --- IMPORTACIÓN DE RESULTADOS ---
+def _leer_csv(ruta, tipo):
+    obligatorias, opcionales = COLUMNAS_IMPORTACION[tipo]
+    with open(ruta, newline='', encoding='utf-8-sig') as f:
+        lector = csv.DictReader(f)
+        faltantes = [col for col in obligatorias if col not in (lector.fieldnames or [])]
+        if faltantes:
+            raise ValueError(f"Faltan columnas en {ruta}: {', '.join(faltantes)}")
+        for linea, fila in enumerate(lector, start=2):
+            registro = {col: (fila.get(col) or '').strip() for col in obligatorias + opcionales}
+            registro['linea'] = linea
+            yield registro
+
+
+def _lotes(filas, tamano):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _resolver_asignaciones(conn, tipo, filas):
+    # Una consulta por lote: la asignación (pendiente primero) de cada
+    # (usuario, num_fic, dni), buscada por idx_asignaciones_ficha. El "+" impide
+    # que el planificador busque por usuario, lo que recorrería todas las
+    # asignaciones del usuario por cada clave.
+    valores = ', '.join('(?, ?, ?, ?)' for _ in filas)
+    parametros = [valor for i, fila in enumerate(filas) for valor in (i, fila['usuario'], fila['num_fic'], fila['dni'])]
+    encontradas = conn.execute(f'''WITH claves (n, usuario, num_fic, dni) AS (VALUES {valores})
+                                   SELECT c.n, a.id, a.partido FROM claves c
+                                   JOIN asignaciones a ON a.id = (
+                                       SELECT x.id FROM asignaciones x
+                                       WHERE x.dni = c.dni AND x.num_fic = c.num_fic
+                                         AND x.tipo_asignacion = ? AND +x.asignado_a = c.usuario
+                                       ORDER BY x.completado, x.id LIMIT 1)''',
+                               (*parametros, tipo)).fetchall()
+    return {n: (id_asignacion, partido) for n, id_asignacion, partido in encontradas}
+
+
+def _preparar_lote(conn, tipo, filas):
+    tipo_asignacion = 'analista' if tipo == 'analistas' else 'perito'
+    asignaciones = _resolver_asignaciones(conn, tipo_asignacion, filas)
+    validas, errores = [], []
+    for i, fila in enumerate(filas):
+        if i not in asignaciones:
+            errores.append(f"Línea {fila['linea']}: {fila['usuario']} no tiene asignada la ficha "
+                           f"{fila['num_fic']} (DNI {fila['dni']})")
+            continue
+        fila['id'], fila['partido'] = asignaciones[i]
+        try:
+            if tipo == 'analistas':
+                fila['conforme'] = _booleano(fila['conforme'])
+                fila['para_perito'] = _booleano(fila['para_perito'])
+            else:
+                fila['autentica'] = _booleano(fila['autentica'])
+                fila['falsa'] = _booleano(fila['falsa'])
+                fila['tiempo_min'] = int(fila['tiempo_min'] or 0)
+        except ValueError as e:
+            errores.append(f"Línea {fila['linea']}: {e}")
+            continue
+        validar = app.validar_verificaciones if tipo == 'analistas' else app.validar_informes
+        mensajes = validar([fila])
+        if mensajes:
+            errores.extend(f"Línea {fila['linea']}: {mensaje}" for mensaje in mensajes)
+            continue
+        validas.append(fila)
+    return validas, errores
+
+
+def _guardar_lote(tipo, filas):
+    # Los guardados de la app reciben una jornada por llamada: se agrupa por
+    # usuario y horario (y partido, en el caso de analistas)
+    grupos = {}
+    for fila in filas:
+        if tipo == 'analistas':
+            clave = (fila['usuario'], fila['partido'], fila['hora_inicio'], fila['hora_fin'])
+        else:
+            clave = (fila['usuario'], fila['inicio_informes'], fila['fin_informes'])
+        grupos.setdefault(clave, []).append(fila)
+    estados = []
+    for clave, grupo in grupos.items():
+        guardar = app.guardar_verificaciones if tipo == 'analistas' else app.guardar_informes
+        estados.extend(guardar(*clave, grupo))
+    return estados
+
+
+def cmd_importar(args):
+    inicio = time.perf_counter()
+    totales = {'nuevo': 0, 'actualizado': 0, 'omitidas': 0}
+    errores = []
+    # Con particiones, la transacción abarca el archivo de cada partido
+    with app.db_escritura_global() as conn:
+        for lote in _lotes(_leer_csv(args.archivo, args.tipo), args.lote):
+            validas, errores_lote = _preparar_lote(conn, args.tipo, lote)
+            errores.extend(errores_lote)
+            if errores and not args.omitir_invalidas:
+                # Se sigue validando para informar todas las filas, sin escribir
+                continue
+            totales['omitidas'] += len(errores_lote)
+            for estado in _guardar_lote(args.tipo, validas):
+                totales[estado['estado']] += 1
+            _avance(f"  {totales['nuevo'] + totales['actualizado']} filas importadas")
+        if errores and not args.omitir_invalidas:
+            # Todo o nada: la excepción revierte la transacción completa
+            for mensaje in errores[:MAX_ERRORES_MOSTRADOS]:
+                _avance(mensaje)
+            raise ValueError(f"Importación cancelada: {len(errores)} filas inválidas "
+                             "(usa --omitir-invalidas para descartarlas)")
+    for mensaje in errores[:MAX_ERRORES_MOSTRADOS]:
+        _avance(mensaje)
+    print(f"Nuevos: {totales['nuevo']} | Actualizados: {totales['actualizado']} | "
+          f"Omitidos: {totales['omitidas']} ({time.perf_counter() - inicio:.1f} s)")
+    return 0
+
+
+# --- EXPORTACIÓN ---
+def cmd_exportar(args):
+    inicio = time.perf_counter()
+    filtros = {clave: valor for clave, valor in (('fecha_desde', args.desde), ('fecha_hasta', args.hasta),
+                                                 ('partido', args.partido), ('usuario', args.usuario)) if valor}
+    temporal = f"{args.salida}.tmp"
+    # Una transacción de lectura para que ambas tablas salgan de la misma instantánea
+    try:
+        with app.db_lectura() as conn, open(temporal, 'wb') as destino:
+            conn.execute("BEGIN")
+            app.EXPORTADORES[args.formato](conn, filtros, destino)
+        os.replace(temporal, args.salida)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    print(f"{args.salida} ({os.path.getsize(args.salida)} bytes, {time.perf_counter() - inicio:.1f} s)")
+    return 0
+
+
+# --- PARTICIONES ---
+def cmd_particionar(args):
+    inicio = time.perf_counter()
+    movidas = app.particionar_base()
+    for tabla, n in movidas.items():
+        print(f"{tabla}\t{n}")
+    archivos = len(app.registro_particiones().archivos)
+    print(f"{sum(movidas.values())} registros movidos a {archivos} archivos en {app.DIR_PARTICIONES} "
+          f"({time.perf_counter() - inicio:.1f} s)")
+    return 0
+
+
+# --- MANTENIMIENTO ---
+def cmd_mantenimiento(args):
+    inicio = time.perf_counter()
+    if args.reconstruir_resumenes:
+        diferencias = app.reconstruir_resumenes()
+        for tabla, n in diferencias.items():
+            print(f"{tabla}\t{n}")
+        print(f"Resúmenes reconstruidos: {sum(diferencias.values())} filas inconsistentes corregidas "
+              f"({time.perf_counter() - inicio:.1f} s)")
+        return 0
+    resultado = app.ejecutar_mantenimiento(args.dias, lambda fraccion, mensaje: _avance(f"  {mensaje}"))
+    for tabla, n in resultado['movidas'].items():
+        print(f"{tabla}\t{n}")
+    print(f"{sum(resultado['movidas'].values())} registros anteriores a {resultado['corte']} archivados; "
+          f"{resultado['compactados']} archivos compactados; {resultado['resultados']} resultados de trabajos "
+          f"eliminados ({time.perf_counter() - inicio:.1f} s)")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m cli", description=__doc__.splitlines()[0])
+    parser.add_argument("--db", help="Base de datos (por defecto JNE_DB o jne_verification.db)")
+    parser.add_argument("--particiones", help="Directorio de archivos por partido (por defecto JNE_DIR_PARTICIONES)")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("fichas", help="Cargar o refrescar el catálogo desde fichas.xlsx")
+    p.add_argument("--archivo", default=app.ARCHIVO_FICHAS)
+    p.add_argument("--lote", type=int, default=5000)
+    p.set_defaults(funcion=cmd_fichas)
+
+    p = sub.add_parser("asignar", help="Asignación masiva de fichas a analistas")
+    p.add_argument("--partido", required=True, help="Código de partido (COD_OP)")
+    p.add_argument("--cantidad", type=int, required=True)
+    p.add_argument("--analistas", nargs="+", default=[], help="obligatorio salvo con --modo bolsa")
+    p.add_argument("--modo", choices=list(app.MODOS_REPARTO), default='equitativo')
+    p.set_defaults(funcion=cmd_asignar)
+
+    p = sub.add_parser("importar", help="Importar resultados desde CSV de estaciones sin conexión")
+    p.add_argument("tipo", choices=list(COLUMNAS_IMPORTACION))
+    p.add_argument("archivo")
+    p.add_argument("--lote", type=int, default=2000)
+    p.add_argument("--omitir-invalidas", action="store_true")
+    p.set_defaults(funcion=cmd_importar)
+
+    p = sub.add_parser("exportar", help="Exportar reportes a archivo")
+    p.add_argument("salida")
+    p.add_argument("--formato", choices=list(app.FORMATOS_EXPORTACION), default='xlsx')
+    p.add_argument("--desde")
+    p.add_argument("--hasta")
+    p.add_argument("--partido")
+    p.add_argument("--usuario")
+    p.set_defaults(funcion=cmd_exportar)
+
+    p = sub.add_parser("particionar", help="Repartir una base de archivo único en archivos por partido")
+    p.set_defaults(funcion=cmd_particionar)
+
+    p = sub.add_parser("mantenimiento", help="Archivar días cerrados y compactar la base")
+    p.add_argument("--dias", type=int, default=app.DIAS_RETENCION,
+                   help="días que permanecen en las tablas calientes")
+    p.add_argument("--reconstruir-resumenes", action="store_true",
+                   help="sólo recalcular los resúmenes de progreso desde los registros")
+    p.set_defaults(funcion=cmd_mantenimiento)
+
+    args = parser.parse_args(argv)
+    if args.db:
+        app.ARCHIVO_DB = args.db
+    if args.particiones:
+        app.DIR_PARTICIONES = args.particiones
+    try:
+        app.inicializar_sistema(exigir_particionada=args.comando != "particionar")
+        return args.funcion(args)
+    except (ValueError, RuntimeError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
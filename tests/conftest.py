@@ -0,0 +1,49 @@
+"""Base temporal por prueba: cada una con su archivo y sin cachés de otra."""
+import os
+import sys
+
+import pytest
+import streamlit as st
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app, "ARCHIVO_DB", str(tmp_path / "jne.db"))
+    monkeypatch.setattr(app, "DIR_PARTICIONES", "")
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    yield tmp_path
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+
+@pytest.fixture
+def poblada(base):
+    # Una analista, un perito y cuatro fichas en cada uno de los partidos 1 y 2
+    app.init_db()
+    with app.db_escritura() as conn:
+        conn.executemany("INSERT INTO usuarios (username, password, salt, nombre, rol, activo) "
+                         "VALUES (?, '', '', ?, ?, 1)", [('an1', 'an1', 'analista'), ('pe1', 'pe1', 'perito')])
+        conn.executemany("INSERT INTO fichas (num_fic, cod_dni, cod_op, item, row_hash, actualizado) "
+                         "VALUES (?, ?, ?, ?, '', '')",
+                         [(str(n), f"{n:08d}", cod, str(n)) for cod in ('1', '2')
+                          for n in range(int(cod) * 100, int(cod) * 100 + 4)])
+    app.registrar_partidos(['1', '2'])
+    return base
+
+
+def contar(tabla):
+    with app.db_lectura() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+
+
+def totales_resumen():
+    with app.db_lectura() as conn:
+        return (conn.execute("SELECT SUM(fichas), SUM(conformes), SUM(derivados) FROM resumen_analistas").fetchone()
+                + conn.execute("SELECT SUM(informes), SUM(autenticas), SUM(falsas), SUM(tiempo_min) "
+                               "FROM resumen_peritos").fetchone())
@@ -0,0 +1,54 @@
+"""Bolsa compartida: reclamos atómicos entre analistas y devolución de los vencidos."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import contar
+
+import app
+
+ANALISTAS = [f"an{n}" for n in range(1, 7)]
+
+
+def _publicar_bolsa():
+    with app.db_escritura() as conn:
+        conn.executemany("INSERT OR IGNORE INTO usuarios (username, password, salt, nombre, rol, activo) "
+                         "VALUES (?, '', '', ?, 'analista', 1)", [(u, u) for u in ANALISTAS])
+    assert app.asignar_fichas('1', 4, [], 'bolsa') == {None: 4}
+
+
+def test_reclamos_concurrentes_no_se_repiten(poblada):
+    _publicar_bolsa()
+    salida = threading.Barrier(len(ANALISTAS))
+
+    def reclamar(usuario):
+        salida.wait()
+        return [ficha['id'] for ficha in app.reclamar_fichas(usuario, '1', 2)]
+
+    with ThreadPoolExecutor(len(ANALISTAS)) as hilos:
+        reclamadas = list(hilos.map(reclamar, ANALISTAS))
+
+    ids = [ficha_id for fichas in reclamadas for ficha_id in fichas]
+    assert len(ids) == len(set(ids)) == 4
+    assert contar("asignaciones WHERE asignado_a IS NULL") == 0
+    with app.db_lectura() as conn:
+        duenos = dict(conn.execute("SELECT id, asignado_a FROM asignaciones"))
+    assert all(duenos[ficha_id] == usuario for usuario, fichas in zip(ANALISTAS, reclamadas) for ficha_id in fichas)
+
+
+def test_reclamo_vencido_vuelve_a_la_bolsa(poblada):
+    _publicar_bolsa()
+    primeras = app.reclamar_fichas('an1', '1', 2)
+    # Mientras no vence, las dos fichas retenidas no están disponibles y an1 no reclama más
+    assert app.reclamar_fichas('an1', '1', 2) == []
+    with app.db_lectura() as conn:
+        assert app.fichas_en_bolsa(conn) == {'Partido 1': 2}
+
+    with app.db_escritura() as conn:
+        conn.execute("UPDATE asignaciones SET vence_reclamo = '2000-01-01 00:00:00' WHERE asignado_a = 'an1'")
+        assert app.fichas_en_bolsa(conn) == {'Partido 1': 4}
+
+    reclamadas = app.reclamar_fichas('an2', '1', 4)
+
+    assert len(reclamadas) == 4
+    assert {ficha['id'] for ficha in primeras} <= {ficha['id'] for ficha in reclamadas}
+    assert contar("asignaciones WHERE asignado_a = 'an1'") == 0
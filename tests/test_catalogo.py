@@ -0,0 +1,33 @@
+"""Sincronización del catálogo: una ingesta por contenido de fichas.xlsx."""
+import os
+
+from conftest import contar
+from openpyxl import Workbook
+
+import app
+
+
+def _escribir_workbook(filas):
+    wb = Workbook()
+    wb.active.append(app.COLUMNAS_FICHAS)
+    for fila in filas:
+        wb.active.append(fila)
+    wb.save(app.ARCHIVO_FICHAS)
+
+
+def test_reescritura_con_la_misma_fecha_se_sincroniza(base):
+    app.init_db()
+    _escribir_workbook([('1', '100', '1', '00000100'), ('2', '101', '1', '00000101')])
+    assert app.sincronizar_fichas_db()['nuevas'] == 2
+    assert app.sincronizar_fichas_db()['nuevas'] == 2
+    firma = os.stat(app.ARCHIVO_FICHAS)
+
+    # DNI corregido y fecha de modificación restaurada, como al copiar con -p
+    _escribir_workbook([('1', '100', '1', '00000100'), ('2', '101', '1', '00000109')])
+    os.utime(app.ARCHIVO_FICHAS, ns=(firma.st_atime_ns, firma.st_mtime_ns))
+
+    resumen = app.sincronizar_fichas_db()
+
+    assert (resumen['nuevas'], resumen['sin_cambios'], resumen['eliminadas']) == (1, 1, 1)
+    assert contar("fichas WHERE cod_dni = '00000109'") == 1
+    assert contar("fichas") == 2
@@ -0,0 +1,68 @@
+"""cli: importar con UPSERT y todo o nada; reconstrucción de resúmenes desde mantenimiento."""
+import csv
+
+from conftest import contar, totales_resumen
+
+import app
+import cli
+
+
+def _csv(ruta, filas):
+    with open(ruta, 'w', newline='', encoding='utf-8') as f:
+        escritor = csv.writer(f)
+        escritor.writerow(['usuario', 'num_fic', 'dni', 'conforme', 'para_perito', 'observaciones'])
+        escritor.writerows(filas)
+    return str(ruta)
+
+
+def _importar(ruta, *opciones):
+    return cli.main(["--db", app.ARCHIVO_DB, "importar", "analistas", ruta, "--lote", "2", *opciones])
+
+
+def _asignadas():
+    app.asignar_fichas('1', 4, ['an1'])
+    return [('an1', num_fic, dni, 'sí', 'no', '') for num_fic, dni in
+            ((f['num_fic'], f['dni']) for f in app.get_asignaciones_pendientes('an1', 'analista', 4))]
+
+
+def test_importar_actualiza_en_lugar_de_duplicar(poblada, capsys):
+    ruta = _csv(poblada / "resultados.csv", _asignadas())
+
+    assert _importar(ruta) == 0
+    assert "Nuevos: 4 | Actualizados: 0" in capsys.readouterr().out
+    assert _importar(ruta) == 0
+    assert "Nuevos: 0 | Actualizados: 4" in capsys.readouterr().out
+    assert contar("analistas") == 4
+    assert contar("asignaciones WHERE completado = 0") == 0
+
+
+def test_importar_revierte_todo_si_hay_filas_invalidas(poblada, capsys):
+    # El error está en el último lote: los anteriores ya se habían escrito
+    filas = _asignadas() + [('an1', '999', '00000999', 'sí', 'no', '')]
+    ruta = _csv(poblada / "resultados.csv", filas)
+
+    assert _importar(ruta) == 1
+    assert "Importación cancelada: 1 filas inválidas" in capsys.readouterr().err
+    assert contar("analistas") == 0
+    assert contar("asignaciones WHERE completado = 0") == 4
+
+    assert _importar(ruta, "--omitir-invalidas") == 0
+    assert "Nuevos: 4 | Actualizados: 0 | Omitidos: 1" in capsys.readouterr().out
+    assert contar("analistas") == 4
+
+
+def test_mantenimiento_reconstruye_resumenes(poblada, capsys):
+    assert _importar(_csv(poblada / "resultados.csv", _asignadas())) == 0
+    totales = totales_resumen()
+    with app.db_escritura() as conn:
+        conn.execute("UPDATE resumen_analistas SET fichas = fichas + 5")
+    capsys.readouterr()
+
+    assert cli.main(["--db", app.ARCHIVO_DB, "mantenimiento", "--reconstruir-resumenes"]) == 0
+
+    salida = capsys.readouterr().out
+    assert "resumen_peritos\t0" in salida and "resumen_analistas\t0" not in salida
+    assert totales_resumen() == totales
+    assert app.reconstruir_resumenes() == {'resumen_analistas': 0, 'resumen_peritos': 0}
+    # Sólo los resúmenes: no se registra un mantenimiento de archivo
+    assert contar("mantenimientos") == 0
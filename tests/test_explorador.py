@@ -0,0 +1,48 @@
+"""Explorador de resultados: búsqueda FTS en observaciones, filtros y paginación por clave."""
+import app
+
+OBSERVACIONES = ["Firma ilegible en el reverso", "firma correcta", "Sin observación", "Huella y FIRMA dudosas"]
+
+
+def _poblar():
+    app.init_db()
+    with app.db_escritura() as conn:
+        conn.executemany('''INSERT INTO analistas
+                            (fecha, usuario, partido, hora_inicio, hora_fin, num_fic, dni,
+                             conforme, para_perito, observaciones, timestamp)
+                            VALUES ('2025-01-01', 'an1', 'Partido 1', '', '', ?, ?, ?, ?, ?, '')''',
+                         [(str(n), f"{n:08d}", int(n != 3), int(n == 3), texto)
+                          for n, texto in enumerate(OBSERVACIONES)])
+
+
+def _observaciones(filtros, **opciones):
+    pagina = app.explorar_resultados('analistas', filtros, **opciones)
+    columna = pagina['columnas'].index('observaciones')
+    return [fila[columna] for fila in pagina['filas']], pagina['hay_mas']
+
+
+def test_busqueda_de_texto(base):
+    _poblar()
+
+    assert _observaciones({'texto': "firma"}) == ([OBSERVACIONES[3], OBSERVACIONES[1], OBSERVACIONES[0]], False)
+    # Sin distinguir tildes ni mayúsculas, y todas las palabras deben aparecer
+    assert _observaciones({'texto': "OBSERVACION"}) == ([OBSERVACIONES[2]], False)
+    assert _observaciones({'texto': "firma reverso"}) == ([OBSERVACIONES[0]], False)
+    assert app.contar_resultados('analistas', {'texto': "firma", 'marcas': {'para_perito': True}}) == 1
+    # El texto del usuario nunca se interpreta como sintaxis FTS5
+    assert app.contar_resultados('analistas', {'texto': 'firma" OR *'}) == 0
+
+    with app.db_escritura() as conn:
+        conn.execute("UPDATE analistas SET observaciones = 'ilegible' WHERE num_fic = '1'")
+    assert app.contar_resultados('analistas', {'texto': "ilegible"}) == 2
+    assert app.contar_resultados('analistas', {'texto': "correcta"}) == 0
+
+
+def test_paginacion_por_clave(base):
+    _poblar()
+
+    primera = app.explorar_resultados('analistas', {}, limite=3)
+    segunda = app.explorar_resultados('analistas', {}, antes_de=primera['filas'][-1][0], limite=3)
+
+    assert primera['hay_mas'] and not segunda['hay_mas']
+    assert [fila[0] for fila in primera['filas'] + segunda['filas']] == [4, 3, 2, 1]
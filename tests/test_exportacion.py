@@ -0,0 +1,58 @@
+"""Exportación de reportes: filas y formato de cada payload."""
+import csv
+import io
+import zipfile
+
+import pyarrow.parquet as pq
+from openpyxl import load_workbook
+
+import app
+
+
+def _poblar():
+    app.init_db()
+    with app.db_escritura() as conn:
+        conn.executemany('''INSERT INTO analistas
+                            (fecha, usuario, partido, hora_inicio, hora_fin, num_fic, dni,
+                             conforme, para_perito, observaciones, timestamp)
+                            VALUES ('2025-01-01', 'an1', ?, '', '', ?, ?, 1, 0, 'ñandú', '')''',
+                         [(f"Partido {n % 2 + 1}", str(n), f"{n:08d}") for n in range(7)])
+        conn.execute('''INSERT INTO peritos
+                        (fecha, usuario, partido, inicio_informes, fin_informes, dni, num_fic,
+                         autentica, falsa, tiempo_min, observaciones, timestamp)
+                        VALUES ('2025-01-01', 'pe1', 'Partido 1', '', '', '00000001', '1', 1, 0, 5, '', '')''')
+
+
+def test_exportacion_csv(base):
+    _poblar()
+    nombre, datos, mime = app.exportar_reporte('csv')
+    assert nombre.endswith(".zip") and mime == 'application/zip'
+    with zipfile.ZipFile(io.BytesIO(datos)) as zf:
+        assert sorted(zf.namelist()) == ['analistas.csv', 'peritos.csv']
+        filas = list(csv.reader(io.TextIOWrapper(zf.open('analistas.csv'), encoding='utf-8-sig')))
+    assert filas[0][:3] == ['id', 'fecha', 'usuario']
+    assert len(filas) == 1 + 7
+    assert filas[1][filas[0].index('observaciones')] == 'ñandú'
+
+
+def test_exportacion_parquet_con_filtro(base):
+    _poblar()
+    _, datos, _ = app.exportar_reporte('parquet', partido='Partido 1')
+    with zipfile.ZipFile(io.BytesIO(datos)) as zf:
+        analistas = pq.read_table(io.BytesIO(zf.read('analistas.parquet')))
+        peritos = pq.read_table(io.BytesIO(zf.read('peritos.parquet')))
+    assert analistas.num_rows == 4
+    assert set(analistas.column('partido').to_pylist()) == {'Partido 1'}
+    assert str(analistas.schema.field('conforme').type) == 'int64'
+    assert peritos.num_rows == 1
+
+
+def test_exportacion_xlsx(base):
+    _poblar()
+    nombre, datos, _ = app.exportar_reporte('xlsx')
+    assert nombre.endswith(".xlsx")
+    wb = load_workbook(io.BytesIO(datos), read_only=True)
+    assert wb.sheetnames == ['Analistas', 'Peritos']
+    # Hojas write_only: sin dimensiones, se cuentan las filas
+    assert sum(1 for _ in wb['Analistas'].iter_rows()) == 1 + 7
+    assert sum(1 for _ in wb['Peritos'].iter_rows()) == 1 + 1
@@ -0,0 +1,46 @@
+"""Guardados idempotentes: un doble envío actualiza en lugar de duplicar."""
+from conftest import contar, totales_resumen
+
+import app
+
+
+def _verificar_pagina(usuario='an1', por_pagina=4):
+    # Una página por partido: guardar_verificaciones recibe el partido de la página
+    pagina = app.get_asignaciones_pendientes(usuario, 'analista', por_pagina)
+    resultados = [dict(ficha, conforme=n != 1, para_perito=n == 1, observaciones='')
+                  for n, ficha in enumerate(pagina)]
+    return resultados, (lambda: app.guardar_verificaciones(usuario, resultados[0]['partido'],
+                                                           '08:00', '09:00', resultados))
+
+
+def _informar_pagina(usuario='pe1'):
+    resultados = [dict(ficha, autentica=True, falsa=False, tiempo_min=5, observaciones='')
+                  for ficha in app.get_asignaciones_pendientes(usuario, 'perito', 10)]
+    return resultados, (lambda: app.guardar_informes(usuario, '08:00', '09:00', resultados))
+
+
+def test_doble_envio_de_verificaciones(poblada):
+    app.asignar_fichas('1', 4, ['an1'])
+
+    _, guardar = _verificar_pagina()
+    assert [e['estado'] for e in guardar()] == ['nuevo'] * 4
+    totales = totales_resumen()
+    assert [e['estado'] for e in guardar()] == ['actualizado'] * 4
+    assert contar("analistas") == 4
+    # La ficha derivada no se manda dos veces a peritos
+    assert contar("asignaciones WHERE tipo_asignacion = 'perito'") == 1
+    assert totales_resumen() == totales == (4, 3, 1, None, None, None, None)
+
+
+def test_doble_envio_de_informes(poblada):
+    app.asignar_fichas('1', 4, ['an1'])
+    _, guardar = _verificar_pagina()
+    guardar()
+
+    resultados, guardar = _informar_pagina()
+    assert [e['estado'] for e in guardar()] == ['nuevo']
+    totales = totales_resumen()
+    assert [e['estado'] for e in guardar()] == ['actualizado']
+    assert contar("peritos") == len(resultados) == 1
+    assert totales_resumen() == totales == (4, 3, 1, 1, 1, 0, 5)
+    assert app.reconstruir_resumenes() == {'resumen_analistas': 0, 'resumen_peritos': 0}
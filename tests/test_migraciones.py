@@ -0,0 +1,100 @@
+"""Una base con el esquema original se actualiza in situ hasta la última migración."""
+import sqlite3
+
+import app
+
+# Tablas de init_db() antes de las migraciones
+ESQUEMA_ORIGINAL = [
+    '''CREATE TABLE usuarios (
+       id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE, password TEXT,
+       salt TEXT, nombre TEXT, rol TEXT, activo INTEGER)''',
+    '''CREATE TABLE analistas (
+       id INTEGER PRIMARY KEY AUTOINCREMENT, fecha TEXT, usuario TEXT, partido TEXT,
+       hora_inicio TEXT, hora_fin TEXT, num_fic TEXT, dni TEXT, conforme INTEGER,
+       para_perito INTEGER, observaciones TEXT, timestamp TEXT,
+       FOREIGN KEY(usuario) REFERENCES usuarios(username))''',
+    '''CREATE TABLE peritos (
+       id INTEGER PRIMARY KEY AUTOINCREMENT, fecha TEXT, usuario TEXT, partido TEXT,
+       inicio_informes TEXT, fin_informes TEXT, dni TEXT, num_fic TEXT, autentica INTEGER,
+       falsa INTEGER, tiempo_min INTEGER, observaciones TEXT, informe TEXT, timestamp TEXT,
+       FOREIGN KEY(usuario) REFERENCES usuarios(username))''',
+    '''CREATE TABLE asignaciones (
+       id INTEGER PRIMARY KEY AUTOINCREMENT, dni TEXT, num_fic TEXT, partido TEXT,
+       asignado_a TEXT, tipo_asignacion TEXT, fecha_asignacion TEXT, completado INTEGER,
+       FOREIGN KEY(asignado_a) REFERENCES usuarios(username))''',
+]
+
+
+def _base_original(ruta):
+    # Como la dejaba la versión original: las asignaciones de analista nunca
+    # se cerraban y la pericial se cerraba al guardar el informe
+    with sqlite3.connect(ruta) as conn:
+        for sentencia in ESQUEMA_ORIGINAL:
+            conn.execute(sentencia)
+        conn.executemany("INSERT INTO usuarios (username, password, salt, nombre, rol, activo) "
+                         "VALUES (?, '', '', ?, ?, 1)", [('an1', 'an1', 'analista'), ('pe1', 'pe1', 'perito')])
+        conn.executemany('''INSERT INTO asignaciones
+                            (dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion, completado)
+                            VALUES (?, ?, 'Partido 1', ?, ?, '2025-01-01', ?)''',
+                         [('00000001', '1', 'an1', 'analista', 0), ('00000002', '2', 'an1', 'analista', 0),
+                          ('00000003', '3', 'an1', 'analista', 0), ('00000002', '2', 'pe1', 'perito', 1),
+                          # Cerrada al guardar el informe de la ficha 2 (mismo DNI y partido)
+                          ('00000002', '5', 'pe1', 'perito', 1)])
+        conn.executemany('''INSERT INTO analistas
+                            (fecha, usuario, partido, hora_inicio, hora_fin, num_fic, dni,
+                             conforme, para_perito, observaciones, timestamp)
+                            VALUES ('2025-01-01', 'an1', 'Partido 1', '', '', ?, ?, ?, ?, '', '')''',
+                         # La ficha 1 se envió dos veces, como permitía la versión original
+                         [('1', '00000001', 1, 0), ('1', '00000001', 1, 0), ('2', '00000002', 0, 1)])
+        conn.execute('''INSERT INTO peritos
+                        (fecha, usuario, partido, inicio_informes, fin_informes, dni, num_fic,
+                         autentica, falsa, tiempo_min, observaciones, informe, timestamp)
+                        VALUES ('2025-01-01', 'pe1', 'Partido 1', '', '', '00000002', '2', 0, 1, 7, '', '', '')''')
+
+
+def _totales():
+    with sqlite3.connect(app.ARCHIVO_DB) as conn:
+        return (conn.execute("SELECT SUM(fichas), SUM(conformes), SUM(derivados) FROM resumen_analistas").fetchone()
+                + conn.execute("SELECT SUM(informes), SUM(autenticas), SUM(falsas), SUM(tiempo_min) "
+                               "FROM resumen_peritos").fetchone())
+
+
+def _contar(tabla):
+    with sqlite3.connect(app.ARCHIVO_DB) as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+
+
+def _estados():
+    with sqlite3.connect(app.ARCHIVO_DB) as conn:
+        return dict(conn.execute("SELECT num_fic || '/' || tipo_asignacion, estado FROM asignaciones"))
+
+
+def test_migracion_desde_esquema_original(base):
+    _base_original(app.ARCHIVO_DB)
+
+    assert app.init_db() == [version for version, _, _ in app.MIGRACIONES]
+    assert app.init_db() == []
+    assert (_contar("analistas"), _contar("peritos"), _contar("asignaciones")) == (2, 1, 5)
+    # Los resúmenes se rellenan con las filas que ya existían
+    assert _totales() == (2, 1, 1, 1, 0, 1, 7)
+    assert app.reconstruir_resumenes() == {'resumen_analistas': 0, 'resumen_peritos': 0}
+    # Las de analista se cierran según su resultado; la pericial sin informe vuelve a la cola
+    assert _estados() == {'1/analista': 'completado', '2/analista': 'derivado', '3/analista': 'pendiente',
+                          '2/perito': 'completado', '5/perito': 'pendiente'}
+    with sqlite3.connect(app.ARCHIVO_DB) as conn:
+        indices = {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {'idx_asignaciones_ficha', 'idx_analistas_usuario_fecha'} <= indices
+
+def test_pericial_archivada_sin_informe_vuelve_a_la_cola(base):
+    app.init_db()
+    with sqlite3.connect(app.ARCHIVO_DB) as conn:
+        conn.execute('''INSERT INTO asignaciones_historico
+                        (id, dni, num_fic, partido, asignado_a, tipo_asignacion, fecha_asignacion, completado, estado)
+                        VALUES (7, '00000002', '5', 'Partido 1', 'pe1', 'perito', '2025-01-01', 1, 'completado')''')
+        conn.execute("DELETE FROM schema_version WHERE version = 16")
+
+    assert app.init_db() == [16]
+
+    assert _contar("asignaciones_historico") == 0
+    with sqlite3.connect(app.ARCHIVO_DB) as conn:
+        assert conn.execute("SELECT id, estado, completado FROM asignaciones").fetchall() == [(7, 'pendiente', 0)]
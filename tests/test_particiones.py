@@ -0,0 +1,69 @@
+"""particionar_base: una base de archivo único pasa a un archivo por partido sin perder filas."""
+import os
+
+import streamlit as st
+from conftest import contar, totales_resumen
+
+import app
+
+TABLAS = ('asignaciones', 'analistas', 'peritos')
+SIN_DIFERENCIAS = {'resumen_analistas': 0, 'resumen_peritos': 0}
+
+
+def _guardar_todo():
+    for cod in ('1', '2'):
+        app.asignar_fichas(cod, 4, ['an1'])
+    for _ in range(2):
+        pagina = app.get_asignaciones_pendientes('an1', 'analista', 4)
+        app.guardar_verificaciones('an1', pagina[0]['partido'], '08:00', '09:00',
+                                   [dict(ficha, conforme=n != 1, para_perito=n == 1, observaciones='')
+                                    for n, ficha in enumerate(pagina)])
+    app.guardar_informes('pe1', '08:00', '09:00',
+                         [dict(ficha, autentica=True, falsa=False, tiempo_min=5, observaciones='')
+                          for ficha in app.get_asignaciones_pendientes('pe1', 'perito', 10)])
+
+
+def _particionar(base, monkeypatch):
+    monkeypatch.setattr(app, "DIR_PARTICIONES", str(base / "particiones"))
+    st.cache_resource.clear()
+    app.init_db()
+    return app.particionar_base()
+
+
+def test_particionar_base(poblada, monkeypatch):
+    _guardar_todo()
+    filas = {tabla: contar(tabla) for tabla in TABLAS}
+    totales = totales_resumen()
+
+    movidas = _particionar(poblada, monkeypatch)
+
+    assert {tabla: movidas[tabla] for tabla in TABLAS} == filas
+    assert all(os.path.exists(poblada / "particiones" / f"partido_{cod}.db") for cod in ('1', '2'))
+    assert app.filas_sin_particionar() == 0
+    assert {tabla: contar(tabla) for tabla in TABLAS} == filas
+    assert totales_resumen() == totales
+    assert app.reconstruir_resumenes() == SIN_DIFERENCIAS
+    # Repetirla no mueve nada más
+    assert not any(app.particionar_base().values())
+
+
+def test_particionar_con_historico(poblada, monkeypatch):
+    _guardar_todo()
+    # Todo lo guardado pasa a días cerrados y se archiva
+    with app.db_escritura() as conn:
+        for tabla, columna in app.COLUMNAS_FECHA.items():
+            conn.execute(f"UPDATE {tabla} SET {columna} = '2025-01-01'")
+    app.ejecutar_mantenimiento()
+    assert contar("analistas") == 0
+    historico = {tabla: contar(tabla) for tabla in app.TABLAS_HISTORICAS.values()}
+    assert historico['analistas_historico'] == 8
+    totales = totales_resumen()
+
+    movidas = _particionar(poblada, monkeypatch)
+
+    assert sum(movidas[tabla] for tabla in app.TABLAS_HISTORICAS.values()) == sum(historico.values())
+    assert app.filas_sin_particionar() == 0
+    assert {tabla: contar(tabla) for tabla in app.TABLAS_HISTORICAS.values()} == historico
+    # Los resúmenes de cada partición incluyen las filas archivadas
+    assert totales_resumen() == totales
+    assert app.reconstruir_resumenes() == SIN_DIFERENCIAS
@@ -0,0 +1,97 @@
+"""Trabajos en segundo plano: ciclo de vida, cancelación, latido y limpieza de resultados."""
+import os
+import threading
+import time
+from datetime import datetime
+
+import app
+
+
+def _trabajo(trabajo_id):
+    with app.db_lectura() as conn:
+        return conn.execute("SELECT estado, progreso, resultado, error FROM trabajos WHERE id = ?",
+                            (trabajo_id,)).fetchone()
+
+
+def _esperar(gestor):
+    # Sin hilos pendientes todos los trabajos enviados ya registraron su estado final
+    gestor._ejecutor.shutdown(wait=True)
+
+
+def test_exportacion_completa_con_archivo(base, monkeypatch):
+    monkeypatch.setattr(app, "DIR_TRABAJOS", str(base / "trabajos"))
+    app.init_db()
+    gestor = app.GestorTrabajos()
+
+    trabajo_id = gestor.enviar('exportacion', {'formato': 'csv', 'filtros': {}}, 'admin')
+    _esperar(gestor)
+
+    estado, progreso, resultado, error = _trabajo(trabajo_id)
+    assert (estado, progreso, error) == ('completado', 1, None)
+    assert resultado == str(base / "trabajos" / f"reporte_{trabajo_id}.zip")
+    assert open(resultado, 'rb').read(2) == b'PK'
+
+
+def test_error_y_cancelacion(base, monkeypatch):
+    app.init_db()
+    liberar = threading.Event()
+
+    def bloqueante(trabajo_id):
+        liberar.wait(5)
+        app._avance_trabajo(trabajo_id, 0.5, "a mitad")
+        return None, "no debería terminar"
+
+    def fallido(trabajo_id):
+        raise ValueError("sin datos")
+
+    monkeypatch.setitem(app.TIPOS_TRABAJO, 'bloqueante', bloqueante)
+    monkeypatch.setitem(app.TIPOS_TRABAJO, 'fallido', fallido)
+    gestor = app.GestorTrabajos(max_hilos=1)
+
+    en_curso = gestor.enviar('bloqueante', {}, 'admin')
+    en_cola = gestor.enviar('fallido', {}, 'admin')
+    gestor.cancelar(en_cola)
+    gestor.cancelar(en_curso)
+    fallido_id = gestor.enviar('fallido', {}, 'admin')
+    liberar.set()
+    _esperar(gestor)
+
+    assert _trabajo(en_curso)[0] == 'cancelado'
+    assert _trabajo(en_cola)[0] == 'cancelado'
+    assert _trabajo(fallido_id)[::3] == ('error', 'sin datos')
+
+
+def test_solo_se_interrumpen_los_trabajos_sin_latido(base):
+    app.init_db()
+    reciente = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with app.db_escritura() as conn:
+        # El primero es de un proceso caído; el segundo, de otro proceso que sigue vivo
+        conn.executemany("INSERT INTO trabajos (tipo, parametros, creado_por, creado, estado, latido) "
+                         "VALUES ('exportacion', '{}', 'admin', '2025-01-01 08:00:00', 'en_curso', ?)",
+                         [('2025-01-01 08:00:00',), (reciente,)])
+
+    app.GestorTrabajos()
+
+    assert (_trabajo(1)[0], _trabajo(2)[0]) == ('interrumpido', 'en_curso')
+
+
+def test_limpieza_de_resultados_antiguos(base, monkeypatch):
+    monkeypatch.setattr(app, "DIR_TRABAJOS", str(base / "trabajos"))
+    app.init_db()
+    os.makedirs(app.DIR_TRABAJOS)
+    rutas = [os.path.join(app.DIR_TRABAJOS, f"reporte_{n}.zip") for n in (1, 2)]
+    ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    with app.db_escritura() as conn:
+        conn.executemany("INSERT INTO trabajos (tipo, parametros, creado_por, creado, estado, resultado, terminado) "
+                         "VALUES ('exportacion', '{}', 'admin', ?, 'completado', ?, ?)",
+                         [('2025-01-01 08:00:00', rutas[0], '2025-01-01 08:00:00'),
+                          (ahora, rutas[1], ahora)])
+    for ruta in rutas:
+        open(ruta, 'wb').close()
+    antiguo = time.time() - (app.DIAS_RESULTADOS_TRABAJO + 1) * 86400
+    os.utime(rutas[0], (antiguo, antiguo))
+
+    assert app.limpiar_resultados_trabajos() == 1
+
+    assert [os.path.exists(ruta) for ruta in rutas] == [False, True]
+    assert (_trabajo(1)[2], _trabajo(2)[2]) == (None, rutas[1])